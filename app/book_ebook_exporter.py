@@ -0,0 +1,198 @@
+# app/book_ebook_exporter.py
+import base64
+import json
+import mimetypes
+import os
+import tempfile
+import uuid
+import zipfile
+from datetime import datetime, timezone
+from jinja2 import Template
+from markupsafe import escape
+from app.book_templates import FRAGMENT_TEMPLATES, FONTS_DIR, FONT_FILES, MAIN_CSS, font_face_css, toc_entries
+
+OUTPUT_DIR = "generated_books"
+# Served by the app (see main.py), so the HTML edition needs no copy of the fonts.
+HTML_FONTS_URL = "/fonts"
+
+# Page-sized boxes and forced page breaks are for paper; on a screen or an e-reader the
+# book reads as one column and the reader's own pagination applies.
+READER_CSS = """
+body { max-width: 36em; margin: 0 auto; padding: 1em 1.5em; }
+div { page-break-after: auto; }
+.blank-page { display: none; }
+.image-page, .title-page, .print-date-page, .chapter-title-page { height: auto; padding: 3em 0; }
+.image-container img { max-height: none; }
+.main-content-body, .toc-container, .prologue-page, .epilogue-page { page-break-before: always; }
+.toc-entry a { display: inline; }
+"""
+
+# --- Templates ---
+HTML_DOCUMENT_TEMPLATE = Template("""<!DOCTYPE html>
+<html lang="en">
+<head><meta charset="UTF-8"><meta name="viewport" content="width=device-width, initial-scale=1"><title>{{ book_title }}</title>
+<style>{{ css }}</style></head>
+<body>{{ body }}</body>
+</html>""")
+
+XHTML_DOCUMENT_TEMPLATE = Template("""<?xml version="1.0" encoding="UTF-8"?>
+<!DOCTYPE html>
+<html xmlns="http://www.w3.org/1999/xhtml" xmlns:epub="http://www.idpf.org/2007/ops" lang="en" xml:lang="en">
+<head><meta charset="UTF-8"/><title>{{ book_title }}</title><link rel="stylesheet" type="text/css" href="style.css"/></head>
+<body>{{ body }}</body>
+</html>""")
+
+CONTAINER_XML = """<?xml version="1.0" encoding="UTF-8"?>
+<container version="1.0" xmlns="urn:oasis:names:tc:opendocument:xmlns:container">
+  <rootfiles><rootfile full-path="OEBPS/content.opf" media-type="application/oebps-package+xml"/></rootfiles>
+</container>"""
+
+PACKAGE_TEMPLATE = Template("""<?xml version="1.0" encoding="UTF-8"?>
+<package xmlns="http://www.idpf.org/2007/opf" version="3.0" unique-identifier="book-id" xml:lang="en">
+  <metadata xmlns:dc="http://purl.org/dc/elements/1.1/">
+    <dc:identifier id="book-id">{{ identifier }}</dc:identifier>
+    <dc:title>{{ book_title }}</dc:title>
+    <dc:language>en</dc:language>
+    <dc:creator>The Novelist-Agent</dc:creator>
+    <meta property="dcterms:modified">{{ modified }}</meta>
+    {% if cover %}<meta name="cover" content="cover-image"/>{% endif %}
+  </metadata>
+  <manifest>
+    <item id="nav" href="nav.xhtml" media-type="application/xhtml+xml" properties="nav"/>
+    <item id="ncx" href="toc.ncx" media-type="application/x-dtbncx+xml"/>
+    <item id="style" href="style.css" media-type="text/css"/>
+    {% for font in fonts %}<item id="font-{{ loop.index }}" href="fonts/{{ font }}" media-type="font/ttf"/>
+    {% endfor %}{% if cover %}<item id="cover-image" href="{{ cover.href }}" media-type="{{ cover.media_type }}" properties="cover-image"/>
+    {% endif %}{% for page in pages %}<item id="{{ page.id }}" href="{{ page.id }}.xhtml" media-type="application/xhtml+xml"/>
+    {% endfor %}
+  </manifest>
+  <spine toc="ncx">{% for page in pages %}<itemref idref="{{ page.id }}"/>{% endfor %}</spine>
+</package>""")
+
+NAV_TEMPLATE = Template("""<?xml version="1.0" encoding="UTF-8"?>
+<!DOCTYPE html>
+<html xmlns="http://www.w3.org/1999/xhtml" xmlns:epub="http://www.idpf.org/2007/ops" lang="en" xml:lang="en">
+<head><meta charset="UTF-8"/><title>{{ book_title }}</title></head>
+<body><nav epub:type="toc" id="toc"><h1>Table of Contents</h1><ol>
+{% for entry in toc_entries %}<li><a href="{{ entry.href }}">{{ entry.title }}</a></li>
+{% endfor %}</ol></nav></body>
+</html>""")
+
+# The EPUB 2 table of contents, for older readers.
+NCX_TEMPLATE = Template("""<?xml version="1.0" encoding="UTF-8"?>
+<ncx xmlns="http://www.daisy.org/z3986/2005/ncx/" version="2005-1">
+  <head><meta name="dtb:uid" content="{{ identifier }}"/></head>
+  <docTitle><text>{{ book_title }}</text></docTitle>
+  <navMap>{% for entry in toc_entries %}
+    <navPoint id="nav-{{ loop.index }}" playOrder="{{ loop.index }}"><navLabel><text>{{ entry.title }}</text></navLabel><content src="{{ entry.href }}"/></navPoint>{% endfor %}
+  </navMap>
+</ncx>""")
+
+# --- Book Assembly ---
+
+def _escaped(book_data: dict) -> dict:
+    """The parts of the book the templates show, escaped: the text is the model's and may contain '<' or '&'."""
+    return {
+        "prologue_text": escape(book_data.get("prologue_text") or ""),
+        "epilogue_text": escape(book_data.get("epilogue_text") or ""),
+        "chapters": [{"heading": escape(ch["heading"]), "content": escape(ch["content"])} for ch in book_data.get("chapters", [])],
+    }
+
+def _fragments(book_data: dict) -> list[tuple[str, str]]:
+    """(anchor, rendered fragment) of the prologue, each chapter and the epilogue, in reading order."""
+    parts = [("prologue", FRAGMENT_TEMPLATES["prologue"].render(content=book_data["prologue_text"]))]
+    for i, ch in enumerate(book_data["chapters"]):
+        parts.append((f"chapter-{i+1}", FRAGMENT_TEMPLATES["chapter"].render(index=i, heading=ch["heading"], content=ch["content"])))
+    parts.append(("epilogue", FRAGMENT_TEMPLATES["epilogue"].render(content=book_data["epilogue_text"])))
+    return parts
+
+def _front_matter(title: str, image_src: str | None) -> str:
+    return (FRAGMENT_TEMPLATES["cover"].render(book_title=title, image_path=image_src)
+            + FRAGMENT_TEMPLATES["print_date"].render(print_date=datetime.now().strftime("%B %d, %Y")))
+
+def _write_atomically(path: str, write):
+    """Writes through `write(file)` to a temporary file that replaces `path` only once it is complete."""
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".part")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            write(f)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+def write_html_edition(title: str, book_data: dict, output_path: str) -> str:
+    """A single, self-contained HTML file: the cover image is inlined and the fonts are served by the app."""
+    title = escape(title)
+    image_src = None
+    image_path = book_data.get("image_path")
+    if image_path and os.path.exists(image_path):
+        with open(image_path, "rb") as f:
+            media_type = mimetypes.guess_type(image_path)[0] or "image/jpeg"
+            image_src = f"data:{media_type};base64,{base64.b64encode(f.read()).decode('ascii')}"
+    text = _escaped(book_data)
+    body = (_front_matter(title, image_src)
+            + FRAGMENT_TEMPLATES["toc"].render(toc_entries=toc_entries(text))
+            + "".join(fragment for _, fragment in _fragments(text)))
+    html = HTML_DOCUMENT_TEMPLATE.render(book_title=title, css=font_face_css(HTML_FONTS_URL) + MAIN_CSS + READER_CSS, body=body)
+    _write_atomically(output_path, lambda f: f.write(html.encode("utf-8")))
+    return output_path
+
+def write_epub_edition(title: str, book_data: dict, output_path: str, book_id: str) -> str:
+    """An EPUB 3 book (with an EPUB 2 table of contents) embedding the fonts and the cover image."""
+    title = escape(title)
+    text = _escaped(book_data)
+    image_path = book_data.get("image_path")
+    cover = None
+    if image_path and os.path.exists(image_path):
+        extension = os.path.splitext(image_path)[1].lower()
+        cover = {"href": f"images/cover{extension}", "media_type": mimetypes.guess_type(image_path)[0] or "image/jpeg"}
+
+    pages = [{"id": "cover", "body": _front_matter(title, cover and cover["href"])}]
+    pages.append({"id": "contents", "body": FRAGMENT_TEMPLATES["toc"].render(toc_entries=toc_entries(text, "{anchor}.xhtml#{anchor}"))})
+    pages.extend({"id": anchor, "body": fragment} for anchor, fragment in _fragments(text))
+    entries = toc_entries(text, "{anchor}.xhtml")
+    identifier = f"urn:uuid:{uuid.uuid5(uuid.NAMESPACE_URL, book_id)}"
+    modified = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+    def write(f):
+        with zipfile.ZipFile(f, "w", zipfile.ZIP_DEFLATED) as epub:
+            # The mimetype entry must come first and be stored uncompressed.
+            epub.writestr("mimetype", "application/epub+zip", compress_type=zipfile.ZIP_STORED)
+            epub.writestr("META-INF/container.xml", CONTAINER_XML)
+            epub.writestr("OEBPS/content.opf", PACKAGE_TEMPLATE.render(
+                identifier=identifier, book_title=title, modified=modified, cover=cover, pages=pages, fonts=FONT_FILES.values()))
+            epub.writestr("OEBPS/nav.xhtml", NAV_TEMPLATE.render(book_title=title, toc_entries=entries))
+            epub.writestr("OEBPS/toc.ncx", NCX_TEMPLATE.render(identifier=identifier, book_title=title, toc_entries=entries))
+            epub.writestr("OEBPS/style.css", font_face_css("fonts") + MAIN_CSS + READER_CSS)
+            for name in FONT_FILES.values():
+                # Fonts and JPEGs are already compressed.
+                epub.write(os.path.join(FONTS_DIR, name), f"OEBPS/fonts/{name}", compress_type=zipfile.ZIP_STORED)
+            if cover:
+                epub.write(image_path, f"OEBPS/{cover['href']}", compress_type=zipfile.ZIP_STORED)
+            for page in pages:
+                epub.writestr(f"OEBPS/{page['id']}.xhtml", XHTML_DOCUMENT_TEMPLATE.render(book_title=title, body=page["body"]))
+
+    _write_atomically(output_path, write)
+    return output_path
+
+def save_book_editions(title: str, book_data: dict, basename: str) -> dict[str, str]:
+    """
+    Writes the HTML and EPUB editions of a book, and the book itself as JSON so that a PDF can
+    be rendered from it later, on demand. Returns the path of each file by format.
+    """
+    paths = {fmt: os.path.join(OUTPUT_DIR, f"{basename}.{extension}")
+             for fmt, extension in (("html", "html"), ("epub", "epub"), ("source", "book.json"))}
+    write_html_edition(title, book_data, paths["html"])
+    write_epub_edition(title, book_data, paths["epub"], book_id=basename)
+    source = json.dumps({"title": title, "book_data": book_data}, ensure_ascii=False)
+    _write_atomically(paths["source"], lambda f: f.write(source.encode("utf-8")))
+    return paths
+
+def load_book_source(path: str) -> tuple[str, dict]:
+    """The title and book data saved by save_book_editions()."""
+    with open(path, "r", encoding="utf-8") as f:
+        source = json.load(f)
+    return source["title"], source["book_data"]
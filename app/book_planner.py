@@ -0,0 +1,153 @@
+# app/book_planner.py
+import json
+import math
+import os
+import time
+from app.metrics import Counter, Histogram, registry
+
+# The model's completion limit (gpt-4-1106-preview returns at most 4096 tokens).
+MODEL_MAX_OUTPUT_TOKENS = int(os.getenv("MODEL_MAX_OUTPUT_TOKENS", "4096"))
+WORDS_PER_TOKEN = 0.75
+# A section may run this much longer than asked before it is cut off by max_tokens.
+SECTION_TOKEN_HEADROOM = 1.25
+# Room kept in each completion for the continuity summary written alongside the section.
+SUMMARY_TOKEN_RESERVE = 200
+# The longest section that fits in one call, headroom and summary included.
+MAX_SECTION_WORDS = int((MODEL_MAX_OUTPUT_TOKENS - SUMMARY_TOKEN_RESERVE) * WORDS_PER_TOKEN / SECTION_TOKEN_HEADROOM)
+# A block this close to its target gets no further section.
+MIN_SECTION_WORDS = 250
+# Words the model actually writes per word asked for. Learned as books are written; this is the starting guess.
+INITIAL_WORD_YIELD = float(os.getenv("SECTION_WORD_YIELD", "1.0"))
+YIELD_SMOOTHING = 0.3
+# Planned and actual figures of every finished book are appended here, one JSON object per line.
+BOOK_PLAN_LOG = os.getenv("BOOK_PLAN_LOG", "book_plans.jsonl")
+
+WORD_YIELD = registry.register(Histogram(
+    "book_section_word_yield", "Words written per word asked for, per section.", (),
+    buckets=(0.25, 0.5, 0.6, 0.7, 0.8, 0.9, 1.0, 1.1, 1.25, 1.5, 2.0)))
+PLANNED_WORDS = registry.register(Counter("book_words_total", "Words planned for and actually written.", ("figure",)))
+
+# Carried over from book to book, so each new plan starts from what the model has been delivering.
+_observed_yield = INITIAL_WORD_YIELD
+
+def section_max_tokens(words: int) -> int:
+    """The completion allowance for a section of `words` words."""
+    return min(MODEL_MAX_OUTPUT_TOKENS - SUMMARY_TOKEN_RESERVE, math.ceil(words / WORDS_PER_TOKEN * SECTION_TOKEN_HEADROOM))
+
+def count_words(text: str) -> int:
+    return len(text.split())
+
+
+class BlockPlan:
+    """
+    Sizes the sections of one prologue, chapter or epilogue. Each section asks for the words
+    still missing spread over as few calls as the output limit allows, scaled up by how much
+    the model has been undershooting, so the block converges on its target in the fewest calls.
+    """
+
+    def __init__(self, book: "BookPlan", name: str, target_words: int):
+        self.book = book
+        self.name = name
+        self.target_words = max(1, target_words)
+        self.sections: list[dict] = []
+        self.finished = False
+        self.planned_sections = self.sections_left()
+
+    @property
+    def written_words(self) -> int:
+        return sum(s["actual"] for s in self.sections)
+
+    @property
+    def remaining_words(self) -> int:
+        return self.target_words - self.written_words
+
+    def sections_left(self) -> int:
+        if self.sections and self.remaining_words < MIN_SECTION_WORDS:
+            return 0
+        # Never more than twice the original plan, in case the model keeps returning almost nothing.
+        if self.sections and len(self.sections) >= 2 * self.planned_sections + 1:
+            return 0
+        return max(1, math.ceil(self.remaining_words / (MAX_SECTION_WORDS * self.book.word_yield)))
+
+    def next_section_words(self) -> int:
+        """How many words to ask the model for in the next section."""
+        share = self.remaining_words / self.sections_left()
+        return int(min(MAX_SECTION_WORDS, max(MIN_SECTION_WORDS, share / self.book.word_yield)))
+
+    def record(self, requested: int | None, text: str):
+        """Records a written section; `requested` is None for one replayed from the journal."""
+        actual = count_words(text)
+        self.sections.append({"requested": requested, "actual": actual})
+        if requested:
+            self.book.observe_yield(actual / requested)
+
+    def finish(self):
+        self.finished = True
+        PLANNED_WORDS.inc(self.target_words, figure="planned")
+        PLANNED_WORDS.inc(self.written_words, figure="actual")
+
+    def report(self) -> dict:
+        return {"name": self.name, "target_words": self.target_words, "actual_words": self.written_words,
+                "planned_sections": self.planned_sections, "sections": self.sections}
+
+
+class BookPlan:
+    """
+    The word budget of a book. Chapter targets are handed out as chapters start, so words a
+    finished chapter ran over or under are taken from or given to the chapters not started yet.
+    """
+
+    def __init__(self, num_pages: int = None, chapters: int = 0, chapter_words: int = 0):
+        self.num_pages = num_pages
+        self.chapters = chapters
+        self.chapter_words_total = chapters * chapter_words
+        self.word_yield = _observed_yield
+        self.blocks: dict[str, BlockPlan] = {}
+        self._chapter_blocks: list[BlockPlan] = []
+        self.started_at = time.time()
+
+    def block(self, name: str, target_words: int) -> BlockPlan:
+        if name not in self.blocks:
+            self.blocks[name] = BlockPlan(self, name, target_words)
+        return self.blocks[name]
+
+    def chapter_block(self, name: str) -> BlockPlan:
+        """Plans the next chapter with its share of the chapter words not yet written or promised."""
+        if name in self.blocks:
+            return self.blocks[name]
+        committed = sum(b.written_words if b.finished else b.target_words for b in self._chapter_blocks)
+        chapters_left = max(1, self.chapters - len(self._chapter_blocks))
+        target = max(MIN_SECTION_WORDS, round((self.chapter_words_total - committed) / chapters_left))
+        block = self.block(name, target)
+        self._chapter_blocks.append(block)
+        return block
+
+    def observe_yield(self, ratio: float):
+        global _observed_yield
+        WORD_YIELD.observe(ratio)
+        # Bounded, so one runaway or truncated section cannot derail the remaining plan.
+        ratio = min(2.0, max(0.25, ratio))
+        self.word_yield += YIELD_SMOOTHING * (ratio - self.word_yield)
+        _observed_yield += YIELD_SMOOTHING * (ratio - _observed_yield)
+
+    def report(self) -> dict:
+        blocks = [b.report() for b in self.blocks.values()]
+        return {
+            "num_pages": self.num_pages,
+            "planned_words": sum(b["target_words"] for b in blocks),
+            "actual_words": sum(b["actual_words"] for b in blocks),
+            "planned_sections": sum(b["planned_sections"] for b in blocks),
+            "actual_sections": sum(len(b["sections"]) for b in blocks),
+            "word_yield": round(self.word_yield, 3),
+            "blocks": blocks,
+        }
+
+    def log(self, path: str = BOOK_PLAN_LOG):
+        """Appends the plan's figures to the tuning log."""
+        if not path:
+            return
+        try:
+            with open(path, "a", encoding="utf-8") as f:
+                f.write(json.dumps({"at": self.started_at, **self.report()}) + "\n")
+        except OSError as e:
+            print(f"Could not write the book plan log: {e}")
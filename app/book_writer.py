@@ -1,65 +1,299 @@
 # app/book_writer.py
-from openai import AsyncOpenAI
 import os
 import asyncio
 import re
 import json
 import random
-import string
-import httpx
+import base64
+from typing import Callable
 from app.prompt_builder import (
     build_chapter_section_prompt, build_summarization_prompt,
     build_title_generation_prompt, build_data_selection_prompt,
-    build_image_generation_prompt
+    build_image_generation_prompt, build_book_outline_prompt
 )
+from app.rate_limiter import RateLimiter
+from app.llm_cache import CacheMiss, llm_cache, make_cache_key
+from app.swapi_store import get_swapi_store
+from app.swapi_search import get_search_index
+from app.context_compiler import CompiledContext, compile_data_context
+from app.image_store import save_image_bytes, download_image, print_variant
+from app.http_client import get_http_client
+from app.journal import GenerationJournal, journal_key, run_step
+from app.metrics import Counter, registry, span
+from app.llm_scheduler import llm_scheduler
+from app.hedging import hedge_policy, with_deadline, LLM_CALL_DEADLINE_SECONDS, LLM_STREAM_DEADLINE_SECONDS
+from app.book_planner import BookPlan, MODEL_MAX_OUTPUT_TOKENS, SUMMARY_TOKEN_RESERVE, section_max_tokens
 from dotenv import load_dotenv
 
 load_dotenv()
 
-openai = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"))
 MODEL_TEXT = "gpt-4-1106-preview"
 MODEL_IMAGE = "dall-e-3"
 
-WORDS_PER_SECTION_TARGET = 750
-MAX_TOKENS_PER_SECTION = 1200
-
-# --- Data Loading ---
-def load_all_swapi_data():
-    data = {}
-    data_dir = "swapi_data"
-    if not os.path.exists(data_dir):
-        raise FileNotFoundError("The 'swapi_data' directory was not found. Please run the fetch_swapi_data.py script first.")
-    for filename in os.listdir(data_dir):
-        if filename.endswith(".json"):
-            category = filename.replace(".json", "")
-            with open(os.path.join(data_dir, filename), "r", encoding='utf-8') as f:
-                data[category] = json.load(f)
-    return data
-
-ALL_SWAPI_DATA = load_all_swapi_data()
-print("SWAPI data loaded successfully.")
+MAX_TOKENS_PER_SUMMARY = SUMMARY_TOKEN_RESERVE
+MAX_CONCURRENT_CHAPTERS = int(os.getenv("MAX_CONCURRENT_CHAPTERS", "4"))
+# "combined" asks for each section and its continuity summary in one JSON response, instead of
+# a second summarization call per section ("separate"); it falls back to that call when needed.
+SECTION_SUMMARY_MODE = os.getenv("SECTION_SUMMARY_MODE", "combined")
+
+# How each book's cast is chosen. "local" takes it straight from the prompt when the prompt
+# names its characters, and otherwise asks the model to choose from a shortlist found by a local
+# search; "shortlist" always asks the model, from the shortlist; "full" sends every name in the
+# dataset, as before the search index existed.
+DATA_SELECTION_MODE = os.getenv("DATA_SELECTION_MODE", "local")
+DATA_SELECTION_SHORTLIST = {"people": 20, "planets": 10, "starships": 10}
+# Most entities per category in a cast taken from the prompt.
+LOCAL_CAST_SIZES = {"people": 6, "planets": 2, "starships": 2}
+DATA_SELECTIONS = registry.register(Counter(
+    "book_data_selections_total", "How the cast of each book was chosen: local, shortlist or full.", ("path",)))
+
+# Sections can take minutes to write, far longer than the shared HTTP client's default timeout.
+OPENAI_TIMEOUT_SECONDS = float(os.getenv("OPENAI_TIMEOUT_SECONDS", "600"))
+
+_llm_client = None
+_llm_http_client = None
+
+def get_llm_client():
+    """
+    Returns the client used for every chat and image call, creating it on first use
+    (importing the OpenAI SDK is the slowest part of importing this module).
+    Retries are handled by the shared rate limiters below so that backoff is coordinated across requests.
+    The OpenAI client sends its requests over the app's shared connection pool.
+    LLM_BACKEND=mock swaps in the deterministic offline client from app.mock_llm.
+    """
+    global _llm_client, _llm_http_client
+    if _llm_client is None and os.getenv("LLM_BACKEND", "openai") == "mock":
+        from app.mock_llm import MockAsyncOpenAI
+        _llm_client = MockAsyncOpenAI()
+    elif _llm_client is None or (_llm_http_client is not None and _llm_http_client is not get_http_client()):
+        from openai import AsyncOpenAI
+        _llm_http_client = get_http_client()
+        _llm_client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"), max_retries=0,
+                                  timeout=OPENAI_TIMEOUT_SECONDS, http_client=_llm_http_client)
+    return _llm_client
+
+def set_llm_client(client):
+    """Replaces the client used for every chat and image call, e.g. with a MockAsyncOpenAI."""
+    global _llm_client, _llm_http_client
+    _llm_client = client
+    _llm_http_client = None
+
+# --- Rate Limiting ---
+CHAT_REQUESTS_PER_MINUTE = int(os.getenv("OPENAI_CHAT_RPM", "500"))
+CHAT_TOKENS_PER_MINUTE = int(os.getenv("OPENAI_CHAT_TPM", "300000"))
+IMAGE_REQUESTS_PER_MINUTE = int(os.getenv("OPENAI_IMAGE_RPM", "5"))
+# What an image request weighs against a job's fair share of the LLM scheduler, in tokens.
+IMAGE_SCHEDULER_COST = 1000
+
+chat_rate_limiter = RateLimiter("chat", CHAT_REQUESTS_PER_MINUTE, CHAT_TOKENS_PER_MINUTE)
+image_rate_limiter = RateLimiter("images", IMAGE_REQUESTS_PER_MINUTE)
+
+def estimate_request_tokens(messages: list[dict], max_tokens: int = None) -> int:
+    """Rough token cost of a chat call: ~4 characters per prompt token plus the completion allowance."""
+    prompt_chars = sum(len(m.get("content") or "") for m in messages)
+    return prompt_chars // 4 + (max_tokens or MODEL_MAX_OUTPUT_TOKENS)
+
+async def create_chat_completion(**kwargs):
+    from openai import APIConnectionError
+    tokens = estimate_request_tokens(kwargs["messages"], kwargs.get("max_tokens"))
+    return await chat_rate_limiter.call(
+        get_llm_client().chat.completions.with_raw_response.create,
+        tokens=tokens, retry_on=(APIConnectionError,), **kwargs
+    )
+
+def notify(callback: Callable[..., None] | None, name: str, **data):
+    """Invokes an optional progress or event callback."""
+    if callback is not None:
+        callback(name, **data)
+
+async def create_image(**kwargs):
+    from openai import APIConnectionError
+    return await image_rate_limiter.call(
+        get_llm_client().images.with_raw_response.generate,
+        retry_on=(APIConnectionError,), **kwargs
+    )
+
+async def close_stream(stream):
+    """Closes a streamed completion's connection, e.g. one abandoned by hedging or a deadline."""
+    close = getattr(stream, "close", None)
+    if close is not None:
+        await close()
+
+def chat_cache_key(kwargs: dict) -> str:
+    return make_cache_key(
+        kind="chat", model=kwargs["model"], messages=kwargs["messages"], temperature=kwargs.get("temperature"),
+        max_tokens=kwargs.get("max_tokens"), response_format=kwargs.get("response_format")
+    )
+
+async def complete_text(call_type: str, **kwargs) -> str:
+    """Returns the content of a chat completion, served from the LLM cache when the call type's policy allows."""
+    key = chat_cache_key(kwargs)
+    if llm_cache.enabled and llm_cache.is_cacheable(call_type, kwargs.get("temperature")):
+        cached = llm_cache.get(key, call_type)
+        if cached is not None:
+            return cached
+    async with llm_scheduler.slot(estimate_request_tokens(kwargs["messages"], kwargs.get("max_tokens"))):
+        with span("llm", call_type) as step:
+            response = await with_deadline(
+                call_type, hedge_policy.call(call_type, lambda: create_chat_completion(**kwargs)), LLM_CALL_DEADLINE_SECONDS
+            )
+            step.record_usage(getattr(response, "usage", None))
+    content = response.choices[0].message.content
+    await llm_cache.put(key, call_type, content, kwargs.get("temperature"))
+    return content
+
+async def stream_text(call_type: str, on_delta: Callable[[str], None] = None, **kwargs) -> str:
+    """Like complete_text, but streams the completion and hands each piece of text to `on_delta` as it arrives."""
+    key = chat_cache_key(kwargs)
+    if llm_cache.enabled and llm_cache.is_cacheable(call_type, kwargs.get("temperature")):
+        cached = llm_cache.get(key, call_type)
+        if cached is not None:
+            if on_delta is not None:
+                on_delta(cached)
+            return cached
+
+    async def open_stream():
+        # The last chunk then carries the token usage, which streamed responses otherwise lack.
+        stream = await create_chat_completion(stream=True, stream_options={"include_usage": True}, **kwargs)
+        chunks = stream.__aiter__()
+        try:
+            return stream, chunks, await anext(chunks, None)
+        except BaseException:
+            await close_stream(stream)
+            raise
+
+    async def read_stream(step) -> str:
+        # Streams are hedged on their first chunk; nothing reaches `on_delta` before one has won.
+        stream, chunks, chunk = await hedge_policy.call(call_type, open_stream, discard=lambda opened: close_stream(opened[0]))
+        pieces = []
+        try:
+            while chunk is not None:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    if not pieces:
+                        step.first_token()
+                    pieces.append(chunk.choices[0].delta.content)
+                    if on_delta is not None:
+                        on_delta(chunk.choices[0].delta.content)
+                if getattr(chunk, "usage", None):
+                    step.record_usage(chunk.usage)
+                chunk = await anext(chunks, None)
+        finally:
+            await close_stream(stream)
+        return "".join(pieces)
+
+    # The scheduler slot is held until the whole stream has been read.
+    async with llm_scheduler.slot(estimate_request_tokens(kwargs["messages"], kwargs.get("max_tokens"))):
+        with span("llm", call_type, streamed=True) as step:
+            content = await with_deadline(call_type, read_stream(step), LLM_STREAM_DEADLINE_SECONDS)
+    await llm_cache.put(key, call_type, content, kwargs.get("temperature"))
+    return content
+
+_JSON_ESCAPES = {'"': '"', "\\": "\\", "/": "/", "b": "\b", "f": "\f", "n": "\n", "r": "\r", "t": "\t"}
+_JSON_PLAIN_RUN = re.compile(r'[^"\\]+')
+
+class JsonStringField:
+    """
+    Decodes one string field of a JSON object as the object is streamed in, so the text of a
+    structured response can be handed on piece by piece instead of after the whole response.
+    """
+
+    def __init__(self, name: str, on_text: Callable[[str], None] = None):
+        self._opening = re.compile(r'"%s"\s*:\s*"' % re.escape(name))
+        self.on_text = on_text
+        self._raw = ""
+        self._pos = None  # Where the undecoded rest of the value starts in _raw, once found.
+        self.closed = False
+        self.pieces = []
+
+    @property
+    def text(self) -> str:
+        return "".join(self.pieces)
+
+    def feed(self, chunk: str):
+        self._raw += chunk
+        if self.closed:
+            return
+        if self._pos is None:
+            match = self._opening.search(self._raw)
+            if match is None:
+                return
+            self._pos = match.end()
+        decoded = self._decode()
+        if decoded:
+            self.pieces.append(decoded)
+            if self.on_text is not None:
+                self.on_text(decoded)
+
+    def _decode(self) -> str:
+        """Decodes as much of the value as has arrived, stopping before an escape sequence cut off mid-chunk."""
+        raw, pos, out = self._raw, self._pos, []
+        while pos < len(raw):
+            run = _JSON_PLAIN_RUN.match(raw, pos)
+            if run:
+                out.append(run.group())
+                pos = run.end()
+                continue
+            if raw[pos] == '"':
+                self.closed = True
+                pos += 1
+                break
+            if pos + 1 >= len(raw):
+                break
+            escape = raw[pos + 1]
+            if escape != "u":
+                out.append(_JSON_ESCAPES.get(escape, escape))
+                pos += 2
+                continue
+            if pos + 6 > len(raw):
+                break
+            code = int(raw[pos + 2:pos + 6], 16)
+            if 0xD800 <= code < 0xDC00:
+                # The high half of a surrogate pair: decode it together with the low half.
+                if pos + 12 > len(raw):
+                    break
+                out.append(raw[pos:pos + 12].encode("ascii").decode("unicode_escape").encode("utf-16", "surrogatepass").decode("utf-16"))
+                pos += 12
+            else:
+                out.append(chr(code))
+                pos += 6
+        self._pos = pos
+        return "".join(out)
 
 # --- Helper Functions ---
 async def select_book_data_context(prompt: str) -> dict:
-    selection_prompt = build_data_selection_prompt(prompt, ALL_SWAPI_DATA)
-    response = await openai.chat.completions.create(
+    store = get_swapi_store()
+    if DATA_SELECTION_MODE == "full":
+        selection_path, candidates = "full", None
+    else:
+        index = get_search_index()
+        mentioned = index.mentions(prompt)
+        cast = index.named_cast(prompt, mentioned, LOCAL_CAST_SIZES) if DATA_SELECTION_MODE == "local" else None
+        if cast is not None:
+            DATA_SELECTIONS.inc(path="local")
+            print(f"Cast taken from the prompt: {', '.join(e.name for entities in cast.values() for e in entities)}")
+            return {category: [store.to_record(e) for e in entities] for category, entities in cast.items()}
+        selection_path, candidates = "shortlist", index.shortlist(prompt, mentioned, DATA_SELECTION_SHORTLIST)
+    DATA_SELECTIONS.inc(path=selection_path)
+    selection_prompt = build_data_selection_prompt(prompt, store, candidates)
+    content = await complete_text(
+        "data_selection",
         model=MODEL_TEXT, messages=[{"role": "user", "content": selection_prompt}],
         temperature=0.3, response_format={"type": "json_object"}
     )
     try:
-        selected_names = json.loads(response.choices[0].message.content)
+        selected_names = json.loads(content)
         print(f"AI selected data context: {selected_names}")
         book_context = {}
         for category, names in selected_names.items():
-            if category in ALL_SWAPI_DATA:
-                book_context[category] = [item for item in ALL_SWAPI_DATA[category] if item.get('name') in names or item.get('title') in names]
+            if category in store.categories and isinstance(names, list):
+                entities = dict.fromkeys(e for e in (store.find(category, name) for name in names) if e is not None)
+                book_context[category] = [store.to_record(entity) for entity in entities]
         return book_context
-    except (json.JSONDecodeError, KeyError) as e:
+    except (json.JSONDecodeError, KeyError, AttributeError) as e:
         print(f"Error parsing AI data selection, falling back to random. Error: {e}")
         return {
-            "people": random.sample(ALL_SWAPI_DATA.get("people", []), min(len(ALL_SWAPI_DATA.get("people", [])), 5)),
-            "planets": random.sample(ALL_SWAPI_DATA.get("planets", []), min(len(ALL_SWAPI_DATA.get("planets", [])), 3)),
-            "starships": random.sample(ALL_SWAPI_DATA.get("starships", []), min(len(ALL_SWAPI_DATA.get("starships", [])), 2)),
+            category: [store.to_record(e) for e in random.sample(store.entities(category), min(len(store.entities(category)), count))]
+            for category, count in (("people", 5), ("planets", 3), ("starships", 2))
         }
 
 async def generate_book_image(prompt: str, data_context: dict) -> str:
@@ -67,77 +301,193 @@ async def generate_book_image(prompt: str, data_context: dict) -> str:
     image_prompt = build_image_generation_prompt(prompt, data_context)
     print(f"DALL-E Prompt: {image_prompt}")
     try:
-        response = await openai.images.generate(model=MODEL_IMAGE, prompt=image_prompt, size="1024x1024", quality="standard", n=1)
+        image_request = dict(model=MODEL_IMAGE, prompt=image_prompt, size="1024x1024", quality="standard", n=1)
+        cache_key = make_cache_key(kind="image", **image_request)
+        if llm_cache.enabled and llm_cache.is_cacheable("image"):
+            cached_path = llm_cache.get(cache_key, "image")
+            if cached_path and os.path.exists(cached_path):
+                print(f"Image served from cache: {cached_path}")
+                return await asyncio.to_thread(print_variant, cached_path)
+        async with llm_scheduler.slot(IMAGE_SCHEDULER_COST):
+            with span("image", "image"):
+                response = await create_image(**image_request)
         image_url = response.data[0].url
-        output_dir = "generated_images"
-        os.makedirs(output_dir, exist_ok=True)
-        image_filename = f"{''.join(random.choices(string.ascii_letters + string.digits, k=12))}.png"
-        output_path = os.path.join(output_dir, image_filename)
-        async with httpx.AsyncClient() as client:
-            image_response = await client.get(image_url)
-            image_response.raise_for_status()
-            with open(output_path, "wb") as f: f.write(image_response.content)
+        if image_url is None and getattr(response.data[0], "b64_json", None):
+            output_path = save_image_bytes(base64.b64decode(response.data[0].b64_json))
+        else:
+            with span("http", "image_download"):
+                output_path = await download_image(image_url)
         print(f"Image saved to: {output_path}")
-        return output_path
+        await llm_cache.put(cache_key, "image", output_path)
+        # The PDF embeds a downscaled JPEG instead of the full-size PNG.
+        return await asyncio.to_thread(print_variant, output_path)
     except Exception as e:
         print(f"Could not generate image: {e}")
         return None
 
 async def generate_book_title(prompt: str) -> str:
     title_prompt = build_title_generation_prompt(prompt, "book")
-    response = await openai.chat.completions.create(
+    content = await complete_text(
+        "book_title",
         model=MODEL_TEXT, messages=[{"role": "user", "content": title_prompt}],
         temperature=0.8, max_tokens=20
     )
-    return response.choices[0].message.content.strip().strip('"')
+    return content.strip().strip('"')
 
 async def generate_chapter_titles(prompt: str, num_chapters: int, data_context: dict) -> list[str]:
     titles_prompt = build_title_generation_prompt(prompt, "chapter_list", num_chapters, data_context)
-    response = await openai.chat.completions.create(
+    content = await complete_text(
+        "chapter_titles",
         model=MODEL_TEXT, messages=[{"role": "user", "content": titles_prompt}],
         temperature=0.7, max_tokens=60 * num_chapters
     )
-    content = response.choices[0].message.content
     titles = re.findall(r'^\d+\.\s*(.*)', content, re.MULTILINE)
     return titles if titles else [f"Chapter {i+1}" for i in range(num_chapters)]
 
-async def generate_chapter_section(prompt: str, title: str, summary: str, context: dict, words: int) -> str:
-    content_prompt = build_chapter_section_prompt(prompt, title, summary, context, words)
-    response = await openai.chat.completions.create(
+async def generate_book_outline(prompt: str, num_chapters: int, data_context: dict | CompiledContext) -> list[dict] | None:
+    outline_prompt = build_book_outline_prompt(prompt, num_chapters, data_context)
+    content = await complete_text(
+        "outline",
+        model=MODEL_TEXT, messages=[{"role": "user", "content": outline_prompt}],
+        temperature=0.7, max_tokens=250 * num_chapters, response_format={"type": "json_object"}
+    )
+    try:
+        chapters = json.loads(content)["chapters"]
+        outline = [
+            {key: str(ch.get(key, "")).strip() for key in ("title", "synopsis", "entry_state", "exit_state")}
+            for ch in chapters[:num_chapters]
+        ]
+        if len(outline) < num_chapters:
+            raise ValueError(f"expected {num_chapters} chapters, got {len(outline)}")
+        return outline
+    except (json.JSONDecodeError, KeyError, TypeError, AttributeError, ValueError) as e:
+        print(f"Error parsing AI book outline, falling back to sequential chapters. Error: {e}")
+        return None
+
+async def generate_chapter_section(prompt: str, title: str, summary: str, context: dict | CompiledContext, words: int, outline: dict = None, on_delta: Callable[[str], None] = None) -> str:
+    content_prompt = build_chapter_section_prompt(prompt, title, summary, context, words, outline)
+    content = await stream_text(
+        "section", on_delta,
+        model=MODEL_TEXT, messages=[{"role": "user", "content": content_prompt}],
+        temperature=0.75, max_tokens=section_max_tokens(words)
+    )
+    return content.strip()
+
+async def generate_section_with_summary(prompt: str, title: str, summary: str, context: dict | CompiledContext, words: int, outline: dict = None, on_delta: Callable[[str], None] = None) -> tuple[str | None, str | None]:
+    """
+    Writes a section and the continuity summary for the next one in a single JSON response,
+    streaming the section text to `on_delta` as it is decoded. Returns (text, summary); the
+    summary is None if the response was malformed, and the text too if none of it was usable.
+    """
+    content_prompt = build_chapter_section_prompt(prompt, title, summary, context, words, outline, with_summary=True)
+    text_field = JsonStringField("text", on_delta)
+    content = await stream_text(
+        "section", text_field.feed,
         model=MODEL_TEXT, messages=[{"role": "user", "content": content_prompt}],
-        temperature=0.75, max_tokens=MAX_TOKENS_PER_SECTION
+        temperature=0.75, max_tokens=section_max_tokens(words) + MAX_TOKENS_PER_SUMMARY,
+        response_format={"type": "json_object"}
     )
-    return response.choices[0].message.content.strip()
+    try:
+        data = json.loads(content)
+        text, next_summary = str(data["text"]).strip(), str(data["summary"]).strip()
+        if not next_summary:
+            raise ValueError("empty summary")
+        return text or None, next_summary
+    except (json.JSONDecodeError, KeyError, TypeError, ValueError) as e:
+        # Often a response cut off by the token limit: keep whatever text was already streamed.
+        print(f"Error parsing section with summary, summarizing separately. Error: {e}")
+        return text_field.text.strip() or None, None
 
 async def summarize_section(text: str) -> str:
     summary_prompt = build_summarization_prompt(text)
     try:
-        response = await openai.chat.completions.create(
+        content = await complete_text(
+            "summary",
             model=MODEL_TEXT, messages=[{"role": "user", "content": summary_prompt}],
-            temperature=0.2, max_tokens=200
+            temperature=0.2, max_tokens=MAX_TOKENS_PER_SUMMARY
         )
-        return response.choices[0].message.content.strip()
+        return content.strip()
     except Exception:
         return text[:300] + "..."
 
-async def generate_content_block(prompt: str, title: str, context: dict, word_target: int) -> str:
-    print(f"--- Generating content for: '{title}' (Target: {word_target} words) ---")
-    num_sections = max(1, round(word_target / WORDS_PER_SECTION_TARGET))
+def section_plan_key(book: str, title: str, part: int = None) -> str:
+    """Cache key of how section `part` of a block of `book` was sized, or (without `part`) of how many sections the block took."""
+    return make_cache_key(kind="section_plan", book=book, title=title, part=part)
+
+async def generate_content_block(prompt: str, title: str, context: dict | CompiledContext, word_target: int, outline: dict = None, on_event: Callable[..., None] = None, journal: GenerationJournal = None, plan: BookPlan = None, book: str = None) -> str:
+    """
+    Writes a block section by section until it reaches `word_target` words (or the target
+    `plan` already holds for `title`), sizing each section from the words written so far.
+
+    Section sizes depend on the word yield learned from earlier books and on the order chapters
+    finish in, so record mode keeps each decision in the LLM cache; replay mode reuses the recorded
+    ones, which makes every section prompt the same as when the book was first written. They are
+    kept per `book` (see generate_user_prompt_driven_book), as books with one prompt differ in size.
+    """
+    block = (plan or BookPlan()).block(title, word_target)
+    book = book or journal_key(prompt=prompt)
+    replay = llm_cache.replay
+    recorded_parts = None
+    if replay:
+        recorded_parts = llm_cache.get(section_plan_key(book, title), "section_plan")
+        if recorded_parts is None:
+            raise CacheMiss(f"Replay mode: no recorded section plan for '{title}'.")
+    print(f"--- Generating content for: '{title}' (Target: {block.target_words} words in ~{block.planned_sections} parts) ---")
+    notify(on_event, "heading", section=title, parts=block.planned_sections)
     parts = []
-    summary = f"The section is '{title}'. Set the scene and begin the narrative."
-    for i in range(num_sections):
-        print(f"  - Generating part {i+1}/{num_sections}...")
-        section_text = await generate_chapter_section(prompt, title, summary, context, WORDS_PER_SECTION_TARGET)
+    if outline:
+        summary = f"The section is '{title}'. {outline.get('entry_state', '')}"
+    else:
+        summary = f"The section is '{title}'. Set the scene and begin the narrative."
+    combined = SECTION_SUMMARY_MODE == "combined"
+    i = 0
+    while i == 0 or (i < recorded_parts if replay else block.sections_left()):
+        section_unit, summary_unit = f"section:{title}:{i}", f"summary:{title}:{i}"
+        next_summary = None
+        if journal is not None and section_unit in journal:
+            # Written before a crash or failed attempt; replayed to streaming clients (after a `restart` event) in one piece.
+            section_text = journal.get(section_unit)
+            notify(on_event, "delta", section=title, part=i+1, text=section_text)
+            block.record(None, section_text)
+        else:
+            if replay:
+                section_plan = llm_cache.get(section_plan_key(book, title, i), "section_plan")
+            else:
+                # A guess: a section that falls short of its target is followed by one more.
+                section_plan = {"words": block.next_section_words(), "with_summary": block.sections_left() > 1}
+                await llm_cache.put(section_plan_key(book, title, i), "section_plan", section_plan)
+            words, needs_summary = section_plan["words"], section_plan["with_summary"]
+            print(f"  - Generating part {i+1} (~{words} words, {block.remaining_words} to go)...")
+            on_delta = None
+            if on_event is not None:
+                on_delta = lambda text, part=i+1: on_event("delta", section=title, part=part, text=text)
+            if combined and needs_summary:
+                section_text, next_summary = await generate_section_with_summary(prompt, title, summary, context, words, outline, on_delta)
+                if section_text is None:
+                    section_text = await generate_chapter_section(prompt, title, summary, context, words, outline, on_delta)
+                if journal is not None:
+                    await journal.record(section_unit, section_text)
+                    if next_summary:
+                        await journal.record(summary_unit, next_summary)
+            else:
+                section_text = await run_step(journal, section_unit, lambda: generate_chapter_section(prompt, title, summary, context, words, outline, on_delta))
+            block.record(words, section_text)
         parts.append(section_text)
-        if i < num_sections - 1:
-            print(f"  - Summarizing part {i+1} for continuity...")
-            summary = await summarize_section(section_text)
-        print("  - Pausing for 4 seconds to respect API rate limits...")
-        await asyncio.sleep(4)
-    print(f"--- Finished content for: '{title}' ---")
+        left = recorded_parts - i - 1 if replay else block.sections_left()
+        notify(on_event, "section_done", section=title, part=i+1, parts=len(parts) + left)
+        if left:
+            if next_summary is None:
+                print(f"  - Summarizing part {i+1} for continuity...")
+            summary = next_summary or await run_step(journal, summary_unit, lambda: summarize_section(section_text))
+        i += 1
+    if not replay:
+        await llm_cache.put(section_plan_key(book, title), "section_plan", i)
+    block.finish()
+    print(f"--- Finished content for: '{title}' ({block.written_words} of {block.target_words} words in {len(parts)} parts) ---")
     return "\n\n".join(parts)
 
 # --- Main Orchestration ---
+
 def calculate_book_parameters(num_pages: int) -> tuple[int, int]:
     WORDS_PER_PAGE = 250
     AVG_WORDS_PER_CHAPTER = 10000
@@ -155,35 +505,94 @@ def calculate_book_parameters(num_pages: int) -> tuple[int, int]:
     print(f"Request for {num_pages} pages -> Content pages: {content_pages_for_chapters} -> Aiming for {chapters_needed} chapters of ~{target_words_per_chapter} words each.")
     return chapters_needed, target_words_per_chapter
 
-async def generate_user_prompt_driven_book(prompt: str, num_pages: int) -> dict:
+async def generate_chapters_from_outline(prompt: str, outline: list[dict], context: dict | CompiledContext, word_target: int, max_concurrent: int, progress: Callable[..., None] = None, on_event: Callable[..., None] = None, on_block: Callable[..., None] = None, journal: GenerationJournal = None, plan: BookPlan = None, book: str = None) -> list[dict]:
+    """Writes every chapter concurrently, using the outline instead of the previous chapter for continuity."""
+    semaphore = asyncio.Semaphore(max(1, max_concurrent))
+    plan = plan or BookPlan(chapters=len(outline), chapter_words=word_target)
+    completed = 0
+
+    async def write_chapter(i: int, chapter_outline: dict) -> dict:
+        chapter_heading = f"Chapter - {i+1}: {chapter_outline['title'] or f'Chapter {i+1}'}"
+        async with semaphore:
+            print(f"\n[Generating {chapter_heading}]")
+            block = plan.chapter_block(chapter_heading)
+            chapter_text = await generate_content_block(prompt, chapter_heading, context, block.target_words, chapter_outline, on_event, journal, plan, book)
+        notify(on_block, "chapter", index=i, heading=chapter_heading, content=chapter_text)
+        nonlocal completed
+        completed += 1
+        notify(progress, "chapters", chapter=completed, total_chapters=len(outline))
+        return {"heading": chapter_heading, "content": chapter_text}
+
+    return await asyncio.gather(*(write_chapter(i, ch) for i, ch in enumerate(outline)))
+
+async def generate_user_prompt_driven_book(prompt: str, num_pages: int, parallel_chapters: bool = False, max_concurrent_chapters: int = MAX_CONCURRENT_CHAPTERS, progress: Callable[..., None] = None, on_event: Callable[..., None] = None, on_block: Callable[..., None] = None, journal: GenerationJournal = None, book: str = None) -> dict:
+    """
+    Writes the whole book. `progress` receives stage updates, `on_event` streamed text, and
+    `on_block` each finished prologue, chapter and epilogue, so it can be typeset right away.
+    Every completed step is recorded in `journal`, and steps already in it are not redone.
+    `book` identifies the book in the LLM cache; by default, its prompt, size and chapter mode.
+    """
+    book = book or journal_key(user_input=prompt, num_pages=num_pages, parallel_chapters=parallel_chapters)
     chapters_needed, target_words_per_chapter = calculate_book_parameters(num_pages)
+    plan = BookPlan(num_pages, chapters_needed, target_words_per_chapter)
     
     print("Selecting relevant SWAPI data based on prompt...")
-    data_context = await select_book_data_context(prompt)
+    notify(progress, "data_selection")
+    data_context = await run_step(journal, "data_context", lambda: select_book_data_context(prompt))
+    # Serialized once and shared by every section prompt of the book.
+    compiled_context = compile_data_context(data_context)
     
     print("Generating book components in parallel...")
+    notify(progress, "titles")
     prologue_word_target = int(2 * 250)
     epilogue_word_target = int(1 * 250)
     
+    async def write_framing_block(kind: str, title: str, word_target: int) -> str:
+        text = await generate_content_block(prompt, title, compiled_context, word_target, on_event=on_event, journal=journal, plan=plan, book=book)
+        notify(on_block, kind, content=text)
+        return text
+
     tasks = {
-        "image": generate_book_image(prompt, data_context),
-        "prologue": generate_content_block(prompt, "Prologue", data_context, prologue_word_target),
-        "epilogue": generate_content_block(prompt, "Epilogue", data_context, epilogue_word_target),
-        "titles": generate_chapter_titles(prompt, chapters_needed, data_context)
+        "image": run_step(journal, "image", lambda: generate_book_image(prompt, data_context), is_valid=os.path.exists),
+        "prologue": write_framing_block("prologue", "Prologue", prologue_word_target),
+        "epilogue": write_framing_block("epilogue", "Epilogue", epilogue_word_target),
     }
+    if parallel_chapters:
+        tasks["outline"] = run_step(journal, "outline", lambda: generate_book_outline(prompt, chapters_needed, compiled_context))
+    else:
+        tasks["titles"] = run_step(journal, "chapter_titles", lambda: generate_chapter_titles(prompt, chapters_needed, data_context))
     
-    results = await asyncio.gather(*tasks.values())
-    image_path, prologue_text, epilogue_text, chapter_titles = results
-    
-    final_titles = chapter_titles[:chapters_needed]
-    
-    chapter_texts = []
-    print("\n--- Starting Sequential Chapter Content Generation ---")
-    for i, title in enumerate(final_titles):
-        chapter_heading = f"Chapter - {i+1}: {title}"
-        print(f"\n[Generating {chapter_heading}]")
-        chapter_text = await generate_content_block(prompt, chapter_heading, data_context, target_words_per_chapter)
-        chapter_texts.append({"heading": chapter_heading, "content": chapter_text})
+    results = dict(zip(tasks.keys(), await asyncio.gather(*tasks.values())))
+    image_path, prologue_text, epilogue_text = results["image"], results["prologue"], results["epilogue"]
+    outline = results.get("outline")
+
+    notify(progress, "chapters", chapter=0, total_chapters=len(outline) if outline else chapters_needed)
+    if outline:
+        print(f"\n--- Starting Parallel Chapter Content Generation (up to {max_concurrent_chapters} at a time) ---")
+        chapter_texts = await generate_chapters_from_outline(prompt, outline, compiled_context, target_words_per_chapter, max_concurrent_chapters, progress, on_event, on_block, journal, plan, book)
+    else:
+        chapter_titles = results.get("titles") or await run_step(journal, "chapter_titles", lambda: generate_chapter_titles(prompt, chapters_needed, data_context))
+        final_titles = chapter_titles[:chapters_needed]
+
+        chapter_texts = []
+        print("\n--- Starting Sequential Chapter Content Generation ---")
+        for i, title in enumerate(final_titles):
+            chapter_heading = f"Chapter - {i+1}: {title}"
+            print(f"\n[Generating {chapter_heading}]")
+            block = plan.chapter_block(chapter_heading)
+            chapter_text = await generate_content_block(prompt, chapter_heading, compiled_context, block.target_words, on_event=on_event, journal=journal, plan=plan, book=book)
+            chapter_texts.append({"heading": chapter_heading, "content": chapter_text})
+            notify(on_block, "chapter", index=i, heading=chapter_heading, content=chapter_text)
+            notify(progress, "chapters", chapter=i+1, total_chapters=len(final_titles))
+
+    plan_report = plan.report()
+    plan.log()
+    print(f"Book plan: {plan_report['actual_words']} of {plan_report['planned_words']} words in {plan_report['actual_sections']} "
+          f"sections ({plan_report['planned_sections']} planned), word yield {plan_report['word_yield']}.")
+
+    context_report = compiled_context.report()
+    print(f"Data context: {context_report['context_tokens']} tokens instead of {context_report['raw_context_tokens']} "
+          f"across {context_report['prompts']} prompts, saving ~{context_report['input_tokens_saved']} input tokens.")
 
     try:
         with open("preface.txt", "r", encoding='utf-8') as f: preface_text = f.read()
@@ -198,4 +607,6 @@ async def generate_user_prompt_driven_book(prompt: str, num_pages: int) -> dict:
         "prologue_text": prologue_text,
         "epilogue_text": epilogue_text,
         "chapters": chapter_texts,
+        "context_token_report": context_report,
+        "plan_report": plan_report,
     }
\ No newline at end of file
@@ -0,0 +1,100 @@
+# app/context_compiler.py
+import hashlib
+import json
+import math
+from collections import OrderedDict
+
+CONTEXT_TOKEN_BUDGET = 600
+CHARS_PER_TOKEN = 4
+MAX_CACHED_CONTEXTS = 128
+
+# Fields worth sending to the model, most important first. Anything else (url, created,
+# edited, opening_crawl, ...) is dropped. When the budget is tight, fields are cut from the end.
+FIELD_PRIORITY = {
+    "people": ["gender", "birth_year", "species", "homeworld", "height", "mass", "hair_color", "eye_color", "skin_color", "starships", "vehicles"],
+    "planets": ["climate", "terrain", "population", "gravity", "diameter", "surface_water", "rotation_period", "orbital_period"],
+    "starships": ["model", "starship_class", "manufacturer", "crew", "passengers", "length", "hyperdrive_rating", "max_atmosphering_speed", "MGLT", "cargo_capacity", "consumables", "cost_in_credits"],
+    "vehicles": ["model", "vehicle_class", "manufacturer", "crew", "passengers", "length", "max_atmosphering_speed", "cargo_capacity", "consumables", "cost_in_credits"],
+    "species": ["classification", "designation", "language", "homeworld", "average_height", "average_lifespan", "skin_colors", "hair_colors", "eye_colors"],
+    "films": ["episode_id", "director", "release_date"],
+}
+EMPTY_VALUES = {"", "unknown", "n/a", "none"}
+
+def estimate_tokens(text: str) -> int:
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+class CompiledContext:
+    """A data context serialized once per book, plus the token counts needed to track savings."""
+    __slots__ = ("text", "tokens", "raw_tokens", "uses")
+
+    def __init__(self, text: str, raw_tokens: int):
+        self.text = text
+        self.tokens = estimate_tokens(text)
+        self.raw_tokens = raw_tokens
+        self.uses = 0
+
+    def report(self) -> dict:
+        return {
+            "context_tokens": self.tokens,
+            "raw_context_tokens": self.raw_tokens,
+            "prompts": self.uses,
+            "input_tokens_saved": self.uses * (self.raw_tokens - self.tokens),
+        }
+
+
+def _format_value(value) -> str | None:
+    if isinstance(value, list):
+        value = ", ".join(str(v) for v in value if v)
+    if value is None or str(value).strip().lower() in EMPTY_VALUES:
+        return None
+    return str(value)
+
+def _render(data_context: dict, max_fields: int, max_entities: int) -> str:
+    lines = []
+    for category, entities in data_context.items():
+        if not entities:
+            continue
+        lines.append(f"{category.upper()}:")
+        for entity in entities[:max_entities]:
+            fields = []
+            for field in FIELD_PRIORITY.get(category, [])[:max_fields]:
+                value = _format_value(entity.get(field))
+                if value is not None:
+                    fields.append(f"{field}: {value}")
+            name = entity.get("name") or entity.get("title")
+            lines.append(f"- {name}" + (f" | {'; '.join(fields)}" if fields else ""))
+    return "\n".join(lines)
+
+def _compile(data_context: dict, token_budget: int) -> str:
+    most_fields = max((len(fields) for fields in FIELD_PRIORITY.values()), default=0)
+    most_entities = max((len(entities) for entities in data_context.values()), default=0)
+    # Shed the least important fields first, then entities from the end of each category.
+    for max_fields in range(most_fields, -1, -1):
+        text = _render(data_context, max_fields, most_entities)
+        if estimate_tokens(text) <= token_budget:
+            return text
+    for max_entities in range(most_entities - 1, 0, -1):
+        text = _render(data_context, 0, max_entities)
+        if estimate_tokens(text) <= token_budget:
+            return text
+    return _render(data_context, 0, 1)
+
+_cache: OrderedDict[str, CompiledContext] = OrderedDict()
+
+def compile_data_context(data_context: dict, token_budget: int = CONTEXT_TOKEN_BUDGET) -> CompiledContext:
+    """
+    Serializes the selected SWAPI entities into a compact, field-filtered text that fits
+    `token_budget`. Results are cached by content, so identical contexts compile once.
+    """
+    raw = json.dumps(data_context, indent=2)
+    key = hashlib.sha256(f"{token_budget}:{raw}".encode("utf-8")).hexdigest()
+    if key in _cache:
+        _cache.move_to_end(key)
+        cached = _cache[key]
+        return CompiledContext(cached.text, cached.raw_tokens)
+    compiled = CompiledContext(_compile(data_context, token_budget), estimate_tokens(raw))
+    _cache[key] = compiled
+    if len(_cache) > MAX_CACHED_CONTEXTS:
+        _cache.popitem(last=False)
+    return CompiledContext(compiled.text, compiled.raw_tokens)
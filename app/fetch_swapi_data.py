@@ -1,81 +1,174 @@
 # fetch_swapi_data.py
+"""
+Syncs the SWAPI dataset into swapi_data/.
+
+Categories are fetched concurrently. Once the first page of a category reports its `count`,
+the remaining pages are requested in parallel, all under one limit on in-flight requests.
+Pages are requested conditionally (ETag / Last-Modified from the previous sync), and a
+category whose content hash is unchanged is not rewritten. Files are replaced atomically
+and only when every page was fetched, so an interrupted sync never leaves a truncated file.
+
+    python app/fetch_swapi_data.py [--base-url http://127.0.0.1:8001/api] [--force]
+"""
 import httpx
+import argparse
 import asyncio
+import hashlib
 import json
+import math
 import os
-import warnings
-
-# Ignore SSL certificate warnings (as seen in your original swapi_client.py)
-warnings.filterwarnings("ignore", message="Unverified HTTPS request")
+import time
 
-SWAPI_BASE_URL = "https://swapi.dev/api"
+SWAPI_BASE_URL = os.getenv("SWAPI_BASE_URL", "https://swapi.dev/api")
 OUTPUT_DIR = "swapi_data"
+# Not a .json file, so SwapiStore does not mistake it for a category.
+MANIFEST_FILENAME = ".sync_manifest"
+CATEGORIES = ["people", "planets", "starships", "vehicles", "species", "films"]
+MAX_CONCURRENT_REQUESTS = 6
+MAX_ATTEMPTS = 4
+RETRY_BACKOFF_SECONDS = 0.5
+
+
+class IncompleteFetch(Exception):
+    """Raised when a category could not be fetched in full; its file is left untouched."""
+
+
+def content_hash(data: list) -> str:
+    return hashlib.sha256(json.dumps(data, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+def write_json_atomic(path: str, data, **dump_kwargs):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, **dump_kwargs)
+    os.replace(tmp_path, path)
+
+def load_json(path: str, default):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return default
 
 
-async def fetch_all_for_category(client: httpx.AsyncClient, category: str) -> list:
+async def fetch_page(client: httpx.AsyncClient, semaphore: asyncio.Semaphore, url: str, validators: dict = None) -> tuple[dict | None, dict]:
     """
-    Fetches all data for a given category (e.g., 'people', 'planets')
-    by following the pagination links.
+    Fetches one listing page, retrying transient failures. Returns (data, validators);
+    data is None when the server answered 304 Not Modified.
     """
-    all_results = []
-    next_url = f"{SWAPI_BASE_URL}/{category}/"
-    print(f"--- Starting fetch for category: {category} ---")
-
-    while next_url:
+    headers = {}
+    if validators:
+        if validators.get("etag"):
+            headers["If-None-Match"] = validators["etag"]
+        if validators.get("last_modified"):
+            headers["If-Modified-Since"] = validators["last_modified"]
+    for attempt in range(1, MAX_ATTEMPTS + 1):
         try:
-            print(f"Fetching page: {next_url}")
-            response = await client.get(next_url)
-            response.raise_for_status()  # Raise an exception for bad status codes (4xx or 5xx)
-            
-            data = response.json()
-            
-            # Add the results from the current page to our master list
-            all_results.extend(data.get("results", []))
-            
-            # Get the URL for the next page, or None if it's the last page
-            next_url = data.get("next")
-            
-            # Be a good API citizen and wait a tiny bit between requests
-            await asyncio.sleep(0.1) 
-
-        except httpx.RequestError as e:
-            print(f"An error occurred while requesting {e.request.url!r}: {e}")
-            break # Stop trying on an error
-            
-    print(f"--- Finished fetch for {category}. Found {len(all_results)} items. ---\n")
-    return all_results
+            async with semaphore:
+                response = await client.get(url, headers=headers)
+            if response.status_code == 304:
+                return None, validators
+            if response.status_code == 429 or response.status_code >= 500:
+                raise httpx.HTTPStatusError(f"Server error {response.status_code}", request=response.request, response=response)
+            response.raise_for_status()
+            return response.json(), {"etag": response.headers.get("etag"), "last_modified": response.headers.get("last-modified")}
+        except (httpx.TransportError, httpx.HTTPStatusError) as e:
+            retryable = isinstance(e, httpx.TransportError) or e.response.status_code == 429 or e.response.status_code >= 500
+            if not retryable or attempt == MAX_ATTEMPTS:
+                raise IncompleteFetch(f"{url}: {e}") from e
+            await asyncio.sleep(RETRY_BACKOFF_SECONDS * 2 ** (attempt - 1))
+
+async def sync_category(client: httpx.AsyncClient, semaphore: asyncio.Semaphore, base_url: str, category: str,
+                        output_dir: str, previous: dict, force: bool = False) -> dict:
+    """Fetches every page of `category` and saves it if it changed. Returns the category's new manifest entry."""
+    file_path = os.path.join(output_dir, f"{category}.json")
+    existing = None if force else load_json(file_path, None)
+    # Validators are only usable if the file they describe is still on disk.
+    page_validators = previous.get("pages", {}) if existing is not None else {}
+
+    def page_url(page: int) -> str:
+        return f"{base_url}/{category}/" + (f"?page={page}" if page > 1 else "")
+
+    first, first_validators = await fetch_page(client, semaphore, page_url(1), page_validators.get("1"))
+    if first is None:
+        count, page_size = previous["count"], previous["page_size"]
+        first_results = existing[:page_size]
+    else:
+        count, first_results = first.get("count", 0), first.get("results", [])
+        page_size = len(first_results) or 1
+    num_pages = max(1, math.ceil(count / page_size))
+    print(f"--- {category}: {count} items on {num_pages} pages ---")
+
+    async def fetch_rest(page: int) -> tuple[list, dict, bool]:
+        validators = page_validators.get(str(page)) if previous.get("page_size") == page_size else None
+        data, new_validators = await fetch_page(client, semaphore, page_url(page), validators)
+        if data is None:
+            return existing[(page - 1) * page_size:page * page_size], new_validators, False
+        return data.get("results", []), new_validators, True
+
+    rest = await asyncio.gather(*(fetch_rest(page) for page in range(2, num_pages + 1)))
+    results = list(first_results)
+    validators = {"1": first_validators}
+    for page, (page_results, new_validators, _) in enumerate(rest, start=2):
+        results.extend(page_results)
+        validators[str(page)] = new_validators
+    if len(results) < count:
+        raise IncompleteFetch(f"{category}: got {len(results)} of {count} items")
+
+    entry = {"count": count, "page_size": page_size, "pages": validators, "sha256": content_hash(results)}
+    modified = first is not None or any(changed for _, _, changed in rest)
+    if not modified:
+        print(f"{category}: not modified, skipped.")
+    elif existing is not None and entry["sha256"] == content_hash(existing):
+        print(f"{category}: content unchanged, skipped.")
+    else:
+        write_json_atomic(file_path, results, ensure_ascii=False, indent=4)
+        print(f"Successfully saved data to {file_path}")
+    return entry
+
+async def sync(base_url: str = SWAPI_BASE_URL, output_dir: str = OUTPUT_DIR, categories: list[str] = CATEGORIES,
+               max_concurrent_requests: int = MAX_CONCURRENT_REQUESTS, force: bool = False, client: httpx.AsyncClient = None) -> dict:
+    """Syncs `categories` concurrently. Returns {category: "ok" | error message}."""
+    os.makedirs(output_dir, exist_ok=True)
+    manifest_path = os.path.join(output_dir, MANIFEST_FILENAME)
+    manifest = load_json(manifest_path, {})
+    semaphore = asyncio.Semaphore(max(1, max_concurrent_requests))
+    owns_client = client is None
+    if owns_client:
+        client = httpx.AsyncClient(timeout=20.0, limits=httpx.Limits(max_connections=max_concurrent_requests))
+    try:
+        outcomes = await asyncio.gather(
+            *(sync_category(client, semaphore, base_url.rstrip("/"), category, output_dir, manifest.get(category, {}), force)
+              for category in categories),
+            return_exceptions=True)
+    finally:
+        if owns_client:
+            await client.aclose()
+    status = {}
+    for category, outcome in zip(categories, outcomes):
+        if isinstance(outcome, BaseException):
+            print(f"Could not sync {category}, keeping the previous file: {outcome}")
+            status[category] = str(outcome)
+        else:
+            manifest[category] = outcome
+            status[category] = "ok"
+    write_json_atomic(manifest_path, manifest, indent=2)
+    return status
 
 async def main():
     """
     Main function to orchestrate the fetching and saving of all data.
     """
-    # Create the output directory if it doesn't exist
-    os.makedirs(OUTPUT_DIR, exist_ok=True)
-    
-    # List of categories you want to download
-    categories_to_fetch = [
-        "people",
-        "planets",
-        "starships",
-        "vehicles",
-        "species",
-        "films"
-    ]
-    
-    # Use an async client to make efficient requests
-    async with httpx.AsyncClient(verify=False, timeout=20.0) as client:
-        for category in categories_to_fetch:
-            # Fetch all data for the current category
-            category_data = await fetch_all_for_category(client, category)
-            
-            if category_data:
-                # Define the output file path
-                file_path = os.path.join(OUTPUT_DIR, f"{category}.json")
-                
-                # Write the collected data to a JSON file
-                with open(file_path, "w", encoding="utf-8") as f:
-                    json.dump(category_data, f, ensure_ascii=False, indent=4)
-                print(f"Successfully saved data to {file_path}")
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default=SWAPI_BASE_URL)
+    parser.add_argument("--output-dir", default=OUTPUT_DIR)
+    parser.add_argument("--categories", nargs="+", default=CATEGORIES)
+    parser.add_argument("--concurrency", type=int, default=MAX_CONCURRENT_REQUESTS, help="Maximum requests in flight.")
+    parser.add_argument("--force", action="store_true", help="Ignore the previous sync and fetch everything.")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    status = await sync(args.base_url, args.output_dir, args.categories, args.concurrency, args.force)
+    print(f"Sync finished in {time.perf_counter() - start:.2f}s: {status}")
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    asyncio.run(main())
@@ -0,0 +1,188 @@
+# app/hedging.py
+import asyncio
+import math
+import os
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable
+from app.llm_scheduler import llm_scheduler
+from app.metrics import Counter, registry, span
+
+# A call still running after this percentile of its stage's recent latencies gets a duplicate.
+LLM_HEDGE_PERCENTILE = float(os.getenv("LLM_HEDGE_PERCENTILE", "95"))
+# Duplicates allowed per call (0.05: one in twenty), banked up to LLM_HEDGE_BURST at a time. 0 turns hedging off.
+LLM_HEDGE_BUDGET = float(os.getenv("LLM_HEDGE_BUDGET", "0.05"))
+LLM_HEDGE_BURST = float(os.getenv("LLM_HEDGE_BURST", "5"))
+# No hedging for a stage until this many of its calls have been timed.
+LLM_HEDGE_MIN_SAMPLES = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "50"))
+LATENCY_WINDOW = 500
+# A call (or, for a streamed section, the whole stream) that takes longer than this is abandoned.
+LLM_CALL_DEADLINE_SECONDS = float(os.getenv("LLM_CALL_DEADLINE_SECONDS", "300"))
+LLM_STREAM_DEADLINE_SECONDS = float(os.getenv("LLM_STREAM_DEADLINE_SECONDS", "900"))
+
+HEDGES = registry.register(Counter(
+    "book_llm_hedges_total", "Calls that ran past the hedge delay, by what happened to the duplicate.", ("stage", "outcome")))
+DEADLINES_EXCEEDED = registry.register(Counter(
+    "book_llm_deadlines_exceeded_total", "LLM calls abandoned at their deadline.", ("stage",)))
+
+class LlmDeadlineExceeded(TimeoutError):
+    """Raised when an LLM call runs past its deadline."""
+
+
+def _percentile(values, q: float) -> float | None:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, math.ceil(q / 100 * len(ordered)) - 1)]
+
+def _consume_exception(task: asyncio.Task):
+    if not task.cancelled():
+        task.exception()
+
+async def with_deadline(stage: str, awaitable: Awaitable, seconds: float = LLM_CALL_DEADLINE_SECONDS):
+    """Awaits `awaitable`, cancelling it and raising LlmDeadlineExceeded after `seconds`."""
+    try:
+        return await asyncio.wait_for(awaitable, seconds)
+    except asyncio.TimeoutError:
+        DEADLINES_EXCEEDED.inc(stage=stage)
+        raise LlmDeadlineExceeded(f"The {stage} call did not finish within {seconds:g}s.") from None
+
+
+class HedgePolicy:
+    """
+    Sends a duplicate of an LLM call that is taking longer than `percentile` of its stage's
+    recent calls, and returns whichever attempt succeeds first; the other is cancelled.
+    Duplicates are paid for from a credit bucket that gains `budget` per call, so at most that
+    share of calls is ever sent twice, and they are only sent while the LLM scheduler has a
+    slot nobody is waiting for, so hedging cannot add load when the API is already saturated.
+    """
+
+    def __init__(self, percentile: float = LLM_HEDGE_PERCENTILE, budget: float = LLM_HEDGE_BUDGET,
+                 burst: float = LLM_HEDGE_BURST, min_samples: int = LLM_HEDGE_MIN_SAMPLES):
+        self.percentile = percentile
+        self.budget = budget
+        self.burst = burst
+        self.min_samples = min_samples
+        self.enabled = budget > 0
+        self._background: set[asyncio.Task] = set()
+        self.reset()
+
+    def reset(self):
+        self.credit = min(self.burst, 1.0)
+        # Per stage: how long recent calls kept their callers waiting, hedged or not.
+        self._latencies: dict[str, deque[float]] = {}
+        self._counts: dict[str, dict] = {}
+
+    def hedge_delay(self, stage: str) -> float | None:
+        """How long a call of `stage` may run before it is hedged, or None while too few calls have been timed."""
+        samples = self._latencies.get(stage)
+        if not self.enabled or samples is None or len(samples) < self.min_samples:
+            return None
+        return _percentile(samples, self.percentile)
+
+    def _record(self, stage: str, latency: float, outcome: str = None):
+        self._latencies.setdefault(stage, deque(maxlen=LATENCY_WINDOW)).append(latency)
+        counts = self._counts.setdefault(stage, {"calls": 0, "hedged": 0, "won": 0, "lost": 0, "no_budget": 0, "no_capacity": 0})
+        counts["calls"] += 1
+        if outcome is not None:
+            HEDGES.inc(stage=stage, outcome=outcome)
+            counts[outcome] += 1
+            counts["hedged"] += outcome in ("won", "lost")
+
+    async def call(self, stage: str, attempt: Callable[[], Awaitable[Any]],
+                   discard: Callable[[Any], Awaitable[None]] = None) -> Any:
+        """
+        Runs `attempt()`, hedged as described above. `discard` is given the result of an
+        attempt that succeeded but lost the race, e.g. to close a stream nobody will read.
+        """
+        self.credit = min(self.burst, self.credit + self.budget)
+        started = time.perf_counter()
+        delay = self.hedge_delay(stage)
+        if delay is None:
+            result = await attempt()
+            self._record(stage, time.perf_counter() - started)
+            return result
+
+        primary = asyncio.ensure_future(attempt())
+        primary.add_done_callback(_consume_exception)
+        try:
+            done, _ = await asyncio.wait({primary}, timeout=delay)
+        except asyncio.CancelledError:
+            primary.cancel()
+            raise
+        if done:
+            result = primary.result()
+            self._record(stage, time.perf_counter() - started)
+            return result
+
+        if self.credit < 1:
+            outcome = "no_budget"
+        elif not llm_scheduler.try_acquire():
+            outcome = "no_capacity"
+        else:
+            self.credit -= 1
+            return await self._race(stage, primary, attempt, discard, started)
+        try:
+            result = await primary
+        except asyncio.CancelledError:
+            primary.cancel()
+            raise
+        self._record(stage, time.perf_counter() - started, outcome)
+        return result
+
+    async def _race(self, stage: str, primary: asyncio.Future, attempt: Callable[[], Awaitable[Any]],
+                    discard: Callable[[Any], Awaitable[None]], started: float) -> Any:
+        """Runs a duplicate of `primary` on the scheduler slot just taken, and returns the first success."""
+        async def hedged():
+            with span("hedge", stage):
+                return await attempt()
+
+        hedge = asyncio.ensure_future(hedged())
+        hedge.add_done_callback(_consume_exception)
+        pending = {primary, hedge}
+        winner = None
+        try:
+            while pending and winner is None:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                winner = next((t for t in (primary, hedge) if t in done and not t.cancelled() and t.exception() is None), None)
+        finally:
+            for task in pending:
+                task.cancel()
+            for task in (primary, hedge):
+                if task is not winner and discard is not None and task.done() and not task.cancelled() and task.exception() is None:
+                    self._discard(discard, task.result())
+            llm_scheduler.release()
+        if winner is None:
+            # Both failed: report the original call's error.
+            return primary.result()
+        self._record(stage, time.perf_counter() - started, "lost" if winner is primary else "won")
+        return winner.result()
+
+    def _discard(self, discard: Callable[[Any], Awaitable[None]], result: Any):
+        task = asyncio.ensure_future(discard(result))
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+        task.add_done_callback(_consume_exception)
+
+    def report(self) -> dict:
+        """Hedge counts and the latency percentiles callers saw, per stage, over the recent calls."""
+        stages = {}
+        for stage, counts in self._counts.items():
+            latencies = self._latencies[stage]
+            stages[stage] = {
+                **counts,
+                "hedge_rate": round(counts["hedged"] / counts["calls"], 4),
+                "hedge_delay_s": self.hedge_delay(stage),
+                **{f"p{q}_s": _percentile(latencies, q) for q in (50, 95, 99)},
+            }
+        return {
+            "enabled": self.enabled,
+            "percentile": self.percentile,
+            "budget": self.budget,
+            "credit": round(self.credit, 3),
+            "call_deadline_s": LLM_CALL_DEADLINE_SECONDS,
+            "stream_deadline_s": LLM_STREAM_DEADLINE_SECONDS,
+            "stages": stages,
+        }
+
+hedge_policy = HedgePolicy()
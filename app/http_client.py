@@ -0,0 +1,31 @@
+# app/http_client.py
+import asyncio
+import httpx
+
+HTTP_TIMEOUT = httpx.Timeout(30.0, connect=10.0)
+HTTP_LIMITS = httpx.Limits(max_connections=50, max_keepalive_connections=20, keepalive_expiry=30.0)
+# HTTP/2 multiplexes concurrent requests over one connection (httpx[http2] in requirements.txt);
+# servers that do not offer it are spoken to over HTTP/1.1.
+
+_client: httpx.AsyncClient = None
+_client_loop = None
+
+def get_http_client() -> httpx.AsyncClient:
+    """
+    Returns the process-wide pooled client shared by the OpenAI calls, image downloads and
+    SWAPI lookups, so requests reuse kept-alive connections instead of paying for a new
+    client (and TLS handshake) each time. Pooled connections belong to the
+    event loop they were opened on, so a new client is created when the loop changes.
+    """
+    global _client, _client_loop
+    loop = asyncio.get_running_loop()
+    if _client is None or _client.is_closed or _client_loop is not loop:
+        _client = httpx.AsyncClient(timeout=HTTP_TIMEOUT, limits=HTTP_LIMITS, http2=True, follow_redirects=True)
+        _client_loop = loop
+    return _client
+
+async def close_http_client():
+    global _client
+    if _client is not None and not _client.is_closed:
+        await _client.aclose()
+    _client = None
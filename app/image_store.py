@@ -0,0 +1,74 @@
+# app/image_store.py
+import hashlib
+import os
+import tempfile
+from app.http_client import get_http_client
+
+IMAGE_DIR = "generated_images"
+# The cover image is printed at most ~65mm wide (85% of the 76mm text block); 800px is ~300 DPI.
+PRINT_IMAGE_MAX_PX = int(os.getenv("PRINT_IMAGE_MAX_PX", "800"))
+PRINT_IMAGE_QUALITY = int(os.getenv("PRINT_IMAGE_QUALITY", "85"))
+DOWNLOAD_CHUNK_BYTES = 64 * 1024
+
+# Images are stored under the SHA-256 of their content, so a picture that is generated (or
+# served from the cache) twice is only ever kept once:
+#   generated_images/<sha256>.png        the original as returned by the API
+#   generated_images/<sha256>.print.jpg  the downscaled, compressed copy embedded in PDFs
+
+def _commit(tmp_path: str, digest: str, extension: str) -> str:
+    path = os.path.join(IMAGE_DIR, f"{digest}{extension}")
+    if os.path.exists(path):
+        os.remove(tmp_path)
+    else:
+        os.replace(tmp_path, path)
+    return path
+
+def _temp_file(directory: str = IMAGE_DIR):
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".part")
+    return os.fdopen(fd, "wb"), tmp_path
+
+def save_image_bytes(data: bytes, extension: str = ".png") -> str:
+    f, tmp_path = _temp_file()
+    with f:
+        f.write(data)
+    return _commit(tmp_path, hashlib.sha256(data).hexdigest(), extension)
+
+async def download_image(url: str, extension: str = ".png") -> str:
+    """Streams an image to disk in chunks through the shared client, hashing it on the way."""
+    digest = hashlib.sha256()
+    f, tmp_path = _temp_file()
+    try:
+        with f:
+            async with get_http_client().stream("GET", url) as response:
+                response.raise_for_status()
+                async for chunk in response.aiter_bytes(DOWNLOAD_CHUNK_BYTES):
+                    digest.update(chunk)
+                    f.write(chunk)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+    return _commit(tmp_path, digest.hexdigest(), extension)
+
+def print_variant(image_path: str) -> str:
+    """
+    Returns a print-sized JPEG copy of `image_path`, creating it on first use. Falls back to the
+    original if it cannot be converted.
+    """
+    stem = os.path.splitext(os.path.basename(image_path))[0]
+    path = os.path.join(os.path.dirname(image_path), f"{stem}.print.jpg")
+    if os.path.exists(path):
+        return path
+    try:
+        from PIL import Image
+        with Image.open(image_path) as image:
+            image = image.convert("RGB")
+        image.thumbnail((PRINT_IMAGE_MAX_PX, PRINT_IMAGE_MAX_PX))
+        f, tmp_path = _temp_file(os.path.dirname(image_path) or ".")
+        with f:
+            image.save(f, "JPEG", quality=PRINT_IMAGE_QUALITY, optimize=True, progressive=True)
+        os.replace(tmp_path, path)
+        return path
+    except Exception as e:
+        print(f"Could not create a print copy of {image_path}, using the original: {e}")
+        return image_path
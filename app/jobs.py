@@ -0,0 +1,260 @@
+# app/jobs.py
+import asyncio
+import itertools
+import time
+import traceback
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable
+from app.metrics import Counter, Gauge, Histogram, registry
+
+QUEUED, RUNNING, COMPLETED, FAILED, CANCELLED = "queued", "running", "completed", "failed", "cancelled"
+FINISHED_STATES = {COMPLETED, FAILED, CANCELLED}
+
+JOBS_FINISHED = registry.register(Counter("book_jobs_finished_total", "Jobs that finished, by final status.", ("status",)))
+JOB_SECONDS = registry.register(Histogram("book_job_seconds", "Time from a job starting to it finishing, by final status.", ("status",)))
+JOBS_IN_FLIGHT = registry.register(Gauge("book_jobs", "Jobs currently queued or running.", ("status",)))
+
+class JobQueueFull(Exception):
+    """Raised when a job is submitted while the queue is at its configured depth."""
+
+
+@dataclass
+class Job:
+    request: Any
+    # Jobs submitted with the same key share one generation (see JobManager.submit).
+    key: str = None
+    # Queued jobs with a lower value start first.
+    priority: int = 1
+    id: str = field(default_factory=lambda: uuid.uuid4().hex)
+    status: str = QUEUED
+    stage: str = "queued"
+    progress: dict = field(default_factory=dict)
+    result: Any = None
+    error: str = None
+    created_at: float = field(default_factory=time.time)
+    started_at: float = None
+    finished_at: float = None
+    attempts: int = 0
+    task: asyncio.Task = field(default=None, repr=False)
+    # The generation journal the job resumes from, when it is not the one `key` names (a
+    # duplicate request's suffixed journal); set by the runner once the journal is open.
+    journal_key: str = None
+    # Timing spans of the job's pipeline, kept across retries (an app.metrics.Trace set by the runner).
+    trace: Any = field(default=None, repr=False)
+    # One event queue per connected streaming client; each is dropped when its client disconnects.
+    subscribers: list[asyncio.Queue] = field(default_factory=list, repr=False)
+
+    def report(self, stage: str, **detail):
+        """Progress callback handed to the pipeline; records the current stage and its details."""
+        self.stage = stage
+        self.progress = detail
+        self.emit("progress", stage=stage, **detail)
+
+    def emit(self, event: str, **data):
+        """Event callback handed to the pipeline; forwards text as it is produced to streaming clients."""
+        for queue in self.subscribers:
+            queue.put_nowait((event, data))
+
+    def subscribe(self) -> asyncio.Queue:
+        queue = asyncio.Queue()
+        self.subscribers.append(queue)
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue):
+        if queue in self.subscribers:
+            self.subscribers.remove(queue)
+
+    def to_dict(self) -> dict:
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "stage": self.stage,
+            "progress": self.progress,
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "attempts": self.attempts,
+            "priority": self.priority,
+        }
+
+
+class JobManager:
+    """
+    Runs submitted jobs on a fixed number of background workers fed by a bounded queue,
+    highest priority (lowest value) first and in submission order within a priority.
+    A job that raises is run again, up to `max_attempts` times in total; the runner is expected
+    to resume from its own journal rather than start over.
+    Finished jobs are kept for status lookups until `max_finished_jobs` newer ones replace them.
+
+    Jobs submitted with a key are deduplicated: a submission whose key matches a queued or
+    running job attaches to it, and one matching a recently completed job gets that job back
+    (the `max_cached_results` most recently used, for at most `result_ttl` seconds, as long as
+    `is_reusable(job)` still holds).
+    """
+
+    def __init__(self, runner: Callable[[Job], Awaitable[Any]], num_workers: int = 2,
+                 max_queue_depth: int = 10, max_finished_jobs: int = 500, max_attempts: int = 1,
+                 max_cached_results: int = 100, result_ttl: float = 24 * 3600,
+                 is_reusable: Callable[[Job], bool] = None):
+        self.runner = runner
+        self.num_workers = num_workers
+        self.max_attempts = max(1, max_attempts)
+        self.max_cached_results = max_cached_results
+        self.result_ttl = result_ttl
+        self.is_reusable = is_reusable
+        self.in_flight: dict[str, Job] = {}
+        self.result_cache: OrderedDict[str, Job] = OrderedDict()
+        self.stats = {"submitted": 0, "coalesced": 0, "cache_hits": 0, "cache_evictions": 0}
+        self.max_queue_depth = max_queue_depth
+        self.max_finished_jobs = max_finished_jobs
+        self.jobs: OrderedDict[str, Job] = OrderedDict()
+        self.queue: asyncio.PriorityQueue = None
+        self._sequence = itertools.count()
+        self.workers: list[asyncio.Task] = []
+        self.stopping = False
+
+    async def start(self):
+        self.stopping = False
+        self.queue = asyncio.PriorityQueue(maxsize=self.max_queue_depth)
+        self.workers = [asyncio.create_task(self._worker(i)) for i in range(self.num_workers)]
+        print(f"Job manager started with {self.num_workers} workers and a queue depth of {self.max_queue_depth}.")
+
+    async def stop(self):
+        self.stopping = True
+        for worker in self.workers:
+            worker.cancel()
+        await asyncio.gather(*self.workers, return_exceptions=True)
+        self.workers = []
+
+    def submit(self, request: Any, key: str = None, force_new: bool = False, priority: int = 1, journal_key: str = None) -> Job:
+        """
+        Queues `request`, or returns the in-flight or cached job with the same `key`.
+        `force_new` always starts a fresh job, whose result then replaces the cached one.
+        `journal_key` names the journal a new job resumes from.
+        """
+        self.stats["submitted"] += 1
+        if key is not None and not force_new:
+            existing = self._find(key)
+            if existing is not None:
+                return existing
+        job = Job(request=request, key=key, priority=priority, journal_key=journal_key)
+        try:
+            self.queue.put_nowait((priority, next(self._sequence), job))
+        except asyncio.QueueFull:
+            raise JobQueueFull(f"The job queue is full ({self.max_queue_depth} waiting). Try again later.")
+        self.jobs[job.id] = job
+        if key is not None:
+            self.in_flight[key] = job
+        self._prune()
+        return job
+
+    def _find(self, key: str) -> Job | None:
+        job = self.in_flight.get(key)
+        if job is not None and job.status not in FINISHED_STATES:
+            self.stats["coalesced"] += 1
+            return job
+        job = self.result_cache.get(key)
+        if job is None:
+            return None
+        if time.time() - job.finished_at > self.result_ttl or (self.is_reusable and not self.is_reusable(job)):
+            del self.result_cache[key]
+            self.stats["cache_evictions"] += 1
+            return None
+        self.result_cache.move_to_end(key)
+        # Keep it available for status lookups even if it had been pruned.
+        self.jobs[job.id] = job
+        self.jobs.move_to_end(job.id)
+        self.stats["cache_hits"] += 1
+        return job
+
+    def get(self, job_id: str) -> Job | None:
+        return self.jobs.get(job_id)
+
+    def cancel(self, job_id: str) -> bool:
+        """Cancels a queued or running job. Returns False if it had already finished."""
+        job = self.jobs.get(job_id)
+        if job is None or job.status in FINISHED_STATES:
+            return False
+        if job.task is not None:
+            job.task.cancel()
+        else:
+            # Still queued: the worker that picks it up will skip it.
+            self._finish(job, CANCELLED)
+        return True
+
+    def queue_size(self) -> int:
+        return self.queue.qsize() if self.queue else 0
+
+    def free_slots(self) -> int:
+        return self.max_queue_depth - self.queue_size()
+
+    def update_gauges(self):
+        """Refreshes the queued / running job gauges, e.g. before the metrics are scraped."""
+        running = sum(1 for job in self.jobs.values() if job.status == RUNNING)
+        JOBS_IN_FLIGHT.set(self.queue_size(), status=QUEUED)
+        JOBS_IN_FLIGHT.set(running, status=RUNNING)
+
+    def _finish(self, job: Job, status: str, error: str = None):
+        job.status = status
+        job.stage = status
+        job.error = error
+        job.finished_at = time.time()
+        JOBS_FINISHED.inc(status=status)
+        if job.started_at is not None:
+            JOB_SECONDS.observe(job.finished_at - job.started_at, status=status)
+        if job.key is not None:
+            if self.in_flight.get(job.key) is job:
+                del self.in_flight[job.key]
+            if status == COMPLETED:
+                self.result_cache[job.key] = job
+                self.result_cache.move_to_end(job.key)
+                while len(self.result_cache) > self.max_cached_results:
+                    self.result_cache.popitem(last=False)
+                    self.stats["cache_evictions"] += 1
+        job.emit(status, **job.to_dict())
+
+    def _prune(self):
+        finished = [job_id for job_id, job in self.jobs.items() if job.status in FINISHED_STATES]
+        for job_id in finished[:max(0, len(finished) - self.max_finished_jobs)]:
+            del self.jobs[job_id]
+
+    async def _worker(self, worker_id: int):
+        while True:
+            _, _, job = await self.queue.get()
+            try:
+                if job.status == CANCELLED:
+                    continue
+                job.status = RUNNING
+                job.started_at = time.time()
+                try:
+                    job.result = await self._run(job)
+                    self._finish(job, COMPLETED)
+                except asyncio.CancelledError:
+                    if self.stopping or not job.task.cancelled():
+                        self._finish(job, CANCELLED, "The server shut down before the job finished.")
+                        raise
+                    print(f"Job {job.id} was cancelled.")
+                    self._finish(job, CANCELLED)
+                except Exception as e:
+                    print(f"Job {job.id} failed on worker {worker_id}: {e}")
+                    traceback.print_exc()
+                    self._finish(job, FAILED, str(e))
+                finally:
+                    job.task = None
+            finally:
+                self.queue.task_done()
+
+    async def _run(self, job: Job):
+        while True:
+            job.attempts += 1
+            job.task = asyncio.create_task(self.runner(job))
+            try:
+                return await job.task
+            except Exception as e:
+                if job.attempts >= self.max_attempts:
+                    raise
+                print(f"Job {job.id} attempt {job.attempts} failed, retrying: {e}")
+                job.report("retrying", attempt=job.attempts + 1, error=str(e))
@@ -0,0 +1,162 @@
+# app/journal.py
+import asyncio
+import hashlib
+import json
+import os
+import time
+from typing import Any, Awaitable, Callable
+
+JOURNAL_DIR = os.getenv("JOURNAL_DIR", "journals")
+# Journals of failed or interrupted books are kept this long for a retry to resume from.
+JOURNAL_MAX_AGE_HOURS = float(os.getenv("JOURNAL_MAX_AGE_HOURS", "24"))
+
+RUNNING, FAILED = "running", "failed"
+
+# Keys of the journals open in this process, so two identical requests never append to one file.
+_active: set[str] = set()
+
+def journal_key(**request_fields) -> str:
+    """Identifies a book by the request that produced it, so a resubmitted request finds its journal."""
+    raw = json.dumps(request_fields, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:32]
+
+
+def read_journal(path: str) -> tuple[dict[str, Any], str | None, dict | None, str | None]:
+    """Returns the completed units, the last status, the request and the journal key recorded in a journal file."""
+    units, status, request, key = {}, None, None, None
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            lines = f.readlines()
+    except FileNotFoundError:
+        return units, status, request, key
+    for line in lines:
+        try:
+            entry = json.loads(line)
+        except ValueError:
+            continue  # A write interrupted mid-line by a crash.
+        if "unit" in entry:
+            units[entry["unit"]] = entry["value"]
+        if "status" in entry:
+            status = entry["status"]
+            request = entry.get("request") or request
+            key = entry.get("key") or key
+    return units, status, request, key
+
+
+class GenerationJournal:
+    """
+    An append-only, per-book record of every completed unit of work (data context, titles,
+    outline, image, each section and each summary), one JSON object per line. Each line is
+    flushed and fsynced before the pipeline moves on, so a crash loses at most the unit in
+    progress; a torn final line is ignored when the journal is read back. Units are written
+    off the event loop, one at a time and in the order they were recorded.
+    """
+
+    def __init__(self, key: str, request: dict = None, directory: str = JOURNAL_DIR):
+        self.key = key
+        self.path = os.path.join(directory, f"{key}.jsonl")
+        os.makedirs(directory, exist_ok=True)
+        self.units, self.status, stored_request, _ = read_journal(self.path)
+        self.request = request or stored_request
+        self.resumed_units = len(self.units)
+        self._write_lock = asyncio.Lock()
+        self._terminate_torn_line()
+        self._append({"status": RUNNING, "key": self.key, "request": self.request, "at": time.time()})
+
+    def _terminate_torn_line(self):
+        try:
+            with open(self.path, "rb") as f:
+                f.seek(-1, os.SEEK_END)
+                torn = f.read(1) != b"\n"
+        except OSError:
+            return  # Missing or empty.
+        if torn:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write("\n")
+
+    def _append(self, entry: dict):
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def __contains__(self, unit: str) -> bool:
+        return unit in self.units
+
+    def get(self, unit: str, default=None):
+        return self.units.get(unit, default)
+
+    async def record(self, unit: str, value):
+        self.units[unit] = value
+        async with self._write_lock:
+            await asyncio.to_thread(self._append, {"unit": unit, "value": value})
+
+    def release(self, status: str = FAILED, error: str = None):
+        """Keeps the journal for a later retry and frees its key."""
+        self._append({"status": status, "error": error, "at": time.time()})
+        _active.discard(self.key)
+
+    def complete(self):
+        """The book is finished: the journal has nothing left to recover."""
+        _active.discard(self.key)
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+
+def open_journal(key: str, request: dict, suffix: str = None) -> GenerationJournal:
+    """
+    Opens (or resumes) the journal for `key`. If an identical request is already running in
+    this process, `suffix` gives this one a journal of its own instead.
+    """
+    if key in _active and suffix:
+        key = f"{key}-{suffix}"
+    _active.add(key)
+    return GenerationJournal(key, request)
+
+def discard_journal(key: str, directory: str = JOURNAL_DIR):
+    """Deletes the journal of `key`, e.g. one no job will ever reopen."""
+    try:
+        os.remove(os.path.join(directory, f"{key}.jsonl"))
+    except FileNotFoundError:
+        pass
+
+def interrupted_requests(directory: str = JOURNAL_DIR) -> list[tuple[str, dict]]:
+    """
+    Returns the journal key and request of books that were still running when the server stopped
+    (not those that failed, which only resume when they are submitted again), and deletes expired
+    journals. The key is the journal's own, which for a duplicate request is not the request's
+    key but a suffixed one (see open_journal). Assumes a single server process owns `directory`.
+    """
+    if not os.path.isdir(directory):
+        return []
+    requests = []
+    cutoff = time.time() - JOURNAL_MAX_AGE_HOURS * 3600
+    for filename in sorted(os.listdir(directory)):
+        path = os.path.join(directory, filename)
+        if not filename.endswith(".jsonl") or filename[:-len(".jsonl")] in _active:
+            continue
+        if os.path.getmtime(path) < cutoff:
+            os.remove(path)
+            continue
+        _, status, request, key = read_journal(path)
+        if status == RUNNING and request:
+            # Journals written before keys were recorded are named after theirs.
+            requests.append((key or filename[:-len(".jsonl")], request))
+    return requests
+
+async def run_step(journal: GenerationJournal | None, unit: str, make: Callable[[], Awaitable[Any]],
+                   is_valid: Callable[[Any], bool] = None):
+    """
+    Returns the journaled result of `unit` if there is one (and `is_valid` accepts it); otherwise
+    awaits `make()` and journals the result. `None` results are not journaled, so they are retried.
+    """
+    if journal is not None and unit in journal:
+        value = journal.get(unit)
+        if is_valid is None or is_valid(value):
+            return value
+    value = await make()
+    if journal is not None and value is not None:
+        await journal.record(unit, value)
+    return value
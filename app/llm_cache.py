@@ -0,0 +1,171 @@
+# app/llm_cache.py
+import asyncio
+import hashlib
+import json
+import os
+import time
+from collections import OrderedDict
+
+CACHE_DIR = os.getenv("LLM_CACHE_DIR", "llm_cache")
+CACHE_MAX_BYTES = int(float(os.getenv("LLM_CACHE_MAX_MB", "512")) * 1024 * 1024)
+CACHE_MAX_AGE_SECONDS = float(os.getenv("LLM_CACHE_MAX_AGE_DAYS", "30")) * 86400
+# "on" serves cacheable calls from disk, "off" disables the cache, "replay" never calls the API.
+# "record" is "on" that also keeps every other result, so that the book can be replayed later.
+CACHE_MODE = os.getenv("LLM_CACHE_MODE", "on")
+
+# Low-temperature calls are deterministic enough to reuse by default; creative calls
+# are only served from the cache when opted in through LLM_CACHE_OPT_IN.
+CACHEABLE_MAX_TEMPERATURE = 0.3
+CACHE_POLICIES = {
+    "data_selection": True,
+    "summary": True,
+    "book_title": False,
+    "chapter_titles": False,
+    "outline": False,
+    "section": False,
+    "image": False,
+}
+for opted_in in filter(None, os.getenv("LLM_CACHE_OPT_IN", "").split(",")):
+    CACHE_POLICIES[opted_in.strip()] = True
+
+class CacheMiss(Exception):
+    """Raised in replay mode when a call has no cached response."""
+
+
+def make_cache_key(**payload) -> str:
+    """Content address of a call: a hash of everything that influences its output."""
+    encoded = json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+class LLMCache:
+    """
+    An on-disk, content-addressed cache of API results with size- and age-based LRU eviction.
+    Results are kept and served back when the call type's policy allows it; record mode keeps
+    every result, and replay mode serves every result it finds.
+    """
+
+    def __init__(self, cache_dir: str = CACHE_DIR, max_bytes: int = CACHE_MAX_BYTES,
+                 max_age_seconds: float = CACHE_MAX_AGE_SECONDS, mode: str = CACHE_MODE,
+                 policies: dict = None):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.max_age_seconds = max_age_seconds
+        self.mode = mode
+        self.policies = CACHE_POLICIES if policies is None else policies
+        self.counters: dict[str, dict[str, int]] = {}
+        self._index: OrderedDict[str, tuple[int, float]] = None  # key -> (size, last access), oldest first
+        self._total_bytes = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.mode != "off"
+
+    @property
+    def replay(self) -> bool:
+        return self.mode == "replay"
+
+    def is_cacheable(self, call_type: str, temperature: float = None) -> bool:
+        if self.replay:
+            return True
+        if call_type in self.policies:
+            return self.policies[call_type]
+        return temperature is not None and temperature <= CACHEABLE_MAX_TEMPERATURE
+
+    def stores(self, call_type: str, temperature: float = None) -> bool:
+        if self.mode == "record":
+            return True
+        return self.mode == "on" and self.is_cacheable(call_type, temperature)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], f"{key}.json")
+
+    def _load_index(self):
+        if self._index is not None:
+            return
+        entries = []
+        if os.path.isdir(self.cache_dir):
+            for root, _, files in os.walk(self.cache_dir):
+                for name in files:
+                    if name.endswith(".json"):
+                        stat = os.stat(os.path.join(root, name))
+                        entries.append((stat.st_mtime, name[:-5], stat.st_size))
+        entries.sort()
+        self._index = OrderedDict((key, (size, mtime)) for mtime, key, size in entries)
+        self._total_bytes = sum(size for size, _ in self._index.values())
+        self.evict()
+
+    def _count(self, call_type: str, outcome: str):
+        counter = self.counters.setdefault(call_type, {"hits": 0, "misses": 0})
+        counter[outcome] += 1
+
+    def get(self, key: str, call_type: str):
+        """Returns the cached value for `key`, or None. Raises CacheMiss in replay mode."""
+        self._load_index()
+        entry = self._index.get(key)
+        if entry is not None and time.time() - entry[1] <= self.max_age_seconds:
+            try:
+                with open(self._path(key), "r", encoding="utf-8") as f:
+                    value = json.load(f)["value"]
+                now = time.time()
+                os.utime(self._path(key), (now, now))
+                self._index[key] = (entry[0], now)
+                self._index.move_to_end(key)
+                self._count(call_type, "hits")
+                return value
+            except (OSError, json.JSONDecodeError, KeyError):
+                self._forget(key)
+        self._count(call_type, "misses")
+        if self.replay:
+            raise CacheMiss(f"Replay mode: no cached result for this '{call_type}' call.")
+        return None
+
+    async def put(self, key: str, call_type: str, value, temperature: float = None):
+        """Stores `value` if the mode and the call type's policy keep it; the file is written off the event loop."""
+        if not self.stores(call_type, temperature):
+            return
+        self._load_index()
+        size = await asyncio.to_thread(self._write, key, call_type, value)
+        self._forget(key, delete=False)
+        self._index[key] = (size, time.time())
+        self._total_bytes += size
+        self.evict()
+
+    def _write(self, key: str, call_type: str, value) -> int:
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"call_type": call_type, "created": time.time(), "value": value}, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+        return os.path.getsize(path)
+
+    def _forget(self, key: str, delete: bool = True):
+        entry = self._index.pop(key, None)
+        if entry is not None:
+            self._total_bytes -= entry[0]
+        if delete:
+            try:
+                os.remove(self._path(key))
+            except OSError:
+                pass
+
+    def evict(self):
+        """Drops expired entries, then the least recently used ones until the cache fits its size limit."""
+        cutoff = time.time() - self.max_age_seconds
+        for key, (size, last_access) in list(self._index.items()):
+            if last_access >= cutoff and self._total_bytes <= self.max_bytes:
+                break
+            self._forget(key)
+
+    def stats(self) -> dict:
+        self._load_index()
+        return {
+            "mode": self.mode,
+            "entries": len(self._index),
+            "bytes": self._total_bytes,
+            "calls": self.counters,
+        }
+
+
+llm_cache = LLMCache()
@@ -0,0 +1,201 @@
+# app/llm_scheduler.py
+import asyncio
+import contextvars
+import os
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from app.metrics import Gauge, record_span, registry
+
+# Lower values are served first.
+PRIORITIES = {"high": 0, "normal": 1, "low": 2}
+DEFAULT_PRIORITY = PRIORITIES["normal"]
+# Calls to the model API that may be in progress at once, across every book being written.
+LLM_MAX_CONCURRENT = int(os.getenv("LLM_MAX_CONCURRENT", "16"))
+# Per-job statistics are kept for this many of the most recent jobs.
+MAX_TRACKED_JOBS = 500
+RECENT_WAITS = 1000
+THROUGHPUT_WINDOW_SECONDS = 3600
+
+SCHEDULER_CALLS = registry.register(Gauge("book_llm_scheduler_calls", "LLM calls running or waiting for a slot.", ("state",)))
+
+
+@dataclass
+class Flow:
+    """Who an LLM call is made for. Calls of one flow share its fair share of the API."""
+    job_id: str = None
+    tenant: str = None
+    priority: int = DEFAULT_PRIORITY
+
+    @property
+    def key(self) -> str:
+        return f"tenant:{self.tenant}" if self.tenant else f"job:{self.job_id}"
+
+_current_flow = contextvars.ContextVar("llm_flow", default=Flow())
+
+def set_flow(job_id: str, tenant: str = None, priority: int = DEFAULT_PRIORITY):
+    """Attributes the LLM calls of the current task, and of the tasks it starts, to a job."""
+    _current_flow.set(Flow(job_id, tenant, priority))
+
+
+@dataclass
+class _Waiter:
+    flow: Flow
+    start_tag: float
+    enqueued_at: float
+    future: asyncio.Future = field(repr=False)
+
+
+class LlmScheduler:
+    """
+    Admits at most `max_concurrent` LLM calls at a time. Waiting calls are served by priority,
+    and within a priority by start-time fair queueing over flows (a tenant, or a job if it has
+    no tenant): each call advances its flow's virtual clock by its estimated token cost, and the
+    flow furthest behind goes next. A long book therefore cannot crowd out a short one, and one
+    tenant's batch gets the same share as another's single book. Priorities are strict: low
+    priority calls only run while no higher priority call is waiting.
+    """
+
+    def __init__(self, max_concurrent: int = LLM_MAX_CONCURRENT):
+        self.max_concurrent = max(1, max_concurrent)
+        self.active = 0
+        self._vtime = 0.0
+        self._flow_finish: dict[str, float] = {}
+        self._waiting: dict[int, dict[str, deque[_Waiter]]] = {}
+        self._num_waiting = 0
+        self._started_at = time.time()
+        self._stats = {"calls": 0, "queued_calls": 0, "queue_wait_s_total": 0.0, "queue_wait_s_max": 0.0}
+        self._recent_waits: deque[float] = deque(maxlen=RECENT_WAITS)
+        self._jobs: OrderedDict[str, dict] = OrderedDict()
+        self._completed_books: deque[float] = deque()
+
+    @asynccontextmanager
+    async def slot(self, cost: float = 1.0):
+        """Holds one of the concurrent call slots for the enclosed API call (or stream)."""
+        flow = _current_flow.get()
+        enqueued_at = time.perf_counter()
+        await self._acquire(flow, cost)
+        self._record_wait(flow, enqueued_at)
+        try:
+            yield
+        finally:
+            self.release()
+
+    def try_acquire(self) -> bool:
+        """Takes a slot only if one is free and nobody is waiting for it, e.g. for an optional extra call."""
+        if self.active >= self.max_concurrent or self._num_waiting:
+            return False
+        self.active += 1
+        self._update_gauges()
+        return True
+
+    def release(self):
+        self.active -= 1
+        self._dispatch()
+        self._update_gauges()
+
+    async def _acquire(self, flow: Flow, cost: float):
+        start_tag = max(self._vtime, self._flow_finish.get(flow.key, 0.0))
+        self._flow_finish[flow.key] = start_tag + max(cost, 1.0)
+        if self.active < self.max_concurrent and not self._num_waiting:
+            self.active += 1
+            self._vtime = start_tag
+            self._update_gauges()
+            return
+        waiter = _Waiter(flow, start_tag, time.perf_counter(), asyncio.get_running_loop().create_future())
+        self._waiting.setdefault(flow.priority, {}).setdefault(flow.key, deque()).append(waiter)
+        self._num_waiting += 1
+        self._stats["queued_calls"] += 1
+        self._update_gauges()
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            if waiter.future.done() and not waiter.future.cancelled():
+                # Granted just as it was cancelled: hand the slot on.
+                self.release()
+            else:
+                self._remove(waiter)
+                self._update_gauges()
+            raise
+
+    def _remove(self, waiter: _Waiter):
+        flows = self._waiting.get(waiter.flow.priority, {})
+        queue = flows.get(waiter.flow.key)
+        if queue and waiter in queue:
+            queue.remove(waiter)
+            self._num_waiting -= 1
+            if not queue:
+                del flows[waiter.flow.key]
+
+    def _dispatch(self):
+        while self.active < self.max_concurrent and self._num_waiting:
+            priority = min(p for p, flows in self._waiting.items() if flows)
+            flows = self._waiting[priority]
+            key = min(flows, key=lambda k: flows[k][0].start_tag)
+            waiter = flows[key].popleft()
+            if not flows[key]:
+                del flows[key]
+            self._num_waiting -= 1
+            self._vtime = max(self._vtime, waiter.start_tag)
+            self.active += 1
+            waiter.future.set_result(None)
+        if len(self._flow_finish) > 4 * MAX_TRACKED_JOBS:
+            # Flows that have fallen behind the virtual clock start from it anyway.
+            self._flow_finish = {k: v for k, v in self._flow_finish.items() if v > self._vtime}
+
+    def _record_wait(self, flow: Flow, enqueued_at: float):
+        wait = time.perf_counter() - enqueued_at
+        self._stats["calls"] += 1
+        self._stats["queue_wait_s_total"] += wait
+        self._stats["queue_wait_s_max"] = max(self._stats["queue_wait_s_max"], wait)
+        self._recent_waits.append(wait)
+        if flow.job_id is not None:
+            job = self._jobs.get(flow.job_id)
+            if job is None:
+                job = self._jobs[flow.job_id] = {"tenant": flow.tenant, "priority": flow.priority, "calls": 0,
+                                                 "queue_wait_s_total": 0.0, "queue_wait_s_max": 0.0}
+                while len(self._jobs) > MAX_TRACKED_JOBS:
+                    self._jobs.popitem(last=False)
+            job["calls"] += 1
+            job["queue_wait_s_total"] += wait
+            job["queue_wait_s_max"] = max(job["queue_wait_s_max"], wait)
+        if wait >= 0.001:
+            record_span("queue", "llm_scheduler", wait, enqueued_at)
+
+    def _update_gauges(self):
+        SCHEDULER_CALLS.set(self.active, state="running")
+        SCHEDULER_CALLS.set(self._num_waiting, state="waiting")
+
+    def book_completed(self):
+        now = time.time()
+        self._completed_books.append(now)
+        while self._completed_books and self._completed_books[0] < now - THROUGHPUT_WINDOW_SECONDS:
+            self._completed_books.popleft()
+
+    def books_per_hour(self) -> float:
+        """Books completed in the last hour, extrapolated to an hour while the server is younger than that."""
+        now = time.time()
+        while self._completed_books and self._completed_books[0] < now - THROUGHPUT_WINDOW_SECONDS:
+            self._completed_books.popleft()
+        window = min(THROUGHPUT_WINDOW_SECONDS, max(now - self._started_at, 1.0))
+        return len(self._completed_books) * 3600 / window
+
+    def stats(self) -> dict:
+        waits = sorted(self._recent_waits)
+        calls = self._stats["calls"]
+        return {
+            **self._stats,
+            "max_concurrent": self.max_concurrent,
+            "running": self.active,
+            "waiting": self._num_waiting,
+            "queue_wait_s_avg": self._stats["queue_wait_s_total"] / calls if calls else 0.0,
+            "queue_wait_s_p95": waits[int(0.95 * (len(waits) - 1))] if waits else 0.0,
+            "books_per_hour": round(self.books_per_hour(), 2),
+            "jobs": {
+                job_id: {**job, "queue_wait_s_avg": job["queue_wait_s_total"] / job["calls"]}
+                for job_id, job in self._jobs.items()
+            },
+        }
+
+llm_scheduler = LlmScheduler()
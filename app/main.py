@@ -1,80 +1,488 @@
 # app/main.py
-from fastapi import FastAPI, HTTPException
-from fastapi.concurrency import run_in_threadpool
-from pydantic import BaseModel
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import Literal
+from fastapi import FastAPI, HTTPException, Request, Response
+from fastapi.responses import FileResponse, PlainTextResponse, StreamingResponse
+from fastapi.staticfiles import StaticFiles
+from pydantic import BaseModel, ValidationError
 from app.book_writer import generate_user_prompt_driven_book, generate_book_title
-from app.book_pdf_exporter import save_book_as_pdf
+from app.pdf_render_service import pdf_render_service
+from app.book_ebook_exporter import save_book_editions, load_book_source
+from app.book_templates import FONTS_DIR
+from app.llm_cache import llm_cache
+from app.http_client import close_http_client
+from app.jobs import Job, JobManager, JobQueueFull, COMPLETED, FINISHED_STATES
+from app.journal import GenerationJournal, journal_key, open_journal, interrupted_requests, discard_journal, run_step, RUNNING, FAILED
+from app.metrics import Counter, Trace, activate_trace, monitor_event_loop, record_span, registry, span, update_process_gauges
+from app.llm_scheduler import llm_scheduler, set_flow, PRIORITIES
+from app.hedging import hedge_policy
 from dotenv import load_dotenv
 import os
 import re
-import traceback
+import json
+import uuid
+import asyncio
 
 # Load environment variables from a .env file
 load_dotenv()
 
+# Books mostly wait on the model API, so many can be in progress; the LLM scheduler caps the API calls.
+BOOK_WORKERS = int(os.getenv("BOOK_WORKERS", "8"))
+BOOK_QUEUE_DEPTH = int(os.getenv("BOOK_QUEUE_DEPTH", "100"))
+BOOK_BATCH_MAX = int(os.getenv("BOOK_BATCH_MAX", "100"))
+MAX_TRACKED_BATCHES = 200
+# A failed book is retried this many times in total, resuming from its journal each time.
+BOOK_MAX_ATTEMPTS = int(os.getenv("BOOK_MAX_ATTEMPTS", "2"))
+# Finished books are served again to identical requests: this many, for this long.
+BOOK_CACHE_SIZE = int(os.getenv("BOOK_CACHE_SIZE", "100"))
+BOOK_CACHE_TTL_HOURS = float(os.getenv("BOOK_CACHE_TTL_HOURS", "24"))
+# "on_demand" writes only the HTML and EPUB editions and renders the PDF the first time it is
+# downloaded; "eager" typesets every book as it is written, as before.
+PDF_RENDER_MODE = os.getenv("PDF_RENDER_MODE", "on_demand")
+EDITION_MEDIA_TYPES = {"pdf": "application/pdf", "html": "text/html; charset=utf-8", "epub": "application/epub+zip"}
+
+DOWNLOADS = registry.register(Counter(
+    "book_downloads_total", "Book downloads, by format; `not_modified` ones were answered with 304.", ("format", "status")))
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if PDF_RENDER_MODE == "eager":
+        # Warm workers for the chapters typeset as books are written; on demand, the first render starts them.
+        pdf_render_service.start()
+    await job_manager.start()
+    loop_monitor = asyncio.create_task(monitor_event_loop())
+    # Books that were being written when the server last stopped pick up where they left off.
+    # Plain requests first, so that each takes its book's key before any forced new edition of it does.
+    for key, request in sorted(interrupted_requests(), key=lambda item: bool(item[1].get("force_new_edition"))):
+        try:
+            book_request = BookRequest(**request)
+            job = job_manager.submit(book_request, key=book_key(book_request), force_new=book_request.force_new_edition,
+                                     priority=PRIORITIES[book_request.priority], journal_key=key)
+        except ValidationError as e:
+            # Written by a version of the server that accepted other requests: it can never resume.
+            print(f"Discarding the journal of an interrupted book whose request is no longer valid: {e}")
+            discard_journal(key)
+            continue
+        except JobQueueFull:
+            break
+        if job.journal_key == key:
+            print(f"Resuming an interrupted book as job {job.id}.")
+        else:
+            # Joined an identical job resuming from another journal: nothing would reopen this one.
+            discard_journal(key)
+    yield
+    loop_monitor.cancel()
+    await job_manager.stop()
+    pdf_render_service.shutdown()
+    await close_http_client()
+
 app = FastAPI(
     title="Star Wars Book Generator",
     description="An API to generate a personalized Star Wars fan novel based on a user prompt.",
-    version="4.0.0"
+    version="4.0.0",
+    lifespan=lifespan
 )
+# The HTML edition loads its fonts from here.
+app.mount("/fonts", StaticFiles(directory=FONTS_DIR), name="fonts")
 
 class BookRequest(BaseModel):
     user_input: str
     num_pages: int = 100  # Capped and defaulted to 100 as per client request
+    parallel_chapters: bool = False  # Plan an outline first, then write all chapters concurrently
+    force_new_edition: bool = False  # Write a new book even if an identical request is running or was just served
+    priority: Literal["high", "normal", "low"] = "normal"  # Order in the job queue and for LLM calls
+    tenant: str | None = None  # Books of one tenant share a single fair share of the LLM calls
+
+class BookBatchRequest(BaseModel):
+    books: list[BookRequest]
+    # When set, these replace the priority and tenant of every book in the batch.
+    priority: Literal["high", "normal", "low"] | None = None
+    tenant: str | None = None
+
+def book_key(request: BookRequest) -> str:
+    """Identifies the book a request asks for, ignoring case and whitespace differences in the prompt."""
+    return journal_key(
+        user_input=" ".join(request.user_input.split()).casefold(),
+        num_pages=min(request.num_pages, 100),
+        parallel_chapters=request.parallel_chapters
+    )
 
 def sanitize_filename(text: str) -> str:
     """Sanitizes a string to be a valid filename."""
     sanitized = re.sub(r'[\\/*?:"<>|]', "", text)
     return sanitized[:50].strip().replace(' ', '_')
 
-@app.post("/generate-book/", summary="Generate a Star Wars Book")
-async def generate_star_wars_book(request: BookRequest):
+async def generate_star_wars_book(job: Job) -> dict:
     """
     Generates a full, multi-section Star Wars novel based on a user's prompt,
     with a fixed page cap, AI-generated image, and professional formatting.
+    Runs on a job worker and reports its progress on the job. Every completed step is
+    journaled, so a retried, resubmitted or restarted job resumes where it stopped.
     """
+    request: BookRequest = job.request
     user_prompt = request.user_input.strip()
-    if not user_prompt:
-        raise HTTPException(status_code=400, detail="Prompt cannot be empty.")
-    
+    set_flow(job.id, request.tenant, job.priority)
+
     # Enforce the 100-page cap
     final_page_count = min(request.num_pages, 100)
-    print(f"Processing request for a {final_page_count}-page book.")
+    print(f"Processing job {job.id} for a {final_page_count}-page book.")
+
+    # One trace covers every attempt of the job.
+    if job.trace is None:
+        job.trace = Trace(job.id)
+    activate_trace(job.trace)
+    if job.attempts == 1:
+        record_span("job", "queue_wait", job.started_at - job.created_at)
 
+    journal = open_journal(job.journal_key or book_key(request), request.model_dump(), suffix=job.id)
+    # Retries, and a restart, reopen this exact journal.
+    job.journal_key = journal.key
+    if job.attempts > 1:
+        # Clients already hold the failed attempt's text, some of it from a section it never finished:
+        # they drop it all, as this attempt sends the book again from its start (journaled sections in one piece).
+        job.emit("restart", attempt=job.attempts, steps=journal.resumed_units)
+    if journal.resumed_units:
+        print(f"Resuming job {job.id} from {journal.resumed_units} journaled steps.")
+        job.emit("resumed", steps=journal.resumed_units)
     try:
-        print("Generating a unique book title...")
-        raw_title = await generate_book_title(user_prompt)
-        book_title = raw_title.replace("#", "").strip()
-        print(f"Generated Title: {book_title}")
+        with span("job", "book", attempt=job.attempts):
+            result = await write_and_render_book(job, user_prompt, final_page_count, journal)
+    except asyncio.CancelledError:
+        # A shutdown keeps the journal so the book resumes on restart; a user cancellation drops it.
+        if job_manager.stopping:
+            journal.release(RUNNING)
+        else:
+            journal.complete()
+        raise
+    except Exception as e:
+        journal.release(FAILED, str(e))
+        raise
+    journal.complete()
+    llm_scheduler.book_completed()
+    return result
+
+async def write_and_render_book(job: Job, user_prompt: str, final_page_count: int, journal: GenerationJournal) -> dict:
+    request: BookRequest = job.request
+    print("Generating a unique book title...")
+    job.report("titles")
+    raw_title = await run_step(journal, "book_title", lambda: generate_book_title(user_prompt))
+    book_title = raw_title.replace("#", "").strip()
+    print(f"Generated Title: {book_title}")
+    job.emit("title", title=book_title)
+
+    # --- Generate all book components (text, image, etc.) ---
+    # With eager PDF rendering, each finished prologue, chapter and epilogue is typeset by a
+    # render worker while the rest is written.
+    eager_pdf = PDF_RENDER_MODE == "eager"
+    pending_renders = []
+    accepting_blocks = True
+
+    def render_block(kind: str, **block):
+        if accepting_blocks:
+            pending_renders.append(asyncio.ensure_future(pdf_render_service.render_block(job.id, kind, **block)))
 
-        # --- Generate all book components (text, image, etc.) ---
-        print(f"Generating book components for prompt: '{user_prompt}'...")
+    print(f"Generating book components for prompt: '{user_prompt}'...")
+    try:
         book_data = await generate_user_prompt_driven_book(
             prompt=user_prompt,
-            num_pages=final_page_count
+            num_pages=final_page_count,
+            parallel_chapters=request.parallel_chapters,
+            progress=job.report,
+            on_event=job.emit,
+            on_block=render_block if eager_pdf else None,
+            journal=journal,
+            book=book_key(request)
         )
         print("Book components generated successfully.")
 
-        # --- Generate and save the PDF with the new structure ---
-        filename = f"{sanitize_filename(book_title)}.pdf"
-        print(f"Generating PDF: {filename}...")
-        
-        # Pass the entire book_data dictionary to the PDF exporter
-        output_pdf_path = await run_in_threadpool(
-            save_book_as_pdf,
-            title=book_title,
-            book_data=book_data,
-            filename=filename
-        )
-        print(f"PDF saved to: {output_pdf_path}")
-
-        return {
-            "title": book_title,
-            "prompt": user_prompt,
-            "pdf_file": output_pdf_path,
-            "preview": book_data.get('prologue_text', '')[:1500] + "..."
-        }
+        # Books can share a title, so the job id keeps their files apart.
+        basename = f"{sanitize_filename(book_title)}_{job.id[:8]}"
+        job.report("editions")
+        with span("render", "editions"):
+            editions = await asyncio.to_thread(save_book_editions, book_title, book_data, basename)
+        print(f"HTML and EPUB editions saved to: {editions['html']}, {editions['epub']}")
+
+        output_pdf_path = None
+        if eager_pdf:
+            print(f"Generating PDF: {basename}.pdf...")
+            job.report("pdf_rendering")
+            # A block that failed to render in the background is simply laid out again by finish_book().
+            await asyncio.gather(*pending_renders, return_exceptions=True)
+            output_pdf_path = await pdf_render_service.finish_book(
+                job.id,
+                title=book_title,
+                book_data=book_data,
+                filename=f"{basename}.pdf"
+            )
+            print(f"PDF saved to: {output_pdf_path}")
+    finally:
+        # Frees the worker's pages if the job failed or was cancelled before the PDF was written. Chapters
+        # still being written after another failed would otherwise hand the worker pages of a dropped book,
+        # so later blocks are refused and renders not yet sent are cancelled (those sent run before the discard).
+        accepting_blocks = False
+        for render in pending_renders:
+            render.cancel()
+        pdf_render_service.discard_book(job.id)
+
+    return {
+        "title": book_title,
+        "prompt": user_prompt,
+        "html_file": editions["html"],
+        "epub_file": editions["epub"],
+        "source_file": editions["source"],
+        # Rendered on the first download unless PDF_RENDER_MODE is "eager" (see ensure_pdf).
+        "pdf_file": output_pdf_path,
+        "preview": book_data.get('prologue_text', '')[:1500] + "..."
+    }
+
+job_manager = JobManager(
+    generate_star_wars_book, num_workers=BOOK_WORKERS, max_queue_depth=BOOK_QUEUE_DEPTH, max_attempts=BOOK_MAX_ATTEMPTS,
+    max_cached_results=BOOK_CACHE_SIZE, result_ttl=BOOK_CACHE_TTL_HOURS * 3600,
+    is_reusable=lambda job: os.path.exists(job.result["html_file"]) and os.path.exists(job.result["source_file"])
+)
+# Job ids of recent batches, by batch id.
+batches: OrderedDict[str, list[str]] = OrderedDict()
+# On-demand PDF renders in progress, by job id.
+pdf_renders: dict[str, asyncio.Task] = {}
+
+def get_job_or_404(job_id: str) -> Job:
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found.")
+    return job
+
+@app.post("/generate-book/", status_code=202, summary="Generate a Star Wars Book")
+async def submit_star_wars_book(request: BookRequest):
+    """
+    Queues a book for generation and returns its job id immediately.
+    Poll `/jobs/{job_id}` for progress and fetch the book from `/jobs/{job_id}/download`
+    (`?format=html`, `epub` or `pdf`).
+    An identical request that is already running, or was completed recently, returns that
+    job instead (`deduplicated: true`, possibly already `completed`) unless `force_new_edition` is set.
+    """
+    if not request.user_input.strip():
+        raise HTTPException(status_code=400, detail="Prompt cannot be empty.")
+    try:
+        job = job_manager.submit(request, key=book_key(request), force_new=request.force_new_edition, priority=PRIORITIES[request.priority])
+    except JobQueueFull as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    return {
+        "job_id": job.id,
+        "status": job.status,
+        "deduplicated": job.request is not request,
+        "status_url": f"/jobs/{job.id}",
+        "queued_jobs": job_manager.queue_size()
+    }
+
+@app.post("/generate-books/batch", status_code=202, summary="Generate several Star Wars books")
+async def submit_book_batch(batch: BookBatchRequest):
+    """
+    Queues every book of the batch (or none, if they do not all fit in the queue) and returns
+    their job ids. Track them together at `/batches/{batch_id}`. All books share the LLM
+    scheduler fairly, per tenant or per book, so short books are not stuck behind long ones.
+    """
+    if not batch.books:
+        raise HTTPException(status_code=400, detail="The batch has no books.")
+    if len(batch.books) > BOOK_BATCH_MAX:
+        raise HTTPException(status_code=400, detail=f"A batch can hold at most {BOOK_BATCH_MAX} books.")
+    if any(not book.user_input.strip() for book in batch.books):
+        raise HTTPException(status_code=400, detail="Prompt cannot be empty.")
+    if len(batch.books) > job_manager.free_slots():
+        raise HTTPException(status_code=429, detail=f"The job queue has room for {job_manager.free_slots()} more books. Try again later.")
+    overrides = {name: value for name, value in (("priority", batch.priority), ("tenant", batch.tenant)) if value is not None}
+    jobs = []
+    for book in batch.books:
+        book = book.model_copy(update=overrides)
+        jobs.append(job_manager.submit(book, key=book_key(book), force_new=book.force_new_edition, priority=PRIORITIES[book.priority]))
+    batch_id = uuid.uuid4().hex
+    batches[batch_id] = [job.id for job in jobs]
+    while len(batches) > MAX_TRACKED_BATCHES:
+        batches.popitem(last=False)
+    return {
+        "batch_id": batch_id,
+        "status_url": f"/batches/{batch_id}",
+        "jobs": [{"job_id": job.id, "status": job.status, "status_url": f"/jobs/{job.id}"} for job in jobs],
+        "queued_jobs": job_manager.queue_size()
+    }
+
+@app.get("/batches/{batch_id}", summary="Get the status of every book in a batch")
+async def get_batch(batch_id: str):
+    job_ids = batches.get(batch_id)
+    if job_ids is None:
+        raise HTTPException(status_code=404, detail="Batch not found.")
+    jobs = [job_manager.get(job_id) for job_id in job_ids]
+    counts = {}
+    for job in jobs:
+        status = job.status if job is not None else "expired"
+        counts[status] = counts.get(status, 0) + 1
+    return {
+        "batch_id": batch_id,
+        "finished": all(job is None or job.status in FINISHED_STATES for job in jobs),
+        "counts": counts,
+        "jobs": [job.to_dict() if job is not None else {"job_id": job_id, "status": "expired"} for job_id, job in zip(job_ids, jobs)]
+    }
+
+def format_sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+async def stream_job_events(job: Job, events: asyncio.Queue):
+    """Relays a job's events as Server-Sent Events until it finishes or the client disconnects."""
+    try:
+        yield format_sse("job", job.to_dict())
+        if job.status in FINISHED_STATES and events.empty():
+            # A cached book: its final event was emitted before this client subscribed.
+            events.put_nowait((job.status, job.to_dict()))
+        while True:
+            event, data = await events.get()
+            if event == COMPLETED:
+                data = {**data, **job_result(job)}
+            yield format_sse(event, data)
+            if event in FINISHED_STATES:
+                break
+    finally:
+        job.unsubscribe(events)
+
+@app.post("/generate-book/stream", summary="Generate a Star Wars Book and stream it as it is written")
+async def stream_star_wars_book(request: BookRequest):
+    """
+    Queues a book like `/generate-book/`, then streams Server-Sent Events: `resumed` (when the
+    book continues from an earlier, interrupted attempt), `restart` (when a failed attempt is
+    retried: the text received so far is to be discarded, as the retry sends it again), `title`, `progress`,
+    a `heading` when the prologue, each chapter or the epilogue starts, `delta` events carrying
+    section text as the model writes it, and a final `completed` event with the download links
+    (or `failed` / `cancelled`). Chapters are written concurrently, so every text event names its section.
+    A client sending a request identical to one already being written joins that stream from
+    its current point; one matching a recently completed book gets the `completed` event at once.
+    """
+    if not request.user_input.strip():
+        raise HTTPException(status_code=400, detail="Prompt cannot be empty.")
+    try:
+        job = job_manager.submit(request, key=book_key(request), force_new=request.force_new_edition, priority=PRIORITIES[request.priority])
+    except JobQueueFull as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    return StreamingResponse(
+        stream_job_events(job, job.subscribe()),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.get("/jobs/{job_id}", summary="Get the status of a book generation job")
+async def get_job(job_id: str):
+    job = get_job_or_404(job_id)
+    response = job.to_dict()
+    if job.status == COMPLETED:
+        response["result"] = job_result(job)
+    return response
+
+@app.get("/jobs/{job_id}/trace", summary="Timing spans and token usage of a book generation job")
+async def get_job_trace(job_id: str):
+    job = get_job_or_404(job_id)
+    if job.trace is None:
+        raise HTTPException(status_code=409, detail="The job has not started yet.")
+    return job.trace.to_dict()
+
+@app.delete("/jobs/{job_id}", summary="Cancel a book generation job")
+async def cancel_job(job_id: str):
+    job = get_job_or_404(job_id)
+    if not job_manager.cancel(job_id):
+        raise HTTPException(status_code=409, detail=f"Job has already {job.status}.")
+    return job.to_dict()
+
+async def render_pdf(job: Job) -> str:
+    title, book_data = await asyncio.to_thread(load_book_source, job.result["source_file"])
+    print(f"Rendering the PDF of job {job.id} on demand...")
+    path = await pdf_render_service.finish_book(
+        job.id,
+        title=title,
+        book_data=book_data,
+        filename=os.path.basename(job.result["source_file"]).removesuffix(".book.json") + ".pdf"
+    )
+    # Cached with the job, so repeated and deduplicated requests get the same file.
+    job.result["pdf_file"] = path
+    return path
+
+async def ensure_pdf(job: Job) -> str:
+    """Returns the job's PDF, rendering it the first time it is asked for. Concurrent requests share one render."""
+    path = job.result.get("pdf_file")
+    if path and os.path.exists(path):
+        return path
+    if not os.path.exists(job.result["source_file"]):
+        raise HTTPException(status_code=410, detail="The book is no longer available.")
+    task = pdf_renders.get(job.id)
+    if task is None:
+        task = pdf_renders[job.id] = asyncio.ensure_future(render_pdf(job))
+        task.add_done_callback(lambda _: pdf_renders.pop(job.id, None))
+    try:
+        # A client that gives up waiting does not cancel the render for the others.
+        return await asyncio.shield(task)
     except Exception as e:
-        print(f"An error occurred during book generation: {e}")
-        traceback.print_exc()
-        raise HTTPException(status_code=500, detail=f"An internal error occurred: {str(e)}")
\ No newline at end of file
+        # The failed render is already out of pdf_renders, so the next request tries again.
+        print(f"Rendering the PDF of job {job.id} failed: {type(e).__name__}: {e}")
+        raise HTTPException(status_code=503, detail=f"The PDF could not be rendered ({type(e).__name__}). Try again later.",
+                            headers={"Retry-After": "30"})
+
+def download_urls(job: Job) -> dict:
+    return {fmt: f"/jobs/{job.id}/download?format={fmt}" for fmt in EDITION_MEDIA_TYPES}
+
+def job_result(job: Job) -> dict:
+    return {**job.result, "download_url": f"/jobs/{job.id}/download", "downloads": download_urls(job)}
+
+def file_response(request: Request, path: str, media_type: str, filename: str, inline: bool = False) -> Response:
+    """
+    Streams a file from disk in chunks, honouring Range and If-Range (handled by FileResponse)
+    and answering If-None-Match with 304 Not Modified. Files of a job never change, so the
+    ETag is derived from the file's size and modification time rather than its content.
+    """
+    stat = os.stat(path)
+    etag = f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and (if_none_match.strip() == "*" or etag in (tag.strip().removeprefix("W/") for tag in if_none_match.split(","))):
+        return Response(status_code=304, headers=headers)
+    return FileResponse(path, media_type=media_type, filename=filename, headers=headers,
+                        content_disposition_type="inline" if inline else "attachment", stat_result=stat)
+
+@app.get("/jobs/{job_id}/download", summary="Download the finished book as PDF, HTML or EPUB")
+async def download_book(job_id: str, request: Request, format: Literal["pdf", "html", "epub"] = "pdf"):
+    """
+    Streams one edition of a finished book; Range requests fetch part of it (e.g. to resume a
+    download), and a request whose If-None-Match matches the ETag gets 304 Not Modified.
+    The HTML and EPUB editions are written with the book; the PDF is rendered the first time
+    it is downloaded (which can take a while for a long book) and then kept.
+    """
+    job = get_job_or_404(job_id)
+    if job.status != COMPLETED:
+        raise HTTPException(status_code=409, detail=f"Job is {job.status}, the book is not ready.")
+    path = await ensure_pdf(job) if format == "pdf" else job.result[f"{format}_file"]
+    if not os.path.exists(path):
+        raise HTTPException(status_code=410, detail=f"The {format.upper()} edition is no longer available.")
+    response = file_response(request, path, EDITION_MEDIA_TYPES[format], os.path.basename(path), inline=format == "html")
+    DOWNLOADS.inc(format=format, status="not_modified" if response.status_code == 304 else "sent")
+    return response
+
+@app.get("/cache/stats", summary="LLM cache hit/miss counters")
+async def get_cache_stats():
+    return llm_cache.stats()
+
+@app.get("/books/stats", summary="Deduplicated and cached book request counters")
+async def get_book_stats():
+    return {**job_manager.stats, "in_flight": len(job_manager.in_flight), "cached_books": len(job_manager.result_cache)}
+
+@app.get("/scheduler/stats", summary="LLM scheduler throughput and per-job queue-wait statistics")
+async def get_scheduler_stats():
+    return llm_scheduler.stats()
+
+@app.get("/llm/latency", summary="Recent LLM call latency percentiles and hedging per stage")
+async def get_llm_latency():
+    return hedge_policy.report()
+
+@app.get("/metrics", summary="Prometheus metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    job_manager.update_gauges()
+    update_process_gauges()
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/pdf/stats", summary="PDF render worker queue-wait and render-time metrics")
+async def get_pdf_stats():
+    return pdf_render_service.stats()
@@ -0,0 +1,255 @@
+# app/metrics.py
+import asyncio
+import bisect
+import contextvars
+import math
+import os
+import resource
+import sys
+import time
+from contextlib import contextmanager
+
+# Upper bounds, in seconds, of the latency histogram buckets: from cache-speed calls to minute-long sections.
+LATENCY_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120, 300, 600)
+# A trace keeps at most this many spans; later ones are only counted.
+TRACE_MAX_SPANS = int(os.getenv("TRACE_MAX_SPANS", "2000"))
+# How often the event loop is checked for lag, in seconds.
+EVENT_LOOP_LAG_INTERVAL = float(os.getenv("EVENT_LOOP_LAG_INTERVAL", "0.1"))
+LAG_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+
+def _label_key(labelnames: tuple, labels: dict) -> tuple:
+    return tuple(str(labels.get(name, "")) for name in labelnames)
+
+def _format_labels(labelnames: tuple, values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(labelnames, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labelnames: tuple = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values: dict[tuple, float] = {}
+
+    def samples(self):
+        for key, value in sorted(self._values.items()):
+            yield self.name, _format_labels(self.labelnames, key), value
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(f"{name}{labels} {_format_value(value)}" for name, labels, value in self.samples())
+        return lines
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = _label_key(self.labelnames, labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def inc(self, amount: float = 1, **labels):
+        key = _label_key(self.labelnames, labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels):
+        self._values[_label_key(self.labelnames, labels)] = value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: tuple = (), buckets: tuple = LATENCY_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: [count per bucket (+Inf last), sum]
+        self._series: dict[tuple, list] = {}
+
+    def observe(self, value: float, **labels):
+        key = _label_key(self.labelnames, labels)
+        series = self._series.get(key)
+        if series is None:
+            series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0]
+        series[0][bisect.bisect_left(self.buckets, value)] += 1
+        series[1] += value
+
+    def samples(self):
+        for key, (counts, total) in sorted(self._series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                yield f"{self.name}_bucket", _format_labels(self.labelnames, key, f'le="{_format_value(bound)}"'), cumulative
+            yield f"{self.name}_sum", _format_labels(self.labelnames, key), total
+            yield f"{self.name}_count", _format_labels(self.labelnames, key), cumulative
+
+
+class Registry:
+    def __init__(self):
+        self.metrics: list[_Metric] = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        """The registry in the Prometheus text exposition format (version 0.0.4)."""
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+registry = Registry()
+
+SPAN_SECONDS = registry.register(Histogram(
+    "book_pipeline_span_seconds", "Duration of pipeline steps (LLM, image, sleep and render spans).", ("kind", "stage")))
+SPANS_IN_FLIGHT = registry.register(Gauge(
+    "book_pipeline_spans_in_flight", "Pipeline steps currently running.", ("kind", "stage")))
+SPAN_ERRORS = registry.register(Counter(
+    "book_pipeline_span_errors_total", "Pipeline steps that raised.", ("kind", "stage")))
+LLM_TOKENS = registry.register(Counter(
+    "book_llm_tokens_total", "Tokens reported by the API, per pipeline stage.", ("stage", "type")))
+LLM_FIRST_TOKEN_SECONDS = registry.register(Histogram(
+    "book_llm_time_to_first_token_seconds", "Time until a streamed completion produced its first text.", ("stage",)))
+EVENT_LOOP_LAG = registry.register(Histogram(
+    "book_event_loop_lag_seconds", "How late the event loop ran a callback scheduled for a given time.", (), buckets=LAG_BUCKETS))
+PROCESS_MEMORY = registry.register(Gauge(
+    "process_resident_memory_bytes", "Resident memory of the server process, now and at its peak.", ("figure",)))
+
+
+# --- Process ---
+
+async def monitor_event_loop(interval: float = EVENT_LOOP_LAG_INTERVAL):
+    """
+    Runs until cancelled, measuring how much later than asked the loop wakes this task up:
+    the time other callbacks held the loop (blocking calls, long CPU-bound steps).
+    """
+    loop = asyncio.get_running_loop()
+    while True:
+        expected = loop.time() + interval
+        await asyncio.sleep(interval)
+        EVENT_LOOP_LAG.observe(max(0.0, loop.time() - expected))
+
+def update_process_gauges():
+    """Refreshes the memory gauges, e.g. before the metrics are scraped."""
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS.
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    PROCESS_MEMORY.set(peak if sys.platform == "darwin" else peak * 1024, figure="peak")
+    try:
+        with open("/proc/self/statm") as f:
+            PROCESS_MEMORY.set(int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE"), figure="current")
+    except (OSError, ValueError):
+        pass
+
+
+# --- Tracing ---
+_current_trace = contextvars.ContextVar("book_trace", default=None)
+
+class Trace:
+    """The spans of one book job, kept for `/jobs/{job_id}/trace`."""
+
+    def __init__(self, trace_id: str):
+        self.id = trace_id
+        self.started_at = time.time()
+        self._started = time.perf_counter()
+        self.spans: list[dict] = []
+        self.dropped = 0
+        self.totals: dict[tuple, dict] = {}
+
+    def add(self, kind: str, stage: str, start: float, duration: float, error: str = None, **attrs):
+        totals = self.totals.setdefault((kind, stage), {"count": 0, "seconds": 0.0, "prompt_tokens": 0, "completion_tokens": 0})
+        totals["count"] += 1
+        totals["seconds"] += duration
+        totals["prompt_tokens"] += attrs.get("prompt_tokens") or 0
+        totals["completion_tokens"] += attrs.get("completion_tokens") or 0
+        if len(self.spans) >= TRACE_MAX_SPANS:
+            self.dropped += 1
+            return
+        span = {"kind": kind, "stage": stage, "start_s": round(start - self._started, 4), "duration_s": round(duration, 4), **attrs}
+        if error:
+            span["error"] = error
+        self.spans.append(span)
+
+    def to_dict(self) -> dict:
+        return {
+            "trace_id": self.id,
+            "started_at": self.started_at,
+            "stages": [{"kind": kind, "stage": stage, **{k: round(v, 4) if isinstance(v, float) else v for k, v in totals.items()}}
+                       for (kind, stage), totals in self.totals.items()],
+            "spans": self.spans,
+            "dropped_spans": self.dropped,
+        }
+
+def activate_trace(trace: Trace):
+    """Makes `trace` collect the spans of the current task and of the tasks it starts."""
+    _current_trace.set(trace)
+
+
+class Span:
+    __slots__ = ("kind", "stage", "attrs", "start")
+
+    def __init__(self, kind: str, stage: str, attrs: dict):
+        self.kind, self.stage, self.attrs = kind, stage, attrs
+        self.start = time.perf_counter()
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def record_usage(self, usage):
+        """Records the token counts of an API response's `usage`, if it has one."""
+        if usage is None:
+            return
+        prompt_tokens = getattr(usage, "prompt_tokens", None) or 0
+        completion_tokens = getattr(usage, "completion_tokens", None) or 0
+        self.attrs["prompt_tokens"] = prompt_tokens
+        self.attrs["completion_tokens"] = completion_tokens
+        LLM_TOKENS.inc(prompt_tokens, stage=self.stage, type="prompt")
+        LLM_TOKENS.inc(completion_tokens, stage=self.stage, type="completion")
+
+    def first_token(self):
+        elapsed = time.perf_counter() - self.start
+        self.attrs["first_token_s"] = round(elapsed, 4)
+        LLM_FIRST_TOKEN_SECONDS.observe(elapsed, stage=self.stage)
+
+def record_span(kind: str, stage: str, duration: float, start: float = None, error: str = None, **attrs):
+    """Records a step that has already been timed, e.g. by a render worker."""
+    SPAN_SECONDS.observe(duration, kind=kind, stage=stage)
+    if error:
+        SPAN_ERRORS.inc(kind=kind, stage=stage)
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.add(kind, stage, start if start is not None else time.perf_counter() - duration, duration, error, **attrs)
+
+@contextmanager
+def span(kind: str, stage: str, **attrs):
+    """Times the enclosed step into the latency histogram and the current job's trace."""
+    current = Span(kind, stage, attrs)
+    SPANS_IN_FLIGHT.inc(kind=kind, stage=stage)
+    error = None
+    try:
+        yield current
+    except BaseException as e:
+        error = type(e).__name__
+        raise
+    finally:
+        SPANS_IN_FLIGHT.dec(kind=kind, stage=stage)
+        record_span(kind, stage, time.perf_counter() - current.start, current.start, error, **current.attrs)
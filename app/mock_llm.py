@@ -0,0 +1,202 @@
+# app/mock_llm.py
+import asyncio
+import hashlib
+import json
+import random
+import re
+import time
+from types import SimpleNamespace
+
+# A 1x1 transparent PNG, enough for the PDF exporter to embed.
+MOCK_PNG_BASE64 = "iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAQAAAC1HAwCAAAAC0lEQVR42mNkYAAAAAYAAjCB0C8AAAAASUVORK5CYII="
+MOCK_CAST = {
+    "people": ["Luke Skywalker", "Darth Vader", "Leia Organa", "Obi-Wan Kenobi"],
+    "planets": ["Tatooine", "Alderaan"],
+    "starships": ["X-wing", "Millennium Falcon"],
+}
+LOREM_WORDS = (
+    "you feel the hum of the hyperdrive as the stars stretch into lines and the old "
+    "droid chirps a warning from the cockpit while dust storms gather over the horizon"
+).split()
+
+class MockAPIError(Exception):
+    """Mimics an OpenAI APIStatusError closely enough for the rate limiter's retry logic."""
+
+    def __init__(self, status_code: int, retry_after_ms: int = None):
+        super().__init__(f"Mock API error {status_code}")
+        self.status_code = status_code
+        headers = {"retry-after-ms": str(retry_after_ms)} if retry_after_ms is not None else {}
+        self.response = SimpleNamespace(headers=headers)
+
+
+class _MockStream:
+    """Yields a completion as streaming chunks of a few words each, like `AsyncStream[ChatCompletionChunk]`."""
+
+    def __init__(self, content: str, words_per_chunk: int = 4, usage=None):
+        self._usage = usage
+        self.closed = False
+        words = content.split(" ")
+        self._pieces = [" ".join(words[i:i + words_per_chunk]) + (" " if i + words_per_chunk < len(words) else "")
+                        for i in range(0, len(words), words_per_chunk)]
+
+    def __aiter__(self):
+        return self._chunks()
+
+    async def close(self):
+        self.closed = True
+
+    async def _chunks(self):
+        for piece in self._pieces:
+            await asyncio.sleep(0)
+            if self.closed:
+                return
+            yield SimpleNamespace(choices=[SimpleNamespace(index=0, delta=SimpleNamespace(content=piece))], usage=None)
+        if self._usage is not None:
+            # Sent when the request asked for stream_options={"include_usage": True}.
+            yield SimpleNamespace(choices=[], usage=self._usage)
+
+
+class _RawResponse:
+    def __init__(self, parsed, headers: dict):
+        self._parsed = parsed
+        self.headers = headers
+
+    def parse(self):
+        return self._parsed
+
+
+class _Completions:
+    def __init__(self, backend: "MockAsyncOpenAI"):
+        self._backend = backend
+        self.with_raw_response = SimpleNamespace(create=self._create_raw)
+
+    async def create(self, **kwargs):
+        return await self._backend._chat(**kwargs)
+
+    async def _create_raw(self, **kwargs):
+        return _RawResponse(await self._backend._chat(**kwargs), self._backend._headers())
+
+
+class _Images:
+    def __init__(self, backend: "MockAsyncOpenAI"):
+        self._backend = backend
+        self.with_raw_response = SimpleNamespace(generate=self._generate_raw)
+
+    async def generate(self, **kwargs):
+        return await self._backend._image(**kwargs)
+
+    async def _generate_raw(self, **kwargs):
+        return _RawResponse(await self._backend._image(**kwargs), self._backend._headers())
+
+
+class MockAsyncOpenAI:
+    """
+    A deterministic, offline stand-in for the parts of `AsyncOpenAI` used by book_writer.
+    Text and JSON responses have a fixed size, latency is drawn from a normal distribution,
+    a `slow_call_rate` share of calls takes `slow_call_factor` times as long (the heavy tail of
+    real API latency), and a configurable fraction of calls fails with 429 or 500 errors. Sections come back
+    `word_yield` times as long as asked (real models tend to fall short of long targets).
+    """
+
+    def __init__(self, latency: float = 0.05, latency_jitter: float = 0.0, error_rate: float = 0.0,
+                 rate_limit_share: float = 0.5, words_per_section: int = None, word_yield: float = 1.0,
+                 slow_call_rate: float = 0.0, slow_call_factor: float = 10.0, seed: int = 0):
+        self.latency = latency
+        self.latency_jitter = latency_jitter
+        self.error_rate = error_rate
+        self.rate_limit_share = rate_limit_share
+        self.words_per_section = words_per_section
+        self.word_yield = word_yield
+        self.slow_call_rate = slow_call_rate
+        self.slow_call_factor = slow_call_factor
+        self.seed = seed
+        self._random = random.Random(seed)
+        self.chat = SimpleNamespace(completions=_Completions(self))
+        self.images = _Images(self)
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.stats = {"chat_calls": 0, "image_calls": 0, "errors": 0, "slow_calls": 0, "prompt_bytes": 0, "completion_tokens": 0}
+
+    def _headers(self) -> dict:
+        return {"x-ratelimit-remaining-requests": "10000", "x-ratelimit-remaining-tokens": "10000000"}
+
+    async def _simulate_call(self):
+        delay = max(0.0, self._random.gauss(self.latency, self.latency_jitter)) if self.latency_jitter else self.latency
+        if self.slow_call_rate and self._random.random() < self.slow_call_rate:
+            self.stats["slow_calls"] += 1
+            delay *= self.slow_call_factor
+        if delay:
+            await asyncio.sleep(delay)
+        if self.error_rate and self._random.random() < self.error_rate:
+            self.stats["errors"] += 1
+            if self._random.random() < self.rate_limit_share:
+                raise MockAPIError(429, retry_after_ms=int(self.latency * 1000))
+            raise MockAPIError(500)
+
+    def _text(self, prompt: str, words: int) -> str:
+        rng = random.Random(hashlib.sha256(f"{self.seed}:{prompt}".encode("utf-8")).digest())
+        paragraphs = []
+        for start in range(0, words, 120):
+            count = min(120, words - start)
+            paragraphs.append(" ".join(rng.choice(LOREM_WORDS) for _ in range(count)).capitalize() + ".")
+        return "\n\n".join(paragraphs)
+
+    def _section_words(self, prompt: str, max_tokens: int) -> int:
+        target = re.search(r'approximately (\d+) words', prompt)
+        words = (self.words_per_section or int(int(target.group(1)) * self.word_yield)) if target else 150
+        # Like the real model, never write past the completion allowance (~0.75 words per token).
+        if max_tokens:
+            words = min(words, int(max_tokens * 0.75))
+        return words
+
+    def _respond(self, prompt: str, max_tokens: int, response_format: dict) -> str:
+        if response_format and response_format.get("type") == "json_object":
+            if '"summary"' in prompt:
+                # A section with its continuity summary, whose ~60 tokens share the completion allowance.
+                words = self._section_words(prompt, max_tokens and max_tokens - 60)
+                return json.dumps({"text": self._text(prompt, words), "summary": self._text(f"summary:{prompt}", 40)})
+            chapters = re.search(r'exactly (\d+) objects', prompt)
+            if chapters:
+                return json.dumps({"chapters": [
+                    {
+                        "title": f"Mock Chapter {i+1}",
+                        "synopsis": f"Events of mock chapter {i+1} unfold.",
+                        "entry_state": f"The crew regroups after chapter {i}.",
+                        "exit_state": f"The crew escapes at the end of chapter {i+1}.",
+                    }
+                    for i in range(int(chapters.group(1)))
+                ]})
+            return json.dumps(MOCK_CAST)
+        chapter_list = re.search(r'list of (\d+) creative', prompt)
+        if chapter_list:
+            return "\n".join(f"{i+1}. Mock Chapter {i+1}" for i in range(int(chapter_list.group(1))))
+        if "book title" in prompt:
+            return "Echoes of the Mock Republic"
+        return self._text(prompt, self._section_words(prompt, max_tokens))
+
+    async def _chat(self, model: str, messages: list[dict], max_tokens: int = None,
+                    response_format: dict = None, stream: bool = False, **kwargs):
+        self.stats["chat_calls"] += 1
+        prompt = "\n".join(m.get("content") or "" for m in messages)
+        self.stats["prompt_bytes"] += len(prompt.encode("utf-8"))
+        await self._simulate_call()
+        content = self._respond(prompt, max_tokens, response_format)
+        prompt_tokens, completion_tokens = len(prompt) // 4, len(content) // 4
+        self.stats["completion_tokens"] += completion_tokens
+        usage = SimpleNamespace(prompt_tokens=prompt_tokens, completion_tokens=completion_tokens,
+                                total_tokens=prompt_tokens + completion_tokens)
+        if stream:
+            include_usage = (kwargs.get("stream_options") or {}).get("include_usage")
+            return _MockStream(content, usage=usage if include_usage else None)
+        return SimpleNamespace(
+            id=f"mock-{self.stats['chat_calls']}", model=model, created=int(time.time()),
+            choices=[SimpleNamespace(index=0, finish_reason="stop", message=SimpleNamespace(role="assistant", content=content))],
+            usage=usage,
+        )
+
+    async def _image(self, prompt: str, **kwargs):
+        self.stats["image_calls"] += 1
+        self.stats["prompt_bytes"] += len(prompt.encode("utf-8"))
+        await self._simulate_call()
+        return SimpleNamespace(created=int(time.time()), data=[SimpleNamespace(url=None, b64_json=MOCK_PNG_BASE64)])
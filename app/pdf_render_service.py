@@ -0,0 +1,192 @@
+# app/pdf_render_service.py
+import asyncio
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from app.metrics import Histogram, registry, span
+
+PDF_RENDER_WORKERS = int(os.getenv("PDF_RENDER_WORKERS", "2"))
+# Each worker process is replaced after this many books, which caps the memory WeasyPrint accumulates.
+PDF_WORKER_MAX_BOOKS = int(os.getenv("PDF_WORKER_MAX_BOOKS", "20"))
+
+PDF_WORKER_SECONDS = registry.register(Histogram(
+    "book_pdf_worker_seconds", "Time PDF render tasks spent queued for and running in a worker.", ("step", "phase")))
+
+# --- Worker Process ---
+# Everything below runs inside the render processes. Each one imports WeasyPrint, parses the
+# fonts and stylesheet and lays out a warm-up page once, then keeps a renderer per book so
+# chapters sent while the book is being written are merged by the same process at the end.
+_books = {}
+
+def _warm_worker():
+    from app.book_pdf_exporter import render_fragment
+    render_fragment("blank")
+    render_fragment("chapter", first_page=1, index=0, heading="Warm-up", content="Warm-up paragraph.")
+
+def _ping() -> int:
+    return os.getpid()
+
+def _render_block(book_id: str, submitted_at: float, kind: str, **block) -> tuple[float, float]:
+    from app.book_pdf_exporter import BookPdfRenderer
+    started_at = time.time()
+    _books.setdefault(book_id, BookPdfRenderer()).render_block(kind, **block)
+    return started_at - submitted_at, time.time() - started_at
+
+def _finish_book(book_id: str, submitted_at: float, title: str, book_data: dict, filename: str) -> tuple[str, float, float]:
+    from app.book_pdf_exporter import BookPdfRenderer
+    started_at = time.time()
+    # A book whose blocks were lost (e.g. the previous worker died) is simply laid out in full.
+    renderer = _books.pop(book_id, None) or BookPdfRenderer()
+    output_path = renderer.finish(title, book_data, filename)
+    return output_path, started_at - submitted_at, time.time() - started_at
+
+def _discard_book(book_id: str):
+    _books.pop(book_id, None)
+
+def _call(fn, args: tuple, kwargs: dict):
+    return fn(*args, **kwargs)
+
+
+# --- Service ---
+
+class _WorkerSlot:
+    """One single-process executor plus the books currently assigned to it."""
+
+    def __init__(self, index: int):
+        self.index = index
+        self.executor: ProcessPoolExecutor = None
+        self.books: set[str] = set()
+        self.books_done = 0
+
+    def spawn(self):
+        self.executor = ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn"), initializer=_warm_worker)
+        self.books_done = 0
+        # Processes start on first use; submitting a no-op warms the worker before any book needs it.
+        self.executor.submit(_ping)
+
+    def shutdown(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
+
+
+class PdfRenderService:
+    """
+    Renders books in a pool of pre-warmed worker processes, so layout work neither holds the
+    server's GIL nor stalls other books. Every block of a book goes to the same worker, which
+    keeps the laid-out pages until the book is finished.
+    """
+
+    def __init__(self, num_workers: int = PDF_RENDER_WORKERS, max_books_per_worker: int = PDF_WORKER_MAX_BOOKS):
+        self.num_workers = max(1, num_workers)
+        self.max_books_per_worker = max(1, max_books_per_worker)
+        self._slots: list[_WorkerSlot] = []
+        self._assignments: dict[str, _WorkerSlot] = {}
+        self.reset_stats()
+
+    def reset_stats(self):
+        self._stats = {
+            "books": 0, "blocks": 0, "failures": 0, "worker_restarts": 0,
+            "queue_wait_s_total": 0.0, "queue_wait_s_max": 0.0,
+            "render_s_total": 0.0, "render_s_max": 0.0,
+        }
+
+    def start(self):
+        if not self._slots:
+            self._slots = [_WorkerSlot(i) for i in range(self.num_workers)]
+            for slot in self._slots:
+                slot.spawn()
+
+    def shutdown(self):
+        for slot in self._slots:
+            slot.shutdown()
+        self._slots = []
+        self._assignments.clear()
+
+    def _slot_for(self, book_id: str) -> _WorkerSlot:
+        if book_id not in self._assignments:
+            self.start()
+            # Workers due for recycling get no new books, so they drain and can be replaced.
+            slot = min(self._slots, key=lambda s: (s.books_done >= self.max_books_per_worker, len(s.books)))
+            slot.books.add(book_id)
+            self._assignments[book_id] = slot
+        return self._assignments[book_id]
+
+    def _release(self, book_id: str, completed: bool):
+        slot = self._assignments.pop(book_id, None)
+        if slot is None:
+            return
+        slot.books.discard(book_id)
+        if completed:
+            slot.books_done += 1
+        if slot.books_done >= self.max_books_per_worker and not slot.books:
+            slot.shutdown()
+            slot.spawn()
+            self._stats["worker_restarts"] += 1
+
+    def _record(self, step: str, queue_wait: float, render_time: float):
+        PDF_WORKER_SECONDS.observe(queue_wait, step=step, phase="queue_wait")
+        PDF_WORKER_SECONDS.observe(render_time, step=step, phase="render")
+        self._stats["queue_wait_s_total"] += queue_wait
+        self._stats["queue_wait_s_max"] = max(self._stats["queue_wait_s_max"], queue_wait)
+        self._stats["render_s_total"] += render_time
+        self._stats["render_s_max"] = max(self._stats["render_s_max"], render_time)
+
+    async def _run(self, slot: _WorkerSlot, fn, *args, **kwargs):
+        executor = slot.executor
+        try:
+            return await asyncio.get_running_loop().run_in_executor(executor, _call, fn, args, kwargs)
+        except BrokenProcessPool:
+            # The worker died (e.g. killed for memory). Replace it; its books re-render at finish.
+            self._stats["failures"] += 1
+            if slot.executor is executor:
+                slot.shutdown()
+                slot.spawn()
+                self._stats["worker_restarts"] += 1
+            raise
+
+    async def render_block(self, book_id: str, kind: str, **block):
+        """Lays out a prologue, chapter or epilogue of `book_id` in its worker."""
+        slot = self._slot_for(book_id)
+        with span("render", "pdf_block", block=kind) as step:
+            queue_wait, render_time = await self._run(slot, _render_block, book_id, time.time(), kind, **block)
+            step.set(queue_wait_s=round(queue_wait, 4), render_s=round(render_time, 4))
+        self._stats["blocks"] += 1
+        self._record("block", queue_wait, render_time)
+
+    async def finish_book(self, book_id: str, title: str, book_data: dict, filename: str) -> str:
+        """Merges the book's fragments into the final PDF and returns its path."""
+        slot = self._slot_for(book_id)
+        try:
+            with span("render", "pdf_finish") as step:
+                output_path, queue_wait, render_time = await self._run(slot, _finish_book, book_id, time.time(), title, book_data, filename)
+                step.set(queue_wait_s=round(queue_wait, 4), render_s=round(render_time, 4))
+        except BaseException:
+            self._release(book_id, completed=False)
+            raise
+        self._stats["books"] += 1
+        self._record("finish", queue_wait, render_time)
+        self._release(book_id, completed=True)
+        return output_path
+
+    def discard_book(self, book_id: str):
+        """Drops the pages of a book that will not be finished (failed or cancelled)."""
+        slot = self._assignments.get(book_id)
+        if slot is None:
+            return
+        if slot.executor is not None:
+            slot.executor.submit(_discard_book, book_id)
+        self._release(book_id, completed=False)
+
+    def stats(self) -> dict:
+        tasks = self._stats["books"] + self._stats["blocks"]
+        return {
+            **self._stats,
+            "queue_wait_s_avg": self._stats["queue_wait_s_total"] / tasks if tasks else 0.0,
+            "render_s_avg": self._stats["render_s_total"] / tasks if tasks else 0.0,
+            "workers": [{"worker": s.index, "active_books": len(s.books), "books_done": s.books_done} for s in self._slots],
+        }
+
+pdf_render_service = PdfRenderService()
@@ -1,14 +1,21 @@
 # app/prompt_builder.py
 import json
+from app.swapi_store import SwapiStore
+from app.context_compiler import CompiledContext
 
-def build_data_selection_prompt(user_prompt: str, all_data: dict) -> str:
-    """Builds a prompt to ask the AI to select relevant entities from the SWAPI data."""
-    data_summary = {
-        "people": [p.get('name') for p in all_data.get('people', [])],
-        "planets": [p.get('name') for p in all_data.get('planets', [])],
-        "starships": [s.get('name') for s in all_data.get('starships', [])],
-        "films": [f.get('title') for f in all_data.get('films', [])],
-    }
+def format_data_context(data_context: dict | CompiledContext) -> str:
+    """Returns the text embedded for a data context, counting uses of a compiled context for its token report."""
+    if isinstance(data_context, CompiledContext):
+        data_context.uses += 1
+        return data_context.text
+    return json.dumps(data_context, indent=2)
+
+def build_data_selection_prompt(user_prompt: str, store: SwapiStore, candidates: dict[str, list[str]] = None) -> str:
+    """
+    Builds a prompt to ask the AI to select relevant entities from the SWAPI data: from
+    `candidates` (names by category) when given, otherwise from every name in the store.
+    """
+    data_summary = candidates or {category: store.names(category) for category in ("people", "planets", "starships", "films")}
     return f"""
 Based on the user's story prompt, select a small, coherent set of entities from the provided JSON data. This will be the "cast" for the entire novel. Choose a few main characters, a primary setting (planet), and a few relevant starships.
 USER PROMPT: "{user_prompt}"
@@ -42,8 +49,44 @@ I am writing a {num_chapters}-chapter Star Wars novel about: '{user_prompt}'.
 Please generate a list of {num_chapters} creative and sequential chapter titles for this story. Return them as a numbered list (e.g., '1. The Awakening', '2. A Fading Hope').
 """
 
-def build_chapter_section_prompt(user_prompt: str, chapter_title: str, previous_section_summary: str, data_context: dict, word_target: int) -> str:
-    """Builds the main prompt for generating a single section of a chapter's content."""
+def build_book_outline_prompt(user_prompt: str, num_chapters: int, data_context: dict | CompiledContext) -> str:
+    """Builds a planning prompt asking for a structured outline of every chapter in one call."""
+    return f"""
+I am planning a {num_chapters}-chapter Star Wars novel about: '{user_prompt}'.
+The chapters will be written independently and in parallel, so the outline is the only thing that keeps them consistent with each other.
+
+DATA CONTEXT (the only characters, planets, and starships you may use):
+---
+{format_data_context(data_context)}
+---
+
+Your task:
+Respond with a JSON object with a single key "chapters" holding a list of exactly {num_chapters} objects, in story order. Each object must have these keys:
+- "title": a short, creative chapter title.
+- "synopsis": 2-3 sentences describing what happens in the chapter.
+- "entry_state": 1-2 sentences describing where the characters are and what they know as the chapter opens.
+- "exit_state": 1-2 sentences describing where the characters are and what has changed when the chapter ends.
+Each chapter's "entry_state" must follow directly from the previous chapter's "exit_state".
+"""
+
+SECTION_FORMAT = "Begin writing the content directly. Do not repeat the chapter title.\n"
+SECTION_WITH_SUMMARY_FORMAT = """Do not repeat the chapter title. Respond with a JSON object with exactly these two keys, in this order:
+- "text": the section itself, as plain prose with paragraphs separated by blank lines.
+- "summary": 2-3 sentences summarizing the key actions, character movements, and plot developments of the section. This summary will be used as a continuity guide for the next block of writing.
+"""
+
+def build_chapter_section_prompt(user_prompt: str, chapter_title: str, previous_section_summary: str, data_context: dict | CompiledContext, word_target: int, chapter_outline: dict = None, with_summary: bool = False) -> str:
+    """
+    Builds the main prompt for generating a single section of a chapter's content.
+    With `with_summary`, the model returns the section and its continuity summary together as JSON.
+    """
+    outline_str = ""
+    if chapter_outline:
+        outline_str = f"""CHAPTER PLAN: {chapter_outline.get('synopsis', '')}
+The chapter opens with: "{chapter_outline.get('entry_state', '')}"
+By the end of the chapter: "{chapter_outline.get('exit_state', '')}"
+Stay within this plan so the chapter connects to the ones before and after it.
+"""
     return f"""
 You are a novelist writing a Star Wars story in the second person ("You feel...", "You see...").
 Your task is to write a single, detailed section of the novel.
@@ -53,16 +96,15 @@ CRITICAL INSTRUCTION: You MUST base your writing *exclusively* on the data provi
 STORY THEME: "{user_prompt}"
 CURRENT SECTION: This section is part of '{chapter_title}'.
 CONTINUITY: The previous part of the story concluded with the following events: "{previous_section_summary}"
-
+{outline_str}
 DATA CONTEXT (Your only source of truth for names, places, and specs):
 ---
-{json.dumps(data_context, indent=2)}
+{format_data_context(data_context)}
 ---
 
 Your task:
 Write the next section of the story, continuing from the summary. Make it detailed, descriptive, and approximately {word_target} words long.
-Begin writing the content directly. Do not repeat the chapter title.
-"""
+{SECTION_WITH_SUMMARY_FORMAT if with_summary else SECTION_FORMAT}"""
 
 def build_summarization_prompt(section_text: str) -> str:
     """Builds a prompt to summarize a generated section for continuity."""
@@ -0,0 +1,198 @@
+# app/rate_limiter.py
+import asyncio
+import random
+import re
+import time
+from app.metrics import record_span, span
+
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504}
+# Waits for budget shorter than this are not worth a span.
+MIN_RECORDED_WAIT_SECONDS = 0.001
+
+def parse_reset_duration(value: str) -> float | None:
+    """Parses OpenAI reset durations such as '1s', '6m0s', '20ms' or '0.5' into seconds."""
+    if value is None:
+        return None
+    value = str(value).strip()
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    parts = re.findall(r'(\d+(?:\.\d+)?)(ms|h|m|s)', value)
+    if not parts:
+        return None
+    units = {"h": 3600, "m": 60, "s": 1, "ms": 0.001}
+    return sum(float(amount) * units[unit] for amount, unit in parts)
+
+def retry_after_seconds(headers) -> float | None:
+    """Reads the server's requested wait from 'retry-after-ms' or 'retry-after' headers."""
+    if not headers:
+        return None
+    if headers.get("retry-after-ms"):
+        try:
+            return float(headers["retry-after-ms"]) / 1000
+        except ValueError:
+            pass
+    return parse_reset_duration(headers.get("retry-after"))
+
+
+class _Bucket:
+    """A token bucket holding a per-minute budget that refills continuously."""
+
+    def __init__(self, per_minute: int):
+        self.capacity = float(per_minute)
+        self.level = float(per_minute)
+        self.updated = time.monotonic()
+
+    def refill(self, now: float):
+        rate = self.capacity / 60
+        self.level = min(self.capacity, self.level + (now - self.updated) * rate)
+        self.updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        self.refill(now)
+        amount = min(amount, self.capacity)
+        if self.level >= amount:
+            return 0.0
+        return (amount - self.level) / (self.capacity / 60)
+
+
+class RateLimiter:
+    """
+    A process-wide limiter with separate request-per-minute and token-per-minute
+    budgets. It adapts to the rate-limit headers the server returns and backs off
+    with jitter when a call is rejected.
+    """
+
+    def __init__(self, name: str, requests_per_minute: int, tokens_per_minute: int = None,
+                 max_retries: int = 6, base_backoff: float = 1.0, max_backoff: float = 60.0):
+        self.name = name
+        self.requests = _Bucket(requests_per_minute)
+        self.tokens = _Bucket(tokens_per_minute) if tokens_per_minute else None
+        self.max_retries = max_retries
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.paused_until = 0.0
+        self._lock = None
+        self._lock_loop = None
+
+    def _get_lock(self) -> asyncio.Lock:
+        # asyncio.Lock is bound to the loop it is first used on, so keep one per loop.
+        loop = asyncio.get_running_loop()
+        if self._lock_loop is not loop:
+            self._lock, self._lock_loop = asyncio.Lock(), loop
+        return self._lock
+
+    async def acquire(self, tokens: int = 0):
+        """
+        Waits until both budgets can cover one request of the given token cost, then spends them.
+        The wait happens outside the lock, so a costly request does not hold up cheaper ones.
+        """
+        while True:
+            async with self._get_lock():
+                now = time.monotonic()
+                delay = max(
+                    self.paused_until - now,
+                    self.requests.wait_time(1, now),
+                    self.tokens.wait_time(tokens, now) if self.tokens else 0.0,
+                )
+                if delay <= 0:
+                    self.requests.level -= 1
+                    if self.tokens:
+                        self.tokens.level -= min(tokens, self.tokens.capacity)
+                    return
+            await asyncio.sleep(delay)
+
+    def settle(self, estimated_tokens: int, actual_tokens: int):
+        """Returns the difference between the estimated and the actual token cost to the budget."""
+        if self.tokens and actual_tokens is not None:
+            self.tokens.refill(time.monotonic())
+            self.tokens.level = min(self.tokens.capacity, self.tokens.level + estimated_tokens - actual_tokens)
+
+    def update_from_headers(self, headers):
+        """Aligns the local budgets with the 'x-ratelimit-*' headers sent by the server."""
+        if not headers:
+            return
+        now = time.monotonic()
+        for bucket, kind in ((self.requests, "requests"), (self.tokens, "tokens")):
+            if bucket is None:
+                continue
+            limit = headers.get(f"x-ratelimit-limit-{kind}")
+            remaining = headers.get(f"x-ratelimit-remaining-{kind}")
+            try:
+                if limit:
+                    bucket.capacity = float(limit)
+                if remaining is not None:
+                    bucket.refill(now)
+                    bucket.level = min(bucket.level, float(remaining))
+            except ValueError:
+                continue
+
+    def pause(self, seconds: float):
+        """Blocks every caller sharing this limiter for the given number of seconds."""
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+    def backoff_delay(self, attempt: int, retry_after: float = None) -> float:
+        """Exponential backoff with full jitter, never shorter than the server's retry-after."""
+        delay = random.uniform(0, min(self.max_backoff, self.base_backoff * (2 ** attempt)))
+        if retry_after is not None:
+            delay = max(delay, retry_after) + random.uniform(0, self.base_backoff)
+        return delay
+
+    async def call(self, raw_fn, *, tokens: int = 0, retry_on: tuple = (), **kwargs):
+        """
+        Runs `raw_fn(**kwargs)` inside the budget and returns the parsed result.
+        `raw_fn` must return a raw API response exposing `.headers` and `.parse()`,
+        such as the OpenAI client's `with_raw_response` methods.
+        """
+        for attempt in range(self.max_retries + 1):
+            started = time.perf_counter()
+            await self.acquire(tokens)
+            waited = time.perf_counter() - started
+            if waited >= MIN_RECORDED_WAIT_SECONDS:
+                record_span("sleep", f"{self.name}_rate_limit", waited, started)
+            try:
+                raw_response = await raw_fn(**kwargs)
+            except Exception as e:
+                status_code = getattr(e, "status_code", None)
+                if attempt == self.max_retries or not (status_code in RETRYABLE_STATUS_CODES or isinstance(e, retry_on)):
+                    raise
+                headers = getattr(getattr(e, "response", None), "headers", None)
+                self.update_from_headers(headers)
+                delay = self.backoff_delay(attempt, retry_after_seconds(headers))
+                if status_code == 429:
+                    self.pause(delay)
+                print(f"[{self.name}] Call failed ({status_code or type(e).__name__}), retrying in {delay:.1f}s (attempt {attempt + 1}/{self.max_retries})...")
+                with span("sleep", f"{self.name}_backoff", attempt=attempt + 1, status_code=status_code):
+                    await asyncio.sleep(delay)
+                continue
+            self.update_from_headers(raw_response.headers)
+            result = raw_response.parse()
+            if kwargs.get("stream"):
+                return _SettlingStream(result, self, tokens)
+            usage = getattr(result, "usage", None)
+            self.settle(tokens, getattr(usage, "total_tokens", None))
+            return result
+
+
+class _SettlingStream:
+    """
+    A streamed completion that settles its token estimate once the usage arrives, in the last
+    chunk of streams requested with stream_options={"include_usage": True}. Anything else
+    (such as close()) is the wrapped stream's.
+    """
+
+    def __init__(self, stream, limiter: RateLimiter, estimated_tokens: int):
+        self._stream = stream
+        self._limiter = limiter
+        self._estimated_tokens = estimated_tokens
+
+    def __getattr__(self, name):
+        return getattr(self._stream, name)
+
+    async def __aiter__(self):
+        async for chunk in self._stream:
+            usage = getattr(chunk, "usage", None)
+            if usage is not None:
+                self._limiter.settle(self._estimated_tokens, getattr(usage, "total_tokens", None))
+            yield chunk
@@ -1,19 +1,80 @@
+# app/swapi_client.py
+import asyncio
+import os
+import time
+from collections import OrderedDict
 import httpx
-import warnings
+from app.http_client import get_http_client
+from app.swapi_store import SwapiEntity, get_swapi_store
 
-# Ignore SSL certificate warnings
-warnings.filterwarnings("ignore", message="Unverified HTTPS request")
+SWAPI_BASE_URL = os.getenv("SWAPI_BASE_URL", "https://swapi.dev/api")
+# Remote answers (including "not found") are reused for this long before asking SWAPI again.
+SWAPI_CACHE_TTL_SECONDS = float(os.getenv("SWAPI_CACHE_TTL_SECONDS", "3600"))
+SWAPI_CACHE_MAX_ENTRIES = 1024
+MAX_CONCURRENT_LOOKUPS = 8
 
-SWAPI_BASE_URL = "https://swapi.dev/api"
+_remote_cache: OrderedDict[tuple[str, str], tuple[float, dict]] = OrderedDict()
+
+def _cached(key: tuple[str, str]) -> dict | None:
+    entry = _remote_cache.get(key)
+    if entry is None:
+        return None
+    expires_at, result = entry
+    if expires_at < time.monotonic():
+        del _remote_cache[key]
+        return None
+    _remote_cache.move_to_end(key)
+    return result
+
+def _remember(key: tuple[str, str], result: dict):
+    _remote_cache[key] = (time.monotonic() + SWAPI_CACHE_TTL_SECONDS, result)
+    _remote_cache.move_to_end(key)
+    while len(_remote_cache) > SWAPI_CACHE_MAX_ENTRIES:
+        _remote_cache.popitem(last=False)
+
+async def _search_remote(category: str, name: str) -> dict:
+    try:
+        response = await get_http_client().get(f"{SWAPI_BASE_URL}/{category}/", params={"search": name})
+        response.raise_for_status()
+        results = response.json().get("results", [])
+    except httpx.HTTPError as e:
+        # Errors are not cached, so the next lookup tries again.
+        return {"error": str(e)}
+    if results:
+        # The first match, shaped like a local record: cross-references as names instead of URLs.
+        result = get_swapi_store().to_record(SwapiEntity(category, results[0]))
+    else:
+        result = {"name": name, "info": "No data found."}
+    _remember((category, name.lower()), result)
+    return result
+
+async def fetch_info(category: str, name: str) -> dict:
+    """
+    Looks `name` up in the local SWAPI dataset first, then in the TTL cache of earlier remote
+    answers, and only then searches the SWAPI server.
+    """
+    store = get_swapi_store()
+    entity = store.find(category, name)
+    if entity is not None:
+        return store.to_record(entity)
+    cached = _cached((category, name.lower()))
+    if cached is not None:
+        return cached
+    return await _search_remote(category, name)
+
+async def fetch_many(category: str, names: list[str], max_concurrent: int = MAX_CONCURRENT_LOOKUPS) -> dict[str, dict]:
+    """Looks up several names at once; remote fallbacks run concurrently. Returns results keyed by name."""
+    semaphore = asyncio.Semaphore(max(1, max_concurrent))
+
+    async def lookup(name: str) -> dict:
+        async with semaphore:
+            return await fetch_info(category, name)
+
+    unique_names = list(dict.fromkeys(names))
+    return dict(zip(unique_names, await asyncio.gather(*(lookup(name) for name in unique_names))))
 
 async def fetch_character_info(name: str) -> dict:
-    async with httpx.AsyncClient(verify=False) as client:  # Skip SSL verification here
-        try:
-            response = await client.get(f"{SWAPI_BASE_URL}/people/", params={"search": name})
-            response.raise_for_status()
-            results = response.json().get("results", [])
-            if not results:
-                return {"name": name, "info": "No data found."}
-            return results[0]  # Return the first matched result
-        except httpx.RequestError as e:
-            return {"error": str(e)}
\ No newline at end of file
+    return await fetch_info("people", name)
+
+async def fetch_characters_info(names: list[str]) -> dict[str, dict]:
+    return await fetch_many("people", names)
@@ -0,0 +1,191 @@
+# app/swapi_search.py
+import math
+import re
+import threading
+from app.swapi_store import SwapiEntity, SwapiStore, get_swapi_store, normalize_name
+
+# The categories a book's cast is chosen from.
+CAST_CATEGORIES = ("people", "planets", "starships")
+# BM25 parameters: term frequency saturation and document length normalization.
+BM25_K1 = 1.2
+BM25_B = 0.75
+# How many times the words of an entity's own name and aliases count, against one for the
+# words describing it (species, homeworld, films, pilots, residents, terrain, ...).
+NAME_WEIGHT = 3
+# Attributes worth searching besides names, e.g. "an ice planet" or "a bounty hunter's ship".
+DESCRIPTIVE_FIELDS = {
+    "planets": ("climate", "terrain"),
+    "starships": ("model", "manufacturer", "starship_class"),
+}
+STOPWORDS = {
+    "a", "an", "and", "as", "at", "by", "for", "from", "he", "her", "his", "in", "into", "is", "it", "its",
+    "of", "on", "or", "she", "that", "the", "their", "they", "to", "who", "with",
+}
+# Names that are also everyday words ("a jar", "a sly smuggler", "a grievous wound"): on their
+# own they only count as a mention when capitalized in the prompt.
+AMBIGUOUS_NAMES = {
+    "bail", "ben", "bib", "cord", "dorm", "dud", "executor", "falcon", "grievous", "jar", "kit",
+    "lama", "mace", "san", "scimitar", "sly", "wat", "wedge", "wicket",
+}
+# The field of a person that links to the planets, and to the starships, of their story.
+CAST_LINKS = {"planets": "homeworld", "starships": "starships"}
+# Placeholder records in the dataset, never part of a cast.
+PLACEHOLDER_NAMES = {"unknown"}
+
+def stem(term: str) -> str:
+    """A light stemmer for plurals and demonyms: 'gungans' and 'gungan', 'corellian' and 'corellia', 'wookiee' and 'wookie'."""
+    if len(term) <= 4:
+        return term
+    if term.endswith("s") and not term.endswith("ss"):
+        term = term[:-1]
+    if term.endswith("ian"):
+        term = term[:-1]
+    return term.rstrip("e")
+
+def tokenize(text: str) -> list[str]:
+    # Single letters and digits ('x wing', 'slave 1') match far too much on their own.
+    return [stem(t) for t in normalize_name(text).split() if len(t) > 1 and t not in STOPWORDS]
+
+def prompt_query(prompt: str) -> str:
+    """The prompt as a search query, without the ambiguous names it only uses as everyday words."""
+    return re.sub(r'[A-Za-z0-9]+', lambda w: "" if w.group() in AMBIGUOUS_NAMES else w.group(), prompt)
+
+
+class SwapiSearchIndex:
+    """
+    A lexical index over the cast categories of a SwapiStore. Each entity is a document made of
+    its names and aliases, the names of what it links to and a few descriptive attributes,
+    ranked against a query with BM25. Also finds the entities a text names outright.
+    """
+
+    def __init__(self, store: SwapiStore):
+        self.store = store
+        self.documents: dict[str, list[tuple[SwapiEntity, dict[str, int], int]]] = {}
+        self.postings: dict[str, dict[str, list[int]]] = {}
+        self.average_length: dict[str, float] = {}
+        self.prominence: dict[SwapiEntity, int] = {}
+        self.longest_name = 1
+        name_terms: dict[SwapiEntity, set[str]] = {}
+        for name_index in store.by_name.values():
+            for key, entity in name_index.items():
+                name_terms.setdefault(entity, set()).update(tokenize(key))
+                self.longest_name = max(self.longest_name, len(key.split()))
+        # Planets do not list the species native to them, only their residents.
+        natives: dict[SwapiEntity, list[str]] = {}
+        for species in store.entities("species"):
+            for homeworld in store.related(species).get("homeworld", []):
+                natives.setdefault(homeworld, []).append(species.name)
+        for category in CAST_CATEGORIES:
+            documents, postings = [], {}
+            for entity in store.entities(category):
+                if normalize_name(entity.name) in PLACEHOLDER_NAMES:
+                    continue
+                terms = dict.fromkeys(name_terms.get(entity, ()), NAME_WEIGHT)
+                related = store.related(entity)
+                words = [r.name for entities in related.values() for r in entities] + natives.get(entity, [])
+                words += [str(entity.attributes.get(field, "")) for field in DESCRIPTIVE_FIELDS.get(category, ())]
+                for term in tokenize(" ".join(words)):
+                    terms[term] = terms.get(term, 0) + 1
+                for term in terms:
+                    postings.setdefault(term, []).append(len(documents))
+                documents.append((entity, terms, sum(terms.values())))
+                self.prominence[entity] = len(related.get("films", ()))
+            self.documents[category] = documents
+            self.postings[category] = postings
+            self.average_length[category] = sum(length for _, _, length in documents) / max(1, len(documents))
+
+    def search(self, category: str, query: str, limit: int = 10, matches_only: bool = False) -> list[SwapiEntity]:
+        """
+        The `limit` entities that best match `query`. Ties, and entities no term matches (unless
+        `matches_only`), go by how many films they appear in.
+        """
+        documents = self.documents.get(category, [])
+        postings = self.postings.get(category, {})
+        scores = [0.0] * len(documents)
+        for term in set(tokenize(query)):
+            matches = postings.get(term, ())
+            if not matches:
+                continue
+            idf = math.log(1 + (len(documents) - len(matches) + 0.5) / (len(matches) + 0.5))
+            for i in matches:
+                _, terms, length = documents[i]
+                tf = terms[term]
+                scores[i] += idf * tf * (BM25_K1 + 1) / (tf + BM25_K1 * (1 - BM25_B + BM25_B * length / self.average_length[category]))
+        ranked = sorted(range(len(documents)), key=lambda i: (-scores[i], -self.prominence[documents[i][0]], i))
+        if matches_only:
+            ranked = [i for i in ranked if scores[i] > 0]
+        return [documents[i][0] for i in ranked[:limit]]
+
+    def mentions(self, text: str) -> dict[str, list[SwapiEntity]]:
+        """
+        The entities `text` names by name, title or alias, per category and in order of
+        appearance. At each word the longest matching name wins, so 'Naboo Royal Starship' is
+        the starship and not the planet.
+        """
+        words = list(re.finditer(r'[A-Za-z0-9]+', text))
+        keys = [w.group().lower() for w in words]
+        found: dict[str, dict[SwapiEntity, None]] = {}
+        i = 0
+        while i < len(keys):
+            for n in range(min(self.longest_name, len(keys) - i), 0, -1):
+                key = " ".join(keys[i:i + n])
+                if n == 1 and (key in PLACEHOLDER_NAMES or (key in AMBIGUOUS_NAMES and not words[i].group()[0].isupper())):
+                    continue
+                matches = [(category, index[key]) for category, index in self.store.by_name.items() if key in index]
+                if matches:
+                    for category, entity in matches:
+                        found.setdefault(category, {})[entity] = None
+                    i += n
+                    break
+            else:
+                i += 1
+        return {category: list(entities) for category, entities in found.items()}
+
+    def shortlist(self, prompt: str, mentioned: dict[str, list[SwapiEntity]], sizes: dict[str, int]) -> dict[str, list[str]]:
+        """Candidate names per category for the model to choose from: those named first, then the best matches."""
+        query = " ".join([prompt_query(prompt)] + [e.name for entities in mentioned.values() for e in entities])
+        candidates = {}
+        for category, size in sizes.items():
+            named = mentioned.get(category, [])
+            ranked = [e for e in self.search(category, query, size + len(named)) if e not in named]
+            candidates[category] = [e.name for e in named + ranked[:max(0, size - len(named))]]
+        return candidates
+
+    def named_cast(self, prompt: str, mentioned: dict[str, list[SwapiEntity]], sizes: dict[str, int]) -> dict[str, list[SwapiEntity]] | None:
+        """
+        The cast of a prompt that names its characters outright: the people it names, and the
+        planets and starships it names or, failing that, where those people come from and what
+        they fly, then what best matches the rest of the prompt. None when it names nobody, which
+        leaves the choice of characters to the model.
+        """
+        people = mentioned.get("people", [])[:sizes.get("people", 0)]
+        if not people:
+            return None
+        # The cast's own names are left out of the query: 'Darth' would find Darth Maul's planet.
+        cast_terms = {term for person in people for term in tokenize(person.name)}
+        query = " ".join(term for term in tokenize(prompt_query(prompt)) if term not in cast_terms)
+        cast = {"people": people}
+        for category, size in sizes.items():
+            if category == "people":
+                continue
+            picked = mentioned.get(category, [])
+            if not picked:
+                linked = [e for person in people for e in self.store.related(person).get(CAST_LINKS.get(category), [])
+                          if normalize_name(e.name) not in PLACEHOLDER_NAMES]
+                picked = list(dict.fromkeys(linked + self.search(category, query, size, matches_only=True)))
+            cast[category] = picked[:size] or self.search(category, query, 1)
+        return cast
+
+
+# --- Lazy Loading ---
+_index: SwapiSearchIndex = None
+_index_lock = threading.Lock()
+
+def get_search_index() -> SwapiSearchIndex:
+    """Returns the process-wide index over get_swapi_store(), building it on first use."""
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = SwapiSearchIndex(get_swapi_store())
+    return _index
@@ -0,0 +1,233 @@
+# app/swapi_store.py
+import json
+import os
+import pickle
+import re
+import threading
+
+SWAPI_URL_PREFIX = "https://swapi.dev/api/"
+SWAPI_DATA_DIR = "swapi_data"
+# Prebuilt store, rebuilt whenever the source JSON files change. It is written by this
+# process from local data only, so unpickling it is safe.
+SNAPSHOT_FILENAME = ".swapi_store.pickle"
+SNAPSHOT_VERSION = 1
+
+# Shorthand people commonly use in prompts, mapped to the canonical SWAPI name.
+ALIASES = {
+    "people": {
+        "vader": "Darth Vader",
+        "lord vader": "Darth Vader",
+        "ben kenobi": "Obi-Wan Kenobi",
+        "obi wan": "Obi-Wan Kenobi",
+        "kenobi": "Obi-Wan Kenobi",
+        "princess leia": "Leia Organa",
+        "artoo": "R2-D2",
+        "r2": "R2-D2",
+        "threepio": "C-3PO",
+        "3po": "C-3PO",
+        "chewie": "Chewbacca",
+        "palpatine": "Palpatine",
+        "the emperor": "Palpatine",
+        "emperor palpatine": "Palpatine",
+        "darth sidious": "Palpatine",
+        "maul": "Darth Maul",
+        "jabba": "Jabba Desilijic Tiure",
+        "jabba the hutt": "Jabba Desilijic Tiure",
+        "qui gon": "Qui-Gon Jinn",
+        "mace windu": "Mace Windu",
+        "dooku": "Dooku",
+        "count dooku": "Dooku",
+        "grievous": "Grievous",
+        "general grievous": "Grievous",
+    },
+    "starships": {
+        "falcon": "Millennium Falcon",
+        "the falcon": "Millennium Falcon",
+        "star destroyer": "Star Destroyer",
+        "death star": "Death Star",
+        "tie fighter": "TIE Advanced x1",
+    },
+    "planets": {
+        "cloud city": "Bespin",
+    },
+}
+
+def normalize_name(name: str) -> str:
+    """Lowercases a name and collapses punctuation and whitespace, so 'X-Wing' and 'x wing' match."""
+    return re.sub(r'[^a-z0-9]+', ' ', str(name).lower()).strip()
+
+def _name_keys(name: str) -> set[str]:
+    normalized = normalize_name(name)
+    return {normalized, normalized.replace(" ", "")} - {""}
+
+
+class SwapiEntity:
+    """
+    A single SWAPI record. Cross-references stay as URLs until resolved through the store:
+    a tuple of URLs for list fields such as 'films', a single URL for fields such as 'homeworld'.
+    """
+    __slots__ = ("category", "name", "url", "attributes", "links")
+
+    def __init__(self, category: str, record: dict):
+        self.category = category
+        self.name = record.get("name") or record.get("title")
+        self.url = record.get("url")
+        self.attributes = {}
+        self.links = {}
+        for key, value in record.items():
+            if key in ("url", "name", "title"):
+                continue
+            if isinstance(value, list):
+                self.links[key] = tuple(value)
+            elif isinstance(value, str) and value.startswith(SWAPI_URL_PREFIX):
+                self.links[key] = value
+            else:
+                self.attributes[key] = value
+
+    def __repr__(self) -> str:
+        return f"SwapiEntity({self.category!r}, {self.name!r})"
+
+
+class SwapiStore:
+    """
+    An in-memory index over the SWAPI dataset. Entities can be looked up by name, title,
+    alias or URL in constant time, and cross-references resolve directly to entities.
+    """
+
+    def __init__(self, data: dict[str, list[dict]]):
+        self.categories: dict[str, list[SwapiEntity]] = {}
+        self.by_url: dict[str, SwapiEntity] = {}
+        self.by_name: dict[str, dict[str, SwapiEntity]] = {}
+        for category, records in data.items():
+            entities = [SwapiEntity(category, record) for record in records]
+            self.categories[category] = entities
+            name_index = self.by_name.setdefault(category, {})
+            for entity in entities:
+                if entity.url:
+                    self.by_url[entity.url] = entity
+                for key in _name_keys(entity.name):
+                    name_index.setdefault(key, entity)
+        self._index_aliases()
+
+    def _index_aliases(self):
+        for category, aliases in ALIASES.items():
+            name_index = self.by_name.get(category, {})
+            for alias, canonical in aliases.items():
+                entity = name_index.get(normalize_name(canonical))
+                if entity is not None:
+                    for key in _name_keys(alias):
+                        name_index.setdefault(key, entity)
+        # A person's first name is an alias too, as long as nobody else shares it.
+        people_index = self.by_name.get("people", {})
+        first_names: dict[str, list[SwapiEntity]] = {}
+        for entity in self.categories.get("people", []):
+            parts = normalize_name(entity.name).split()
+            if len(parts) > 1:
+                first_names.setdefault(parts[0], []).append(entity)
+        for first_name, entities in first_names.items():
+            if len(entities) == 1:
+                people_index.setdefault(first_name, entities[0])
+
+    @classmethod
+    def from_directory(cls, data_dir: str) -> "SwapiStore":
+        if not os.path.exists(data_dir):
+            raise FileNotFoundError(f"The '{data_dir}' directory was not found. Please run the fetch_swapi_data.py script first.")
+        data = {}
+        for filename in os.listdir(data_dir):
+            if filename.endswith(".json"):
+                with open(os.path.join(data_dir, filename), "r", encoding='utf-8') as f:
+                    data[filename[:-len(".json")]] = json.load(f)
+        return cls(data)
+
+    def entities(self, category: str) -> list[SwapiEntity]:
+        return self.categories.get(category, [])
+
+    def names(self, category: str) -> list[str]:
+        return [entity.name for entity in self.entities(category)]
+
+    def find(self, category: str, name: str) -> SwapiEntity | None:
+        """Looks up an entity by name, title or alias, ignoring case and punctuation."""
+        index = self.by_name.get(category, {})
+        for key in _name_keys(name):
+            if key in index:
+                return index[key]
+        return None
+
+    def resolve(self, url: str) -> SwapiEntity | None:
+        return self.by_url.get(url)
+
+    def related(self, entity: SwapiEntity) -> dict[str, list[SwapiEntity]]:
+        """Resolves every cross-reference of `entity` (homeworld, films, starships, ...) to entities."""
+        related = {}
+        for field, urls in entity.links.items():
+            if isinstance(urls, str):
+                urls = (urls,)
+            related[field] = [self.by_url[url] for url in urls if url in self.by_url]
+        return related
+
+    def get_with_related(self, category: str, name: str) -> tuple[SwapiEntity, dict[str, list[SwapiEntity]]] | None:
+        entity = self.find(category, name)
+        if entity is None:
+            return None
+        return entity, self.related(entity)
+
+    def to_record(self, entity: SwapiEntity) -> dict:
+        """Returns the entity as a plain dict with cross-reference URLs replaced by names."""
+        record = {"name" if entity.category != "films" else "title": entity.name, **entity.attributes}
+        for field, related in self.related(entity).items():
+            names = [r.name for r in related]
+            if isinstance(entity.links[field], str):
+                record[field] = names[0] if names else None
+            else:
+                record[field] = names
+        record["url"] = entity.url
+        return record
+
+
+# --- Lazy Loading ---
+_store: SwapiStore = None
+_store_lock = threading.Lock()
+
+def _source_signature(data_dir: str) -> list[tuple[str, int, int]]:
+    signature = []
+    for filename in sorted(os.listdir(data_dir)):
+        if filename.endswith(".json"):
+            stat = os.stat(os.path.join(data_dir, filename))
+            signature.append((filename, stat.st_mtime_ns, stat.st_size))
+    return signature
+
+def load_store(data_dir: str = SWAPI_DATA_DIR) -> SwapiStore:
+    """
+    Loads the store from its prebuilt snapshot, or builds it from the JSON files and
+    refreshes the snapshot when they have changed since it was written.
+    """
+    if not os.path.exists(data_dir):
+        raise FileNotFoundError(f"The '{data_dir}' directory was not found. Please run the fetch_swapi_data.py script first.")
+    signature = _source_signature(data_dir)
+    snapshot_path = os.path.join(data_dir, SNAPSHOT_FILENAME)
+    try:
+        with open(snapshot_path, "rb") as f:
+            snapshot = pickle.load(f)
+        if snapshot.get("version") == SNAPSHOT_VERSION and snapshot.get("signature") == signature:
+            return snapshot["store"]
+    except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ImportError):
+        pass
+    store = SwapiStore.from_directory(data_dir)
+    try:
+        tmp_path = f"{snapshot_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            pickle.dump({"version": SNAPSHOT_VERSION, "signature": signature, "store": store}, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, snapshot_path)
+    except OSError as e:
+        print(f"Could not write the SWAPI snapshot, it will be rebuilt next time: {e}")
+    return store
+
+def get_swapi_store() -> SwapiStore:
+    """Returns the process-wide store, loading it on first use."""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = load_store()
+                print("SWAPI data loaded successfully.")
+    return _store
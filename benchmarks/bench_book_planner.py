@@ -0,0 +1,72 @@
+# benchmarks/bench_book_planner.py
+"""
+Shows how the book planner sizes sections when the model writes more or less than it is asked
+for, using MockAsyncOpenAI's `word_yield` (words written per word requested).
+
+For each yield, a whole book is generated offline and its section calls and chapter words are
+compared with the page goal. The previous fixed sizing (750-word sections, max_tokens=1200,
+no feedback) is computed for the same book for reference.
+
+    python -m benchmarks.bench_book_planner [--pages 100] [--yields 0.6 0.8 1.0 1.3]
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import os
+import shutil
+import sys
+import tempfile
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+PREVIOUS_SECTION_WORDS = 750
+PREVIOUS_MAX_TOKENS = 1200
+
+def previous_fixed_sizing(report: dict, word_yield: float) -> tuple[int, int]:
+    """Sections and words the fixed 750-word sizing would have produced for the same blocks."""
+    sections = words = 0
+    for block in report["blocks"]:
+        count = max(1, round(block["target_words"] / PREVIOUS_SECTION_WORDS))
+        sections += count
+        words += count * int(min(PREVIOUS_SECTION_WORDS * word_yield, PREVIOUS_MAX_TOKENS * 0.75))
+    return sections, words
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=100)
+    parser.add_argument("--yields", nargs="+", type=float, default=[0.6, 0.8, 1.0, 1.3])
+    parser.add_argument("--latency", type=float, default=0.0, help="Mock API latency per call, in seconds.")
+    args = parser.parse_args()
+
+    sys.path.insert(0, REPO_ROOT)
+    os.environ["LLM_CACHE_MODE"] = "off"
+    os.environ["LLM_BACKEND"] = "mock"
+    os.environ["BOOK_PLAN_LOG"] = ""
+    os.environ.setdefault("OPENAI_API_KEY", "unused")
+    os.chdir(REPO_ROOT)
+    from app import book_planner, book_writer
+    from app.mock_llm import MockAsyncOpenAI
+    book_writer.get_swapi_store()
+
+    workdir = tempfile.mkdtemp(prefix="bench_book_planner_")
+    os.chdir(workdir)  # Generated images go to a scratch directory instead of the repo.
+    try:
+        print(f"{'yield':>6}{'planned words':>15}{'actual':>9}{'off by':>8}{'sections':>10}"
+              f"{'   | previous:':<14}{'actual':>7}{'off by':>8}{'sections':>10}")
+        for word_yield in args.yields:
+            # Every book starts from the same prior, as in a freshly started server.
+            book_planner._observed_yield = book_planner.INITIAL_WORD_YIELD
+            book_writer.set_llm_client(MockAsyncOpenAI(latency=args.latency, word_yield=word_yield))
+            with contextlib.redirect_stdout(io.StringIO()):
+                book = asyncio.run(book_writer.generate_user_prompt_driven_book("A lost Jedi returns", args.pages, parallel_chapters=True))
+            report = book["plan_report"]
+            planned, actual = report["planned_words"], report["actual_words"]
+            old_sections, old_words = previous_fixed_sizing(report, word_yield)
+            print(f"{word_yield:>6.2f}{planned:>15}{actual:>9}{(actual - planned) / planned:>+8.0%}{report['actual_sections']:>10}"
+                  f"{'   |':<14}{old_words:>7}{(old_words - planned) / planned:>+8.0%}{old_sections:>10}")
+    finally:
+        os.chdir(REPO_ROOT)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
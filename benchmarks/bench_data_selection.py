@@ -0,0 +1,147 @@
+# benchmarks/bench_data_selection.py
+"""
+Measures the local pre-filter of the data-selection step (app.swapi_search) against a set of
+hand-labelled prompts: the characters, planets and starships a reader would expect in each
+story. Half the prompts name their characters, half only describe the story.
+
+Selection quality, from the index alone:
+  local      prompts whose cast is taken straight from the prompt (no LLM call), and the
+             precision / recall of those casts against the labels
+  shortlist  recall of the labelled entities among the candidates the model is offered
+             when it is still asked (every entity is offered in "full" mode, so 100% there)
+
+Cost, per DATA_SELECTION_MODE, of select_book_data_context() over every prompt against the
+offline MockAsyncOpenAI: LLM calls, prompt tokens and the latency of the step. The mock answers
+after `--latency` seconds whatever the prompt's size, so a real API saves more than shown.
+
+    python -m benchmarks.bench_data_selection [--latency 1.0]
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import os
+import sys
+import time
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+MODES = ("full", "shortlist", "local")
+
+# Prompt -> the entities a reader would expect, per category. Categories left out are not scored.
+LABELLED_PROMPTS = {
+    "Luke Skywalker and Han Solo escape Hoth in the Millennium Falcon": {
+        "people": ["Luke Skywalker", "Han Solo"], "planets": ["Hoth"], "starships": ["Millennium Falcon"]},
+    "Mace Windu confronts Count Dooku on Geonosis": {"people": ["Mace Windu", "Dooku"], "planets": ["Geonosis"]},
+    "Chewie and the Falcon outrun a Star Destroyer": {
+        "people": ["Chewbacca"], "starships": ["Millennium Falcon", "Star Destroyer"]},
+    "Boba Fett hunts a smuggler across the galaxy": {"people": ["Boba Fett"], "starships": ["Slave 1"]},
+    "Darth Vader hunts the last Jedi": {"people": ["Darth Vader"], "starships": ["TIE Advanced x1"]},
+    "Leia leads the rebel fleet from an X-wing": {"people": ["Leia Organa"], "starships": ["X-wing"]},
+    "Qui-Gon Jinn finds young Anakin Skywalker on Tatooine": {
+        "people": ["Qui-Gon Jinn", "Anakin Skywalker"], "planets": ["Tatooine"]},
+    "Padmé flees the blockade of Naboo": {"people": ["Padmé Amidala"], "planets": ["Naboo"]},
+    "Obi-Wan Kenobi investigates the clone army on Kamino": {"people": ["Obi-Wan Kenobi"], "planets": ["Kamino"]},
+    "Lando Calrissian betrays his friends at Cloud City": {"people": ["Lando Calrissian"], "planets": ["Bespin"]},
+    "Yoda trains Luke on Dagobah": {"people": ["Yoda", "Luke Skywalker"], "planets": ["Dagobah"]},
+    "General Grievous duels Obi-Wan on Utapau": {"people": ["Grievous", "Obi-Wan Kenobi"], "planets": ["Utapau"]},
+    "The Emperor inspects the Death Star above the forest moon of Endor": {
+        "people": ["Palpatine"], "planets": ["Endor"], "starships": ["Death Star"]},
+    "Wedge Antilles flies the trench run against the Death Star": {
+        "people": ["Wedge Antilles"], "starships": ["X-wing", "Death Star"]},
+    "An ice planet rebel base comes under Imperial attack": {
+        "people": ["Luke Skywalker", "Leia Organa", "Han Solo"], "planets": ["Hoth"], "starships": ["Star Destroyer"]},
+    "A bounty hunter tracks a smuggler to a desert world": {
+        "people": ["Boba Fett", "Greedo", "Han Solo"], "planets": ["Tatooine"]},
+    "The Wookiee homeworld is invaded by droid armies": {"people": ["Chewbacca", "Tarfful"], "planets": ["Kashyyyk"]},
+    "A young Jedi padawan trains at the temple on the city planet": {
+        "people": ["Yoda", "Obi-Wan Kenobi", "Mace Windu"], "planets": ["Coruscant"]},
+    "Gungans and droids clash in the swamps of a peaceful planet": {
+        "people": ["Jar Jar Binks", "Roos Tarpals"], "planets": ["Naboo"]},
+    "A slave boy wins a podrace through the dune sea": {
+        "people": ["Anakin Skywalker", "Sebulba", "Watto"], "planets": ["Tatooine"]},
+    "Clone troopers storm the sinkhole cities of a remote world": {"planets": ["Utapau"]},
+    "The Separatist leaders hide on a lava planet": {
+        "people": ["Wat Tambor", "Nute Gunray", "San Hill"], "planets": ["Mustafar"]},
+    "A Corellian freighter captain owes money to a Hutt crime lord": {
+        "people": ["Han Solo", "Jabba Desilijic Tiure"], "planets": ["Corellia", "Nal Hutta"], "starships": ["Millennium Falcon"]},
+    "A lone starfighter pilot defects from the Empire": {"starships": ["X-wing", "TIE Advanced x1"]},
+}
+
+def _setup():
+    sys.path.insert(0, REPO_ROOT)
+    os.environ["LLM_CACHE_MODE"] = "off"
+    os.environ["LLM_BACKEND"] = "mock"
+    os.environ.setdefault("OPENAI_API_KEY", "unused")
+    os.chdir(REPO_ROOT)
+
+def quality() -> dict:
+    from app import book_writer
+    from app.swapi_search import get_search_index
+    index = get_search_index()
+    hits = {"local": 0, "local_labelled": 0, "local_picked": 0, "shortlist": 0, "shortlist_labelled": 0}
+    local_prompts = 0
+    for prompt, labels in LABELLED_PROMPTS.items():
+        mentioned = index.mentions(prompt)
+        cast = index.named_cast(prompt, mentioned, book_writer.LOCAL_CAST_SIZES)
+        if cast is not None:
+            local_prompts += 1
+            for category, expected in labels.items():
+                picked = {e.name for e in cast.get(category, [])}
+                hits["local"] += len(picked & set(expected))
+                hits["local_labelled"] += len(expected)
+                hits["local_picked"] += len(picked)
+        else:
+            candidates = index.shortlist(prompt, mentioned, book_writer.DATA_SELECTION_SHORTLIST)
+            for category, expected in labels.items():
+                hits["shortlist"] += len(set(candidates.get(category, [])) & set(expected))
+                hits["shortlist_labelled"] += len(expected)
+    return {
+        "prompts": len(LABELLED_PROMPTS),
+        "local_prompts": local_prompts,
+        "local_precision": hits["local"] / max(1, hits["local_picked"]),
+        "local_recall": hits["local"] / max(1, hits["local_labelled"]),
+        "shortlist_recall": hits["shortlist"] / max(1, hits["shortlist_labelled"]),
+    }
+
+def cost(mode: str, latency: float) -> dict:
+    from app import book_writer
+    from app.mock_llm import MockAsyncOpenAI
+    book_writer.DATA_SELECTION_MODE = mode
+    client = MockAsyncOpenAI(latency=latency)
+    book_writer.set_llm_client(client)
+    latencies = []
+    with contextlib.redirect_stdout(io.StringIO()):
+        for prompt in LABELLED_PROMPTS:
+            start = time.perf_counter()
+            asyncio.run(book_writer.select_book_data_context(prompt))
+            latencies.append(time.perf_counter() - start)
+    return {"mode": mode, "llm_calls": client.stats["chat_calls"], "prompt_tokens": client.stats["prompt_bytes"] // 4,
+            "mean_s": sum(latencies) / len(latencies), "total_s": sum(latencies)}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--latency", type=float, default=1.0, help="Mock API latency per call, in seconds.")
+    args = parser.parse_args()
+    _setup()
+    from app import book_writer
+    with contextlib.redirect_stdout(io.StringIO()):
+        # Loading the store and building the index happen once per process; keep them out of the timings.
+        start = time.perf_counter()
+        from app.swapi_search import get_search_index
+        get_search_index()
+        index_s = time.perf_counter() - start
+        asyncio.run(book_writer.summarize_section("warm-up"))
+
+    q = quality()
+    print(f"Index built in {index_s * 1000:.1f} ms.")
+    print(f"Cast taken from the prompt for {q['local_prompts']} of {q['prompts']} prompts: "
+          f"precision {q['local_precision']:.0%}, recall {q['local_recall']:.0%}.")
+    print(f"Shortlist recall of the labelled entities, for the other prompts: {q['shortlist_recall']:.0%}.")
+    print()
+    print(f"{'mode':<11}{'LLM calls':>10}{'prompt tokens':>15}{'mean s':>9}{'total s':>9}")
+    for mode in MODES:
+        r = cost(mode, args.latency)
+        print(f"{r['mode']:<11}{r['llm_calls']:>10}{r['prompt_tokens']:>15}{r['mean_s']:>9.3f}{r['total_s']:>9.2f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+# benchmarks/bench_hedging.py
+"""
+Measures what hedged LLM calls do to tail latency, against the offline MockAsyncOpenAI with a
+heavy tail: a `--slow-rate` share of calls takes `--slow-factor` times the usual latency (which varies by
+20% from call to call).
+
+Summary calls (plain completions) and section calls (streamed, hedged on their first chunk)
+are made `--calls` times each, a few at a time, with hedging off and then on. Reported per
+stage: the p50 / p95 / p99 latency callers saw, the share of calls that were hedged, and the
+chat calls actually sent (the extra load the hedges cost).
+
+    python -m benchmarks.bench_hedging [--calls 1000] [--latency 0.05] [--slow-rate 0.02] [--slow-factor 20]
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import math
+import os
+import sys
+import time
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+def percentile(values: list[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, math.ceil(q / 100 * len(ordered)) - 1)]
+
+async def timed_calls(stage: str, calls: int, concurrency: int, offset: int) -> list[float]:
+    from app import book_writer
+    latencies = []
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(i: int):
+        async with semaphore:
+            start = time.perf_counter()
+            if stage == "summary":
+                await book_writer.summarize_section(f"Section {offset + i}: the droid chirps a warning.")
+            else:
+                await book_writer.generate_chapter_section("A lost Jedi returns", f"Chapter {offset + i}", "", {}, 300)
+            latencies.append(time.perf_counter() - start)
+
+    await asyncio.gather(*(one(i) for i in range(calls)))
+    return latencies
+
+def run(stage: str, hedging: bool, args) -> dict:
+    from app import book_writer
+    from app.hedging import hedge_policy
+    from app.mock_llm import MockAsyncOpenAI
+    client = MockAsyncOpenAI(latency=args.latency, latency_jitter=args.latency / 5, slow_call_rate=args.slow_rate,
+                             slow_call_factor=args.slow_factor, seed=1)
+    book_writer.set_llm_client(client)
+    hedge_policy.reset()
+    hedge_policy.enabled = hedging
+    with contextlib.redirect_stdout(io.StringIO()):
+        # Enough calls for the policy to learn the stage's latency; kept out of the figures.
+        asyncio.run(timed_calls(stage, args.warm_up, args.concurrency, 0))
+        client.reset_stats()
+        latencies = asyncio.run(timed_calls(stage, args.calls, args.concurrency, args.warm_up))
+    counts = hedge_policy.report()["stages"].get(stage, {})
+    return {"p50": percentile(latencies, 50), "p95": percentile(latencies, 95), "p99": percentile(latencies, 99),
+            "hedge_rate": counts.get("hedged", 0) / (args.warm_up + args.calls), "chat_calls": client.stats["chat_calls"]}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=1000, help="Timed calls per stage and mode.")
+    parser.add_argument("--warm-up", type=int, default=200, help="Untimed calls first, for the policy to learn the latencies.")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--latency", type=float, default=0.05, help="Usual mock API latency per call, in seconds.")
+    parser.add_argument("--slow-rate", type=float, default=0.02, help="Share of calls that are slow.")
+    parser.add_argument("--slow-factor", type=float, default=20.0, help="How many times slower a slow call is.")
+    args = parser.parse_args()
+
+    sys.path.insert(0, REPO_ROOT)
+    os.environ["LLM_CACHE_MODE"] = "off"
+    os.environ["LLM_BACKEND"] = "mock"
+    os.environ.setdefault("OPENAI_API_KEY", "unused")
+    # Far above what the benchmark sends, so the timings are the mock's and not the rate limiter's.
+    os.environ["OPENAI_CHAT_RPM"] = "1000000"
+    os.environ["OPENAI_CHAT_TPM"] = "1000000000"
+    from app import book_writer
+    with contextlib.redirect_stdout(io.StringIO()):
+        # The first call pays for importing the OpenAI SDK; keep it out of the timings.
+        asyncio.run(book_writer.summarize_section("warm-up"))
+
+    print(f"{'stage':<9}{'hedging':<9}{'p50 s':>8}{'p95 s':>8}{'p99 s':>8}{'hedged':>8}{'chat calls':>12}")
+    for stage in ("summary", "section"):
+        results = {hedging: run(stage, hedging, args) for hedging in (False, True)}
+        for hedging, r in results.items():
+            print(f"{stage:<9}{'on' if hedging else 'off':<9}{r['p50']:>8.3f}{r['p95']:>8.3f}{r['p99']:>8.3f}"
+                  f"{r['hedge_rate']:>8.1%}{r['chat_calls']:>12}")
+        off, on = results[False], results[True]
+        print(f"{'':<9}{'change':<9}" + "".join(f"{(on[q] - off[q]) / off[q]:>+8.0%}" for q in ("p50", "p95", "p99"))
+              + f"{'':>8}{(on['chat_calls'] - off['chat_calls']) / off['chat_calls']:>+12.1%}")
+
+if __name__ == "__main__":
+    main()
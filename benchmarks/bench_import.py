@@ -0,0 +1,61 @@
+# benchmarks/bench_import.py
+"""
+Cold-start benchmark for app.book_writer: how long a fresh process takes to import the module
+and to get the SWAPI store on first use, with and without a prebuilt snapshot. The previous
+behaviour (importing the OpenAI SDK and parsing every JSON file at import time) is measured
+for comparison.
+
+    python -m benchmarks.bench_import [--runs 7]
+"""
+import argparse
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+CASES = {
+    "import app.book_writer": "import app.book_writer",
+    "first store access (no snapshot)": (
+        "import os; from app import swapi_store; "
+        "os.path.exists(p := os.path.join('swapi_data', swapi_store.SNAPSHOT_FILENAME)) and os.remove(p); "
+        "START; swapi_store.get_swapi_store()"
+    ),
+    "first store access (snapshot)": "from app import swapi_store; START; swapi_store.get_swapi_store()",
+    "previous eager import": (
+        "import json, os; from openai import AsyncOpenAI; AsyncOpenAI(api_key='x'); "
+        "[json.load(open(os.path.join('swapi_data', f), encoding='utf-8')) for f in os.listdir('swapi_data') if f.endswith('.json')]"
+    ),
+}
+
+def time_case(code: str, workdir: str) -> float:
+    """Runs `code` in a fresh interpreter and returns the seconds elapsed after the START marker."""
+    if "START" in code:
+        code = code.replace("START", "import time; _t = time.perf_counter()")
+    else:
+        code = "import time; _t = time.perf_counter(); " + code
+    code += "; print(time.perf_counter() - _t)"
+    env = {**os.environ, "PYTHONPATH": REPO_ROOT, "PYTHONDONTWRITEBYTECODE": "1"}
+    output = subprocess.run([sys.executable, "-c", code], cwd=workdir, env=env, capture_output=True, text=True, check=True)
+    return float(output.stdout.strip().splitlines()[-1])
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=7)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bench_import_")
+    shutil.copytree(os.path.join(REPO_ROOT, "swapi_data"), os.path.join(workdir, "swapi_data"))
+    try:
+        print(f"{'case':<36}{'median ms':>12}{'min ms':>10}")
+        for name, code in CASES.items():
+            timings = [time_case(code, workdir) * 1000 for _ in range(args.runs)]
+            print(f"{name:<36}{statistics.median(timings):>12.1f}{min(timings):>10.1f}")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
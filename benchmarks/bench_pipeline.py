@@ -0,0 +1,154 @@
+# benchmarks/bench_pipeline.py
+"""
+Per-stage benchmarks for the book pipeline, run entirely against the offline MockAsyncOpenAI.
+
+Each (stage, page count) case runs in a fresh process so that peak RSS is attributable to it.
+
+    python -m benchmarks.bench_pipeline                       # run and print a report
+    python -m benchmarks.bench_pipeline --save-baseline       # store results in benchmarks/baseline.json
+    python -m benchmarks.bench_pipeline --compare             # flag regressions against the baseline
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import multiprocessing
+import os
+import resource
+import sys
+import tempfile
+import time
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+DEFAULT_BASELINE = os.path.join(os.path.dirname(__file__), "baseline.json")
+PAGE_COUNTS = (20, 50, 100)
+STAGES = ("parameters", "prompts", "generation", "editions", "pdf")
+# Relative slowdown (or growth in calls / bytes / memory) tolerated before --compare reports a regression.
+REGRESSION_THRESHOLD = 0.10
+PROMPT_ITERATIONS = 200
+
+def _peak_rss_mb() -> float:
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS.
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+def _run_case(stage: str, num_pages: int, latency: float, result_queue):
+    os.chdir(REPO_ROOT)
+    sys.path.insert(0, REPO_ROOT)
+    os.environ["LLM_CACHE_MODE"] = "off"
+    os.environ["LLM_BACKEND"] = "mock"
+    with contextlib.redirect_stdout(io.StringIO()):
+        from app import book_planner, book_writer, prompt_builder
+        from app.mock_llm import MockAsyncOpenAI
+        client = MockAsyncOpenAI(latency=latency)
+        book_writer.set_llm_client(client)
+        book_writer.get_swapi_store()
+        # Generated images and books go to a scratch directory instead of the repo.
+        os.chdir(tempfile.mkdtemp(prefix="bench_"))
+        result = {"stage": stage, "pages": num_pages}
+        start = time.perf_counter()
+        if stage == "parameters":
+            for _ in range(PROMPT_ITERATIONS):
+                book_writer.calculate_book_parameters(num_pages)
+        elif stage == "prompts":
+            chapters, words = book_writer.calculate_book_parameters(num_pages)
+            store = book_writer.get_swapi_store()
+            context = {k: [store.to_record(store.find(k, name)) for name in v] for k, v in
+                       {"people": ["Luke Skywalker", "Darth Vader"], "planets": ["Tatooine"], "starships": ["X-wing"]}.items()}
+            prompt_bytes = 0
+            for _ in range(PROMPT_ITERATIONS):
+                prompts = [
+                    prompt_builder.build_data_selection_prompt("A lost Jedi returns", store),
+                    prompt_builder.build_title_generation_prompt("A lost Jedi returns", "chapter_list", chapters, context),
+                    prompt_builder.build_book_outline_prompt("A lost Jedi returns", chapters, context),
+                    prompt_builder.build_chapter_section_prompt("A lost Jedi returns", "Chapter - 1: Mock", "Summary.", context, words),
+                    prompt_builder.build_summarization_prompt("word " * book_planner.MAX_SECTION_WORDS),
+                    prompt_builder.build_image_generation_prompt("A lost Jedi returns", context),
+                ]
+                prompt_bytes += sum(len(p.encode("utf-8")) for p in prompts)
+            result["prompt_bytes"] = prompt_bytes // PROMPT_ITERATIONS
+        elif stage in ("generation", "editions", "pdf"):
+            book_data = asyncio.run(book_writer.generate_user_prompt_driven_book("A lost Jedi returns", num_pages, parallel_chapters=True))
+            result["api_calls"] = client.stats["chat_calls"] + client.stats["image_calls"]
+            result["prompt_bytes"] = client.stats["prompt_bytes"]
+            if stage == "editions":
+                from app.book_ebook_exporter import save_book_editions
+                start = time.perf_counter()
+                save_book_editions("Echoes of the Mock Republic", book_data, "bench")
+            if stage == "pdf":
+                try:
+                    from app.book_pdf_exporter import save_book_as_pdf
+                except (ImportError, OSError) as e:
+                    result_queue.put({**result, "skipped": f"WeasyPrint unavailable ({type(e).__name__})"})
+                    return
+                start = time.perf_counter()
+                save_book_as_pdf(title="Echoes of the Mock Republic", book_data=book_data, filename="bench.pdf")
+        result["wall_time_s"] = round(time.perf_counter() - start, 4)
+        result["peak_rss_mb"] = round(_peak_rss_mb(), 1)
+    result_queue.put(result)
+
+def run_benchmarks(stages=STAGES, page_counts=PAGE_COUNTS, latency: float = 0.05) -> list[dict]:
+    ctx = multiprocessing.get_context("spawn")
+    results = []
+    for stage in stages:
+        for num_pages in page_counts:
+            result_queue = ctx.Queue()
+            process = ctx.Process(target=_run_case, args=(stage, num_pages, latency, result_queue))
+            process.start()
+            process.join()
+            if process.exitcode != 0:
+                results.append({"stage": stage, "pages": num_pages, "skipped": f"exit code {process.exitcode}"})
+                continue
+            results.append(result_queue.get())
+    return results
+
+def compare_to_baseline(results: list[dict], baseline: list[dict], threshold: float = REGRESSION_THRESHOLD) -> list[str]:
+    """Returns a description of every metric that grew by more than `threshold` relative to the baseline."""
+    previous = {(r["stage"], r["pages"]): r for r in baseline}
+    regressions = []
+    for result in results:
+        old = previous.get((result["stage"], result["pages"]))
+        if not old:
+            continue
+        for metric in ("wall_time_s", "api_calls", "prompt_bytes", "peak_rss_mb"):
+            if metric in result and old.get(metric):
+                change = (result[metric] - old[metric]) / old[metric]
+                if change > threshold:
+                    regressions.append(f"{result['stage']} @ {result['pages']} pages: {metric} {old[metric]} -> {result[metric]} (+{change:.0%})")
+    return regressions
+
+def print_report(results: list[dict]):
+    print(f"{'stage':<12}{'pages':>6}{'wall s':>10}{'calls':>8}{'prompt KB':>11}{'peak MB':>9}")
+    for r in results:
+        if "skipped" in r:
+            print(f"{r['stage']:<12}{r['pages']:>6}  skipped: {r['skipped']}")
+            continue
+        prompt_kb = f"{r['prompt_bytes'] / 1024:.1f}" if "prompt_bytes" in r else "-"
+        print(f"{r['stage']:<12}{r['pages']:>6}{r['wall_time_s']:>10.3f}{r.get('api_calls', '-'):>8}{prompt_kb:>11}{r['peak_rss_mb']:>9.1f}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--stages", nargs="+", choices=STAGES, default=list(STAGES))
+    parser.add_argument("--pages", nargs="+", type=int, default=list(PAGE_COUNTS))
+    parser.add_argument("--latency", type=float, default=0.05, help="Mock API latency per call, in seconds.")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--compare", action="store_true")
+    args = parser.parse_args()
+
+    results = run_benchmarks(args.stages, args.pages, args.latency)
+    print_report(results)
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"Baseline saved to {args.baseline}")
+    if args.compare:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            regressions = compare_to_baseline(results, json.load(f))
+        for line in regressions:
+            print(f"REGRESSION: {line}")
+        sys.exit(1 if regressions else 0)
+
+if __name__ == "__main__":
+    main()
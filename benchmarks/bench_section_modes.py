@@ -0,0 +1,85 @@
+# benchmarks/bench_section_modes.py
+"""
+Compares the two ways of keeping sections continuous, against the offline MockAsyncOpenAI:
+"separate" writes each section and then summarizes it in a second call before the next section
+can start; "combined" gets the section and its summary from one JSON response.
+
+Cases: a single chapter (every call is on the critical path) and whole books, where chapters
+are written concurrently. Calls on the critical path of a chapter are counted per chapter.
+
+    python -m benchmarks.bench_section_modes [--latency 0.2] [--chapter-words 10000] [--pages 50 100]
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+MODES = ("separate", "combined")
+
+def _setup():
+    sys.path.insert(0, REPO_ROOT)
+    os.environ["LLM_CACHE_MODE"] = "off"
+    os.environ["LLM_BACKEND"] = "mock"
+    os.environ.setdefault("OPENAI_API_KEY", "unused")
+
+def run_case(mode: str, case: str, size: int, latency: float) -> dict:
+    from app import book_writer
+    from app.book_planner import BookPlan
+    from app.mock_llm import MockAsyncOpenAI
+    book_writer.SECTION_SUMMARY_MODE = mode
+    client = MockAsyncOpenAI(latency=latency)
+    book_writer.set_llm_client(client)
+    with contextlib.redirect_stdout(io.StringIO()):
+        # The first call pays for importing the OpenAI SDK; keep it out of the timings.
+        asyncio.run(book_writer.summarize_section("warm-up"))
+        client.reset_stats()
+        start = time.perf_counter()
+        if case == "chapter":
+            plan = BookPlan()
+            text = asyncio.run(book_writer.generate_content_block("A lost Jedi returns", "Chapter - 1: Mock", {}, size, plan=plan))
+            words, report = len(text.split()), plan.report()
+        else:
+            book = asyncio.run(book_writer.generate_user_prompt_driven_book("A lost Jedi returns", size, parallel_chapters=True))
+            words, report = sum(len(ch["content"].split()) for ch in book["chapters"]), book["plan_report"]
+        elapsed = time.perf_counter() - start
+    sections = max(len(b["sections"]) for b in report["blocks"] if b["name"].startswith("Chapter"))
+    critical_path = sections if mode == "combined" else 2 * sections - 1
+    return {"mode": mode, "case": f"{case} {size}", "wall_time_s": elapsed, "chat_calls": client.stats["chat_calls"],
+            "sequential_calls_per_chapter": critical_path, "words": words}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--latency", type=float, default=0.2, help="Mock API latency per call, in seconds.")
+    parser.add_argument("--chapter-words", type=int, default=10000, help="Word target of the single-chapter case.")
+    parser.add_argument("--pages", nargs="+", type=int, default=[50, 100], help="Page counts of the whole-book cases.")
+    args = parser.parse_args()
+    _setup()
+    os.chdir(REPO_ROOT)
+    from app.swapi_store import get_swapi_store
+    get_swapi_store()  # Loaded from the repo's swapi_data before moving to the scratch directory.
+
+    workdir = tempfile.mkdtemp(prefix="bench_section_modes_")
+    os.chdir(workdir)  # Generated images go to a scratch directory instead of the repo.
+    try:
+        cases = [("chapter", args.chapter_words)] + [("book", pages) for pages in args.pages]
+        print(f"{'case':<16}{'mode':<10}{'wall s':>9}{'chat calls':>12}{'seq/chapter':>13}{'words':>8}")
+        for case, size in cases:
+            results = [run_case(mode, case, size, args.latency) for mode in MODES]
+            for r in results:
+                print(f"{r['case']:<16}{r['mode']:<10}{r['wall_time_s']:>9.2f}{r['chat_calls']:>12}"
+                      f"{r['sequential_calls_per_chapter']:>13}{r['words']:>8}")
+            separate, combined = results
+            print(f"{'':<16}{'speed-up':<10}{separate['wall_time_s'] / combined['wall_time_s']:>8.2f}x"
+                  f"{combined['chat_calls'] - separate['chat_calls']:>+12}")
+    finally:
+        os.chdir(REPO_ROOT)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+# benchmarks/bench_swapi_sync.py
+"""
+Benchmarks the SWAPI sync against a local stand-in server that serves the repo's swapi_data
+with SWAPI's pagination (10 items per page), ETags and a configurable per-request latency.
+
+Cases: the previous sequential fetch (one page at a time, 0.1s pause between pages), a cold
+concurrent sync into an empty directory, and a warm re-sync where every page is unchanged.
+
+    python -m benchmarks.bench_swapi_sync [--latency 0.05] [--concurrency 6]
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import httpx
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, os.path.join(REPO_ROOT, "app"))
+import fetch_swapi_data  # noqa: E402
+
+PAGE_SIZE = 10
+
+class StandInSwapi:
+    """A threaded HTTP server answering /api/<category>/?page=N from local JSON files."""
+
+    def __init__(self, data_dir: str, latency: float = 0.05):
+        self.latency = latency
+        self.requests = 0
+        self.data = {}
+        for filename in os.listdir(data_dir):
+            if filename.endswith(".json"):
+                with open(os.path.join(data_dir, filename), "r", encoding="utf-8") as f:
+                    self.data[filename[:-len(".json")]] = json.load(f)
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self.base_url = f"http://127.0.0.1:{self.server.server_address[1]}/api"
+
+    def _handler(self):
+        standin = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                standin.requests += 1
+                time.sleep(standin.latency)
+                url = urlparse(self.path)
+                category = url.path.strip("/").split("/")[-1]
+                page = int(parse_qs(url.query).get("page", ["1"])[0])
+                records = standin.data.get(category)
+                if records is None:
+                    self.send_error(404)
+                    return
+                results = records[(page - 1) * PAGE_SIZE:page * PAGE_SIZE]
+                has_next = page * PAGE_SIZE < len(records)
+                body = json.dumps({
+                    "count": len(records),
+                    "next": f"{standin.base_url}/{category}/?page={page + 1}" if has_next else None,
+                    "previous": f"{standin.base_url}/{category}/?page={page - 1}" if page > 1 else None,
+                    "results": results,
+                }).encode("utf-8")
+                etag = f'"{hashlib.sha256(body).hexdigest()[:16]}"'
+                if self.headers.get("If-None-Match") == etag:
+                    self.send_response(304)
+                    self.send_header("ETag", etag)
+                    self.end_headers()
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.send_header("ETag", etag)
+                self.end_headers()
+                self.wfile.write(body)
+
+        return Handler
+
+    def __enter__(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+async def previous_sequential_fetch(base_url: str, output_dir: str):
+    """The fetch loop this sync replaced: categories and pages strictly one after another."""
+    async with httpx.AsyncClient(timeout=20.0) as client:
+        for category in fetch_swapi_data.CATEGORIES:
+            results, next_url = [], f"{base_url}/{category}/"
+            while next_url:
+                data = (await client.get(next_url)).json()
+                results.extend(data.get("results", []))
+                next_url = data.get("next")
+                await asyncio.sleep(0.1)
+            with open(os.path.join(output_dir, f"{category}.json"), "w", encoding="utf-8") as f:
+                json.dump(results, f, ensure_ascii=False, indent=4)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--latency", type=float, default=0.05, help="Stand-in server latency per request, in seconds.")
+    parser.add_argument("--concurrency", type=int, default=fetch_swapi_data.MAX_CONCURRENT_REQUESTS)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bench_swapi_sync_")
+    try:
+        with StandInSwapi(os.path.join(REPO_ROOT, "swapi_data"), args.latency) as standin:
+            cases = [
+                ("previous sequential fetch", lambda d: previous_sequential_fetch(standin.base_url, d), "sequential"),
+                ("concurrent sync (cold)", lambda d: fetch_swapi_data.sync(standin.base_url, d, max_concurrent_requests=args.concurrency), "sync"),
+                ("concurrent sync (unchanged)", lambda d: fetch_swapi_data.sync(standin.base_url, d, max_concurrent_requests=args.concurrency), "sync"),
+            ]
+            print(f"{'case':<30}{'wall s':>9}{'requests':>10}{'files written':>15}")
+            for name, run, output in cases:
+                output_dir = os.path.join(workdir, output)
+                os.makedirs(output_dir, exist_ok=True)
+                mtimes = {f: os.stat(os.path.join(output_dir, f)).st_mtime_ns for f in os.listdir(output_dir)}
+                standin.requests = 0
+                start = time.perf_counter()
+                with open(os.devnull, "w") as devnull:
+                    stdout, sys.stdout = sys.stdout, devnull
+                    try:
+                        asyncio.run(run(output_dir))
+                    finally:
+                        sys.stdout = stdout
+                elapsed = time.perf_counter() - start
+                written = sum(1 for f in os.listdir(output_dir) if f.endswith(".json")
+                              and os.stat(os.path.join(output_dir, f)).st_mtime_ns != mtimes.get(f))
+                print(f"{name:<30}{elapsed:>9.2f}{standin.requests:>10}{written:>15}")
+            for category, records in standin.data.items():
+                with open(os.path.join(workdir, "sync", f"{category}.json"), "r", encoding="utf-8") as f:
+                    assert json.load(f) == records, f"{category} differs from the source data"
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
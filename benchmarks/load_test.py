@@ -0,0 +1,298 @@
+# benchmarks/load_test.py
+"""
+End-to-end load test of one uvicorn process running the app, entirely offline: the app talks
+to benchmarks.openai_standin (a local imitation of the OpenAI chat and image endpoints, with
+realistic latencies, 429s and image URLs) instead of the real API.
+
+For each concurrency level a fresh app process is started, and that many clients keep
+requesting books from it until `--books` books (default: twice the concurrency) are done.
+Each client picks its next request from the mix:
+
+  book    POST /generate-book/, poll /jobs/{id} until it is done, download the HTML edition
+  stream  POST /generate-book/stream and read the events to the end
+  pdf     like book, but download the PDF (rendered on demand; needs WeasyPrint)
+
+A probe meanwhile times GET /books/stats, a request that does no work, to show how responsive
+the server stays. Reported per level: books per minute, book latency percentiles, probe
+latency, the event loop lag and peak RSS of the app process (from its /metrics), and failures.
+
+    python -m benchmarks.load_test [--concurrency 1 4 16] [--mix book=3 stream=1] [--pages 20] [--latency 1.0]
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import re
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from benchmarks.openai_standin import add_arguments
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+POLL_INTERVAL = 0.5
+PROBE_INTERVAL = 0.2
+STARTUP_TIMEOUT = 60
+# The app's own client-side limits are lifted by default, so the test finds the server's limits
+# rather than the account's. Override them (or any other setting) with --app-env.
+APP_ENV = {
+    "OPENAI_API_KEY": "load-test",
+    "LLM_CACHE_MODE": "off",
+    "BOOK_PLAN_LOG": "",
+    "OPENAI_CHAT_RPM": "100000",
+    "OPENAI_CHAT_TPM": "100000000",
+    "OPENAI_IMAGE_RPM": "10000",
+}
+
+def percentile(values: list[float], q: float) -> float | None:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, math.ceil(q / 100 * len(ordered)) - 1)]
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def parse_metrics(text: str) -> dict[str, float]:
+    """Samples of the Prometheus text format, by name and labels as written."""
+    samples = {}
+    for line in text.splitlines():
+        if line and not line.startswith("#"):
+            name, value = line.rsplit(" ", 1)
+            samples[name] = float(value)
+    return samples
+
+def histogram_buckets(samples: dict[str, float], name: str) -> list[tuple[float, float]]:
+    """(upper bound, cumulative count) of each bucket of a histogram without labels."""
+    return sorted(
+        (float(match.group(1)) if match.group(1) != "+Inf" else math.inf, count)
+        for key, count in samples.items()
+        if (match := re.fullmatch(rf'{name}_bucket\{{le="([^"]+)"\}}', key))
+    )
+
+def bucket_percentile(before: list, after: list, q: float) -> float | None:
+    """The upper bound of the bucket holding the q-th percentile of what was observed between two scrapes."""
+    counts = [(bound, count - previous) for (bound, count), (_, previous) in zip(after, before or [(0, 0)] * len(after))]
+    total = counts[-1][1] if counts else 0
+    if not total:
+        return None
+    return next(bound for bound, count in counts if count >= q / 100 * total)
+
+async def wait_until_up(client, url: str, process: subprocess.Popen):
+    deadline = time.monotonic() + STARTUP_TIMEOUT
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"{url} exited with code {process.returncode} while starting.")
+        try:
+            await client.get(url)
+            return
+        except Exception:
+            await asyncio.sleep(0.2)
+    raise RuntimeError(f"{url} did not start within {STARTUP_TIMEOUT}s.")
+
+
+class LoadRun:
+    """Drives one app process at one concurrency level and collects what the clients saw."""
+
+    def __init__(self, client, base_url: str, args, concurrency: int):
+        self.client = client
+        self.base_url = base_url
+        self.args = args
+        self.concurrency = concurrency
+        self.kinds, self.weights = zip(*args.mix.items())
+        self.random = random.Random(args.seed)
+        self.books_left = args.books or 2 * concurrency
+        self.latencies: list[float] = []
+        self.probe_latencies: list[float] = []
+        self.failures: dict[str, int] = {}
+
+    def _prompt(self) -> str:
+        # Distinct prompts, so that no request is deduplicated into another.
+        return f"Load test book {uuid.uuid4().hex[:12]}: a smuggler's last run through the Kessel sector"
+
+    def _fail(self, reason: str):
+        self.failures[reason] = self.failures.get(reason, 0) + 1
+
+    async def _await_job(self, job_id: str) -> dict:
+        while True:
+            await asyncio.sleep(POLL_INTERVAL)
+            job = (await self.client.get(f"{self.base_url}/jobs/{job_id}")).json()
+            if job["status"] in ("completed", "failed", "cancelled"):
+                return job
+
+    async def _download(self, url: str) -> bool:
+        async with self.client.stream("GET", f"{self.base_url}{url}") as response:
+            async for _ in response.aiter_bytes():
+                pass
+            return response.status_code == 200
+
+    async def _book(self, kind: str, body: dict) -> bool:
+        response = await self.client.post(f"{self.base_url}/generate-book/", json=body)
+        if response.status_code != 202:
+            self._fail(f"submit {response.status_code}")
+            return False
+        job = await self._await_job(response.json()["job_id"])
+        if job["status"] != "completed":
+            self._fail(job["status"])
+            return False
+        if not await self._download(job["result"]["downloads"]["pdf" if kind == "pdf" else "html"]):
+            self._fail(f"{kind} download")
+            return False
+        return True
+
+    async def _stream(self, body: dict) -> bool:
+        last_event = None
+        async with self.client.stream("POST", f"{self.base_url}/generate-book/stream", json=body) as response:
+            if response.status_code != 200:
+                self._fail(f"stream {response.status_code}")
+                return False
+            async for line in response.aiter_lines():
+                if line.startswith("event:"):
+                    last_event = line[len("event:"):].strip()
+        if last_event != "completed":
+            self._fail(f"stream ended with {last_event}")
+            return False
+        return True
+
+    async def _client(self):
+        while self.books_left > 0:
+            self.books_left -= 1
+            kind = self.random.choices(self.kinds, self.weights)[0]
+            body = {"user_input": self._prompt(), "num_pages": self.args.pages, "parallel_chapters": True}
+            start = time.perf_counter()
+            try:
+                ok = await (self._stream(body) if kind == "stream" else self._book(kind, body))
+            except Exception as e:
+                self._fail(type(e).__name__)
+                ok = False
+            if ok:
+                self.latencies.append(time.perf_counter() - start)
+
+    async def _probe(self):
+        while True:
+            start = time.perf_counter()
+            try:
+                await self.client.get(f"{self.base_url}/books/stats")
+                self.probe_latencies.append(time.perf_counter() - start)
+            except Exception:
+                self._fail("probe")
+            await asyncio.sleep(PROBE_INTERVAL)
+
+    async def run(self) -> dict:
+        lag_metric = "book_event_loop_lag_seconds"
+        lag_before = histogram_buckets(parse_metrics((await self.client.get(f"{self.base_url}/metrics")).text), lag_metric)
+        probe = asyncio.create_task(self._probe())
+        start = time.perf_counter()
+        await asyncio.gather(*(self._client() for _ in range(self.concurrency)))
+        elapsed = time.perf_counter() - start
+        probe.cancel()
+        samples = parse_metrics((await self.client.get(f"{self.base_url}/metrics")).text)
+        lag_after = histogram_buckets(samples, lag_metric)
+        return {
+            "concurrency": self.concurrency,
+            "books": len(self.latencies),
+            "failures": self.failures,
+            "wall_s": round(elapsed, 2),
+            "books_per_min": round(len(self.latencies) * 60 / elapsed, 2),
+            **{f"latency_p{q}_s": percentile(self.latencies, q) for q in (50, 95, 99)},
+            **{f"probe_p{q}_s": percentile(self.probe_latencies, q) for q in (50, 99)},
+            # Bucket upper bounds, over this run only.
+            "loop_lag_p99_s": bucket_percentile(lag_before, lag_after, 99),
+            "loop_lag_max_s": bucket_percentile(lag_before, lag_after, 100),
+            "peak_rss_mb": samples.get('process_resident_memory_bytes{figure="peak"}', 0) / 2 ** 20,
+        }
+
+
+async def run_level(args, concurrency: int, standin_url: str, workdir: str) -> dict:
+    import httpx
+    port = free_port()
+    env = {**os.environ, **APP_ENV, "OPENAI_BASE_URL": f"{standin_url}/v1", **args.app_env}
+    log = open(os.path.join(workdir, f"app_{concurrency}.log"), "w")
+    app = subprocess.Popen([sys.executable, "-m", "uvicorn", "app.main:app", "--app-dir", REPO_ROOT, "--port", str(port),
+                            "--log-level", "warning"], cwd=workdir, env=env, stdout=log, stderr=subprocess.STDOUT)
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        async with httpx.AsyncClient(timeout=httpx.Timeout(args.timeout), limits=httpx.Limits(max_connections=None)) as client:
+            await wait_until_up(client, f"{base_url}/metrics", app)
+            # One book first, so the imports and warm-up of a fresh process are not counted.
+            await LoadRun(client, base_url, argparse.Namespace(**{**vars(args), "books": 1}), 1).run()
+            return await LoadRun(client, base_url, args, concurrency).run()
+    finally:
+        app.terminate()
+        app.wait()
+        log.close()
+
+def print_report(results: list[dict]):
+    def seconds(value):
+        return f"{value:.3f}" if value is not None and value != math.inf else "-"
+
+    print(f"{'conc':>5}{'books':>7}{'books/min':>11}{'p50 s':>9}{'p95 s':>9}{'p99 s':>9}"
+          f"{'probe p99':>11}{'lag p99':>9}{'lag max':>9}{'peak MB':>9}  failures")
+    for r in results:
+        print(f"{r['concurrency']:>5}{r['books']:>7}{r['books_per_min']:>11.2f}{seconds(r['latency_p50_s']):>9}"
+              f"{seconds(r['latency_p95_s']):>9}{seconds(r['latency_p99_s']):>9}{seconds(r['probe_p99_s']):>11}"
+              f"{seconds(r['loop_lag_p99_s']):>9}{seconds(r['loop_lag_max_s']):>9}{r['peak_rss_mb']:>9.1f}  {r['failures'] or '-'}")
+
+def parse_pairs(pairs: list[str], convert) -> dict:
+    result = {}
+    for pair in pairs:
+        key, _, value = pair.partition("=")
+        result[key] = convert(value)
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", nargs="+", type=int, default=[1, 4, 16])
+    parser.add_argument("--books", type=int, default=None, help="Books per level (default: twice the concurrency).")
+    parser.add_argument("--mix", nargs="+", default=["book=3", "stream=1"], help="Request kinds and their weights.")
+    parser.add_argument("--pages", type=int, default=20)
+    parser.add_argument("--timeout", type=float, default=600, help="Client timeout per HTTP request, in seconds.")
+    parser.add_argument("--app-env", nargs="*", default=[], help="Extra KEY=VALUE settings for the app process.")
+    parser.add_argument("--json", help="Also write the results to this file.")
+    add_arguments(parser)
+    args = parser.parse_args()
+    args.mix = parse_pairs(args.mix, float)
+    args.app_env = parse_pairs(args.app_env, str)
+    if set(args.mix) - {"book", "stream", "pdf"}:
+        parser.error("--mix kinds are book, stream and pdf.")
+
+    sys.path.insert(0, REPO_ROOT)
+    workdir = tempfile.mkdtemp(prefix="load_test_")
+    # The app reads the SWAPI data from its working directory and writes books next to it.
+    os.symlink(os.path.join(REPO_ROOT, "swapi_data"), os.path.join(workdir, "swapi_data"))
+    standin_port = free_port()
+    standin_args = [f"--{name.replace('_', '-')}={getattr(args, name)}" for name in
+                    ("latency", "image_latency", "jitter", "slow_rate", "error_rate", "rate_limit_share", "chunk_delay", "seed")]
+    standin = subprocess.Popen([sys.executable, "-m", "benchmarks.openai_standin", "--port", str(standin_port), *standin_args],
+                               cwd=REPO_ROOT)
+    standin_url = f"http://127.0.0.1:{standin_port}"
+    results = []
+    try:
+        async def run_all():
+            import httpx
+            async with httpx.AsyncClient() as client:
+                await wait_until_up(client, f"{standin_url}/stats", standin)
+            for concurrency in args.concurrency:
+                results.append(await run_level(args, concurrency, standin_url, workdir))
+                print(f"Concurrency {concurrency}: {results[-1]['books']} books in {results[-1]['wall_s']}s.", flush=True)
+
+        asyncio.run(run_all())
+    finally:
+        standin.terminate()
+        standin.wait()
+        shutil.rmtree(workdir, ignore_errors=True)
+    print()
+    print_report(results)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == "__main__":
+    main()
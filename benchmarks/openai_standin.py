@@ -0,0 +1,126 @@
+# benchmarks/openai_standin.py
+"""
+A local HTTP server imitating the OpenAI endpoints the app calls, for load tests that must
+run offline. Point the app at it with OPENAI_BASE_URL=http://127.0.0.1:<port>/v1.
+
+  POST /v1/chat/completions    JSON and streamed (SSE) completions with usage, written by
+                               app.mock_llm; a share of calls fails with 429 (with
+                               retry-after-ms) or 500, and a share is much slower than usual
+  POST /v1/images/generations  returns the URL of a 1024x1024 PNG served by this server
+  GET  /images/{name}          the PNG (about 3 MB, like a DALL-E image)
+
+    python -m benchmarks.openai_standin [--port 8765] [--latency 1.0] [--error-rate 0.02]
+"""
+import argparse
+import asyncio
+import io
+import json
+import os
+import sys
+import time
+import uuid
+from types import SimpleNamespace
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+IMAGE_SIZE = 1024
+
+def to_dict(value):
+    """The JSON form of the SimpleNamespace responses MockAsyncOpenAI builds."""
+    if isinstance(value, SimpleNamespace):
+        return {key: to_dict(item) for key, item in vars(value).items()}
+    if isinstance(value, list):
+        return [to_dict(item) for item in value]
+    return value
+
+def make_image() -> bytes:
+    """Random pixels, so the PNG is as large as a real generated picture and does not compress away."""
+    from PIL import Image
+    image = Image.frombytes("RGB", (IMAGE_SIZE, IMAGE_SIZE), os.urandom(IMAGE_SIZE * IMAGE_SIZE * 3))
+    buffer = io.BytesIO()
+    image.save(buffer, "PNG", compress_level=1)
+    return buffer.getvalue()
+
+def create_app(args):
+    from fastapi import FastAPI, Request
+    from fastapi.responses import JSONResponse, Response, StreamingResponse
+    from app.mock_llm import MockAPIError, MockAsyncOpenAI
+
+    chat = MockAsyncOpenAI(latency=args.latency, latency_jitter=args.latency * args.jitter, error_rate=args.error_rate,
+                           rate_limit_share=args.rate_limit_share, slow_call_rate=args.slow_rate, seed=args.seed)
+    images = MockAsyncOpenAI(latency=args.image_latency, latency_jitter=args.image_latency * args.jitter,
+                             error_rate=args.error_rate, rate_limit_share=args.rate_limit_share, seed=args.seed + 1)
+    png = make_image()
+    app = FastAPI(title="OpenAI stand-in")
+
+    def error_response(e: MockAPIError) -> JSONResponse:
+        kind = "rate_limit_exceeded" if e.status_code == 429 else "server_error"
+        return JSONResponse({"error": {"message": str(e), "type": kind, "code": kind}},
+                            status_code=e.status_code, headers=e.response.headers)
+
+    async def sse(stream, completion_id: str, model: str, created: int):
+        async for chunk in stream:
+            data = {"id": completion_id, "object": "chat.completion.chunk", "created": created, "model": model, **to_dict(chunk)}
+            for choice in data["choices"]:
+                choice.setdefault("finish_reason", None)
+            yield f"data: {json.dumps(data)}\n\n"
+            if args.chunk_delay:
+                await asyncio.sleep(args.chunk_delay)
+        yield "data: [DONE]\n\n"
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        try:
+            result = await chat._chat(**body)
+        except MockAPIError as e:
+            return error_response(e)
+        headers = chat._headers()
+        if body.get("stream"):
+            completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+            return StreamingResponse(sse(result, completion_id, body["model"], int(time.time())),
+                                     media_type="text/event-stream", headers=headers)
+        return JSONResponse({"object": "chat.completion", **to_dict(result)}, headers=headers)
+
+    @app.post("/v1/images/generations")
+    async def image_generations(request: Request):
+        body = await request.json()
+        try:
+            result = await images._image(**body)
+        except MockAPIError as e:
+            return error_response(e)
+        url = f"{str(request.base_url).rstrip('/')}/images/{uuid.uuid4().hex}.png"
+        return JSONResponse({"created": result.created, "data": [{"url": url, "revised_prompt": body["prompt"]}]},
+                            headers=images._headers())
+
+    @app.get("/images/{name}")
+    async def image(name: str):
+        return Response(png, media_type="image/png")
+
+    @app.get("/stats")
+    async def stats():
+        return {"chat": chat.stats, "images": images.stats}
+
+    return app
+
+def add_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("--latency", type=float, default=1.0, help="Usual chat completion latency, in seconds.")
+    parser.add_argument("--image-latency", type=float, default=5.0, help="Usual image generation latency, in seconds.")
+    parser.add_argument("--jitter", type=float, default=0.2, help="Standard deviation of the latencies, relative to them.")
+    parser.add_argument("--slow-rate", type=float, default=0.01, help="Share of chat calls that take ten times as long.")
+    parser.add_argument("--error-rate", type=float, default=0.02, help="Share of calls that fail.")
+    parser.add_argument("--rate-limit-share", type=float, default=0.7, help="Share of the failures that are 429s rather than 500s.")
+    parser.add_argument("--chunk-delay", type=float, default=0.002, help="Pause between streamed chunks, in seconds.")
+    parser.add_argument("--seed", type=int, default=0)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    add_arguments(parser)
+    args = parser.parse_args()
+    sys.path.insert(0, REPO_ROOT)
+    import uvicorn
+    uvicorn.run(create_app(args), host=args.host, port=args.port, log_level="warning")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,20 @@
+# tests/conftest.py
+import os
+import sys
+
+import pytest
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, REPO_ROOT)
+# Everything runs offline, against app.mock_llm, and never touches the repo's own cache.
+os.environ["LLM_BACKEND"] = "mock"
+os.environ["LLM_CACHE_MODE"] = "off"
+os.environ.setdefault("OPENAI_API_KEY", "unused")
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    """A scratch working directory with the repo's SWAPI data, for code that writes relative paths."""
+    os.symlink(os.path.join(REPO_ROOT, "swapi_data"), tmp_path / "swapi_data")
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
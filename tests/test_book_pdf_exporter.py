@@ -0,0 +1,67 @@
+# tests/test_book_pdf_exporter.py
+import pytest
+
+pypdf = pytest.importorskip("pypdf")
+try:
+    from app import book_pdf_exporter
+    from app.book_pdf_exporter import PAGES_AFTER_BLOCK, BookPdfRenderer, render_fragment
+except OSError as e:  # WeasyPrint is installed but its system libraries (Pango) are not.
+    pytest.skip(f"WeasyPrint cannot load: {e}", allow_module_level=True)
+
+PARAGRAPH = " ".join(["The rebels held the line while the walkers crossed the frozen plain."] * 12)
+STORY = "\n\n".join([PARAGRAPH] * 8)
+
+
+def footers(path) -> list[str]:
+    """The last word of each page of a PDF, which is its page number when it has one."""
+    return [((page.extract_text() or "").split() or [""])[-1] for page in pypdf.PdfReader(str(path)).pages]
+
+
+def test_merged_fragments_carry_on_the_page_numbers(workdir):
+    prologue = render_fragment("prologue", first_page=1, content=STORY)
+    chapter = render_fragment("chapter", first_page=len(prologue.pages) + 1, index=0, heading="The Ice Planet", content=STORY)
+    pages = prologue.pages + chapter.pages
+    prologue.copy(pages).write_pdf(str(workdir / "merged.pdf"))
+
+    numbers = footers(workdir / "merged.pdf")
+    assert len(numbers) == len(pages) and len(prologue.pages) > 1
+    expected = [str(n) for n in range(1, len(pages) + 1)]
+    # The chapter's title page takes a number without showing it.
+    title_page = len(prologue.pages)
+    assert numbers[:title_page] == expected[:title_page]
+    assert not numbers[title_page].isdigit()
+    assert numbers[title_page + 1:] == expected[title_page + 1:]
+
+
+def test_chapters_ready_out_of_order_are_laid_out_once_and_numbered_in_reading_order(workdir, monkeypatch):
+    laid_out = []
+    def counting_render_fragment(name, *args, **kwargs):
+        laid_out.append((name, kwargs.get("index")))
+        return render_fragment(name, *args, **kwargs)
+    monkeypatch.setattr(book_pdf_exporter, "render_fragment", counting_render_fragment)
+
+    book = {
+        "swapi_call_text": "User Prompt: Hoth", "swapi_json_output": "{}", "image_path": None,
+        "prologue_text": STORY, "epilogue_text": PARAGRAPH,
+        "chapters": [{"heading": "Chapter - 1: The Ice Planet", "content": STORY},
+                     {"heading": "Chapter - 2: The Asteroid Field", "content": STORY}],
+    }
+    renderer = BookPdfRenderer()
+    renderer.render_block("prologue", content=STORY)
+    renderer.render_block("chapter", index=1, heading=book["chapters"][1]["heading"], content=STORY)
+    assert laid_out == [("prologue", None)]
+    renderer.render_block("chapter", index=0, heading=book["chapters"][0]["heading"], content=STORY)
+    assert laid_out == [("prologue", None), ("chapter", 0), ("chapter", 1)]
+
+    path = renderer.finish("Echoes of Hoth", book, "book.pdf")
+    assert [block for block in laid_out[3:] if block[0] in ("prologue", "chapter")] == []
+
+    numbers = footers(path)
+    story = renderer.story_pages(book)
+    story_length = sum(len(pages) + PAGES_AFTER_BLOCK.get(kind, 0) for kind, pages in story)
+    first_story_page = len(numbers) - story_length
+    assert numbers[first_story_page] == "1"
+    assert numbers[-1] == str(story_length)
+    for i, number in enumerate(numbers[first_story_page:]):
+        if number.isdigit():
+            assert int(number) == i + 1
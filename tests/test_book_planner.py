@@ -0,0 +1,63 @@
+# tests/test_book_planner.py
+import pytest
+
+from app import book_planner
+from app.book_planner import MAX_SECTION_WORDS, MIN_SECTION_WORDS, BookPlan
+
+
+@pytest.fixture(autouse=True)
+def fresh_yield(monkeypatch):
+    monkeypatch.setattr(book_planner, "_observed_yield", 1.0)
+
+
+def write(block, words: int, requested: int = None):
+    block.record(requested, "word " * words)
+
+
+def test_chapters_started_later_absorb_what_finished_chapters_ran_over_or_under():
+    plan = BookPlan(chapters=4, chapter_words=3000)
+    first, second = plan.chapter_block("Chapter - 1"), plan.chapter_block("Chapter - 2")
+    assert first.target_words == second.target_words == 3000
+
+    write(first, 4200)
+    first.finish()
+    # 12000 words in all: 4200 written, 3000 promised to the unfinished chapter 2, 4800 left for two.
+    third = plan.chapter_block("Chapter - 3")
+    assert third.target_words == 2400
+
+    write(second, 1800)
+    second.finish()
+    write(third, 2400)
+    third.finish()
+    assert plan.chapter_block("Chapter - 4").target_words == 12000 - 4200 - 1800 - 2400
+    assert plan.chapter_block("Chapter - 3") is third
+
+
+def test_a_chapter_never_gets_less_than_a_minimal_section():
+    plan = BookPlan(chapters=2, chapter_words=1000)
+    first = plan.chapter_block("Chapter - 1")
+    write(first, 5000)
+    first.finish()
+    assert plan.chapter_block("Chapter - 2").target_words == MIN_SECTION_WORDS
+
+
+def test_sections_ask_for_more_when_the_model_undershoots():
+    plan = BookPlan()
+    block = plan.block("Prologue", 1200)
+    assert block.next_section_words() == 1200
+    plan.word_yield = 0.6
+    assert block.next_section_words() == 2000
+    # When one call cannot deliver that much, the block is spread over more sections, none above the limit.
+    plan.word_yield = 0.25
+    assert block.sections_left() == 3
+    assert block.next_section_words() == 1600 < MAX_SECTION_WORDS
+
+
+def test_a_block_stops_once_it_is_close_enough_to_its_target():
+    plan = BookPlan()
+    block = plan.block("Prologue", 1200)
+    write(block, 800, requested=1200)
+    assert plan.word_yield < 1.0 and book_planner._observed_yield == plan.word_yield
+    assert block.sections_left() == 1
+    write(block, 200, requested=block.next_section_words())
+    assert block.remaining_words < MIN_SECTION_WORDS and block.sections_left() == 0
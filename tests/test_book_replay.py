@@ -0,0 +1,47 @@
+# tests/test_book_replay.py
+import asyncio
+
+from app import book_planner, book_writer
+from app.llm_cache import LLMCache
+from app.mock_llm import MockAsyncOpenAI
+
+
+def write_book(monkeypatch, cache: LLMCache, client: MockAsyncOpenAI, prompt: str, num_pages: int = 100) -> dict:
+    monkeypatch.setattr(book_writer, "llm_cache", cache)
+    book_writer.set_llm_client(client)
+    return asyncio.run(book_writer.generate_user_prompt_driven_book(prompt, num_pages, parallel_chapters=True))
+
+
+def test_replay_of_a_later_book_finds_every_call_in_the_cache(workdir, monkeypatch):
+    monkeypatch.setattr(book_planner, "_observed_yield", book_planner.INITIAL_WORD_YIELD)
+    # The model writes 60% of what it is asked for, so the planner's learned yield moves from book to book.
+    recording = LLMCache(cache_dir=str(workdir / "cache"), mode="record")
+    write_book(monkeypatch, recording, MockAsyncOpenAI(latency=0, word_yield=0.6), "A lost Jedi returns")
+    recorded = write_book(monkeypatch, recording, MockAsyncOpenAI(latency=0, word_yield=0.6), "Luke Skywalker on Hoth")
+    assert book_planner._observed_yield < 0.9
+
+    # A fresh process: nothing learned yet, and nothing may reach the API.
+    monkeypatch.setattr(book_planner, "_observed_yield", book_planner.INITIAL_WORD_YIELD)
+    replaying = LLMCache(cache_dir=str(workdir / "cache"), mode="replay")
+    client = MockAsyncOpenAI(latency=0, word_yield=0.6)
+    replayed = write_book(monkeypatch, replaying, client, "Luke Skywalker on Hoth")
+
+    assert client.stats["chat_calls"] == 0 and client.stats["image_calls"] == 0
+    assert all(counter["misses"] == 0 for counter in replaying.counters.values()), replaying.counters
+    assert replayed["chapters"] == recorded["chapters"]
+    assert (replayed["prologue_text"], replayed["epilogue_text"]) == (recorded["prologue_text"], recorded["epilogue_text"])
+
+
+def test_books_with_one_prompt_keep_their_own_section_plans(workdir, monkeypatch):
+    monkeypatch.setattr(book_planner, "_observed_yield", book_planner.INITIAL_WORD_YIELD)
+    recording = LLMCache(cache_dir=str(workdir / "cache"), mode="record")
+    short = write_book(monkeypatch, recording, MockAsyncOpenAI(latency=0, word_yield=0.6), "Luke Skywalker on Hoth", 40)
+    write_book(monkeypatch, recording, MockAsyncOpenAI(latency=0, word_yield=0.6), "Luke Skywalker on Hoth", 100)
+
+    monkeypatch.setattr(book_planner, "_observed_yield", book_planner.INITIAL_WORD_YIELD)
+    replaying = LLMCache(cache_dir=str(workdir / "cache"), mode="replay")
+    client = MockAsyncOpenAI(latency=0, word_yield=0.6)
+    replayed = write_book(monkeypatch, replaying, client, "Luke Skywalker on Hoth", 40)
+
+    assert client.stats["chat_calls"] == 0
+    assert replayed["chapters"] == short["chapters"] and replayed["prologue_text"] == short["prologue_text"]
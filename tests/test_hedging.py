@@ -0,0 +1,58 @@
+# tests/test_hedging.py
+import asyncio
+
+from app import hedging
+from app.hedging import HedgePolicy
+from app.llm_scheduler import LlmScheduler
+
+
+def slow_calls(policy: HedgePolicy, calls: int, seconds: float = 0.02) -> int:
+    """Runs `calls` calls that all outlast the hedge delay; returns how many attempts were made."""
+    attempts = []
+
+    async def attempt():
+        attempts.append(1)
+        await asyncio.sleep(seconds)
+        return "text"
+
+    async def main():
+        for _ in range(calls):
+            assert await policy.call("section", attempt) == "text"
+
+    asyncio.run(main())
+    return len(attempts)
+
+
+def primed(**kwargs) -> HedgePolicy:
+    """A policy whose 'section' stage has a history of 1 ms calls, so it hedges after about 1 ms."""
+    policy = HedgePolicy(percentile=50, min_samples=10, **kwargs)
+    for _ in range(200):
+        policy._record("section", 0.001)
+    return policy
+
+
+def test_duplicates_stay_within_the_budget(monkeypatch):
+    monkeypatch.setattr(hedging, "llm_scheduler", LlmScheduler(max_concurrent=4))
+    policy = primed(budget=0.25, burst=1)
+    attempts = slow_calls(policy, 12)
+    counts = policy.report()["stages"]["section"]
+    # One credit to start with, then a quarter of one per call.
+    assert counts["hedged"] == attempts - 12 == 3
+    assert counts["no_budget"] == 9
+    assert policy.credit < 1
+
+
+def test_no_duplicate_while_the_scheduler_is_busy(monkeypatch):
+    busy = LlmScheduler(max_concurrent=1)
+    busy.active = 1
+    monkeypatch.setattr(hedging, "llm_scheduler", busy)
+    policy = primed(budget=1, burst=5)
+    assert slow_calls(policy, 3) == 3
+    assert policy.report()["stages"]["section"]["no_capacity"] == 3
+
+
+def test_no_hedging_without_enough_history_or_budget():
+    assert HedgePolicy(min_samples=10).hedge_delay("section") is None
+    policy = primed(budget=0)
+    assert not policy.enabled and policy.hedge_delay("section") is None
+    assert slow_calls(policy, 2) == 2
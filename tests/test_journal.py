@@ -0,0 +1,59 @@
+# tests/test_journal.py
+import asyncio
+import json
+
+from app.journal import RUNNING, GenerationJournal, read_journal, run_step
+
+
+def make(value, calls: list):
+    async def make():
+        calls.append(value)
+        return value
+    return make
+
+
+def test_run_step_journals_a_result_and_returns_it_on_resume(tmp_path):
+    journal = GenerationJournal("book", {"user_input": "Leia"}, directory=str(tmp_path))
+    calls = []
+    assert asyncio.run(run_step(journal, "book_title", make("Echoes", calls))) == "Echoes"
+
+    resumed = GenerationJournal("book", directory=str(tmp_path))
+    assert resumed.resumed_units == 1 and resumed.request == {"user_input": "Leia"}
+    assert asyncio.run(run_step(resumed, "book_title", make("Another", calls))) == "Echoes"
+    assert calls == ["Echoes"]
+
+
+def test_run_step_retries_none_and_rejected_results(tmp_path):
+    journal = GenerationJournal("book", {}, directory=str(tmp_path))
+    calls = []
+    assert asyncio.run(run_step(journal, "image", make(None, calls))) is None
+    assert "image" not in journal
+    asyncio.run(journal.record("outline", []))
+    assert asyncio.run(run_step(journal, "outline", make([{"title": "One"}], calls), is_valid=bool)) == [{"title": "One"}]
+    assert calls == [None, [{"title": "One"}]]
+
+
+def test_run_step_without_a_journal_just_runs(tmp_path):
+    calls = []
+    assert asyncio.run(run_step(None, "book_title", make("Echoes", calls))) == "Echoes"
+    assert asyncio.run(run_step(None, "book_title", make("Echoes", calls))) == "Echoes"
+    assert len(calls) == 2
+
+
+def test_a_line_torn_by_a_crash_is_ignored_and_later_appends_survive(tmp_path):
+    journal = GenerationJournal("book", {"user_input": "Leia"}, directory=str(tmp_path))
+    asyncio.run(journal.record("section:Prologue:0", "The first part."))
+    with open(journal.path, "a", encoding="utf-8") as f:
+        f.write('{"unit": "section:Prologue:1", "val')
+
+    resumed = GenerationJournal("book", directory=str(tmp_path))
+    assert resumed.units == {"section:Prologue:0": "The first part."}
+    asyncio.run(resumed.record("section:Prologue:1", "The second part."))
+
+    units, status, request, key = read_journal(resumed.path)
+    assert units == {"section:Prologue:0": "The first part.", "section:Prologue:1": "The second part."}
+    assert (status, request, key) == (RUNNING, {"user_input": "Leia"}, "book")
+    with open(resumed.path, encoding="utf-8") as f:
+        lines = f.read().splitlines()
+    assert sum(1 for line in lines if not line.endswith("}")) == 1
+    json.loads(lines[-1])
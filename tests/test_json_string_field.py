@@ -0,0 +1,50 @@
+# tests/test_json_string_field.py
+import json
+
+from app.book_writer import JsonStringField
+
+RESPONSE = json.dumps({
+    "summary": "Not this one.",
+    "section": 'She said "run"\\now.\n\tTab, slash /, accent \u00e9, emoji \U0001F680 and \\u0041 as text.',
+})
+
+
+def feed_in_chunks(field: JsonStringField, text: str, size: int):
+    for start in range(0, len(text), size):
+        field.feed(text[start:start + size])
+
+
+def test_decodes_the_field_whatever_the_chunk_boundaries():
+    expected = json.loads(RESPONSE)["section"]
+    for size in (1, 2, 3, 5, 7, len(RESPONSE)):
+        streamed = []
+        field = JsonStringField("section", streamed.append)
+        feed_in_chunks(field, RESPONSE, size)
+        assert field.closed
+        assert field.text == "".join(streamed) == expected, size
+
+
+def test_ascii_escaped_surrogate_pair_split_across_chunks():
+    raw = json.dumps({"section": "Launch \U0001F680!"}, ensure_ascii=True)
+    split = raw.index("\\ud83d") + 8
+    field = JsonStringField("section")
+    field.feed(raw[:split])
+    assert field.text == "Launch "
+    field.feed(raw[split:])
+    assert field.text == "Launch \U0001F680!"
+
+
+def test_nothing_is_emitted_before_the_field_or_after_it_closes():
+    streamed = []
+    field = JsonStringField("section", streamed.append)
+    field.feed('{"summary": "A summary with \\"section\\": in it", ')
+    assert streamed == [] and not field.closed
+    field.feed('"section": "Text."}')
+    field.feed(' trailing "section": "ignored"')
+    assert streamed == ["Text."] and field.closed
+
+
+def test_missing_field_stays_empty():
+    field = JsonStringField("section")
+    feed_in_chunks(field, '{"summary": "Only a summary."}', 4)
+    assert field.text == "" and not field.closed
@@ -0,0 +1,30 @@
+# tests/test_llm_cache.py
+import asyncio
+
+from app.llm_cache import LLMCache
+
+POLICIES = {"summary": True, "section": False}
+
+
+def put_all(cache: LLMCache):
+    async def main():
+        await cache.put("a" * 64, "summary", "A summary.")
+        await cache.put("b" * 64, "section", "A section.")
+        await cache.put("c" * 64, "image", "image.png")
+    asyncio.run(main())
+
+
+def test_only_results_the_policy_serves_back_are_kept(tmp_path):
+    cache = LLMCache(cache_dir=str(tmp_path), mode="on", policies=POLICIES)
+    put_all(cache)
+    assert cache.get("a" * 64, "summary") == "A summary."
+    assert cache.get("b" * 64, "section") is None and cache.get("c" * 64, "image") is None
+    assert cache.stats()["entries"] == 1
+
+
+def test_record_mode_keeps_every_result_for_replay(tmp_path):
+    put_all(LLMCache(cache_dir=str(tmp_path), mode="record", policies=POLICIES))
+    replaying = LLMCache(cache_dir=str(tmp_path), mode="replay", policies=POLICIES)
+    assert replaying.get("b" * 64, "section") == "A section."
+    assert replaying.get("c" * 64, "image") == "image.png"
+    assert replaying.stats()["entries"] == 3
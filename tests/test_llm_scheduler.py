@@ -0,0 +1,61 @@
+# tests/test_llm_scheduler.py
+import asyncio
+
+from app.llm_scheduler import PRIORITIES, LlmScheduler, set_flow
+
+
+def serve(requests: list[tuple]) -> list[str]:
+    """Queues (call, job, priority[, tenant]) requests behind a busy single-slot scheduler, in order; returns the order they ran in."""
+    scheduler = LlmScheduler(max_concurrent=1)
+    order = []
+
+    async def call(name: str, job_id: str, priority: str, tenant: str = None):
+        set_flow(job_id, tenant, PRIORITIES[priority])
+        async with scheduler.slot(cost=100):
+            order.append(name)
+            await asyncio.sleep(0)
+
+    async def main():
+        async with scheduler.slot():
+            tasks = []
+            for request in requests:
+                tasks.append(asyncio.create_task(call(*request)))
+                await asyncio.sleep(0)
+        await asyncio.gather(*tasks)
+        assert scheduler.active == 0 and scheduler.stats()["waiting"] == 0
+
+    asyncio.run(main())
+    return order
+
+
+def test_a_short_book_is_not_stuck_behind_a_long_one():
+    long_book = [(f"long-{i}", "long", "normal") for i in range(6)]
+    short_book = [(f"short-{i}", "short", "normal") for i in range(2)]
+    assert serve(long_book + short_book) == ["long-0", "short-0", "long-1", "short-1", "long-2", "long-3", "long-4", "long-5"]
+
+
+def test_a_tenant_batch_gets_one_share_not_one_per_book():
+    batch = [(f"a-{i}", f"job-a{i}", "normal", "a") for i in range(3)]
+    assert serve(batch + [("b-0", "job-b0", "normal", "b")]) == ["a-0", "b-0", "a-1", "a-2"]
+    # Without tenants each book is a flow of its own.
+    assert serve([request[:3] for request in batch] + [("b-0", "job-b0", "normal")]) == ["a-0", "a-1", "a-2", "b-0"]
+
+
+def test_higher_priorities_go_first():
+    order = serve([("low", "x", "low"), ("normal", "y", "normal"), ("high", "z", "high")])
+    assert order == ["high", "normal", "low"]
+
+
+def test_a_cancelled_waiter_gives_up_its_place():
+    async def main():
+        scheduler = LlmScheduler(max_concurrent=1)
+        async with scheduler.slot():
+            waiter = asyncio.create_task(scheduler.slot().__aenter__())
+            await asyncio.sleep(0)
+            assert scheduler.stats()["waiting"] == 1
+            waiter.cancel()
+            await asyncio.gather(waiter, return_exceptions=True)
+            assert scheduler.stats()["waiting"] == 0
+        assert scheduler.active == 0
+
+    asyncio.run(main())
@@ -0,0 +1,76 @@
+# tests/test_rate_limiter.py
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from app.rate_limiter import RateLimiter, parse_reset_duration, retry_after_seconds
+
+
+def test_headers_set_the_limits_and_lower_the_remaining_budget():
+    limiter = RateLimiter("test", requests_per_minute=60, tokens_per_minute=10000)
+    limiter.update_from_headers({
+        "x-ratelimit-limit-requests": "500", "x-ratelimit-remaining-requests": "3",
+        "x-ratelimit-limit-tokens": "30000", "x-ratelimit-remaining-tokens": "25000",
+    })
+    assert limiter.requests.capacity == 500 and limiter.requests.level == 3
+    assert limiter.tokens.capacity == 30000
+    # Another process may have spent what the server reports as remaining, never the other way round.
+    assert limiter.tokens.level == pytest.approx(10000, abs=10)
+
+
+def test_missing_or_malformed_headers_change_nothing():
+    limiter = RateLimiter("test", requests_per_minute=60, tokens_per_minute=10000)
+    limiter.update_from_headers(None)
+    limiter.update_from_headers({"x-ratelimit-limit-requests": "many", "x-ratelimit-remaining-tokens": "n/a"})
+    assert (limiter.requests.capacity, limiter.tokens.capacity) == (60, 10000)
+    assert limiter.requests.level == pytest.approx(60) and limiter.tokens.level == pytest.approx(10000)
+
+
+def test_token_headers_are_ignored_without_a_token_budget():
+    limiter = RateLimiter("test", requests_per_minute=60)
+    limiter.update_from_headers({"x-ratelimit-remaining-requests": "0", "x-ratelimit-remaining-tokens": "0"})
+    assert limiter.tokens is None and limiter.requests.level == 0
+
+
+def test_reset_durations_and_retry_after():
+    assert parse_reset_duration("6m0s") == 360
+    assert parse_reset_duration("20ms") == pytest.approx(0.02)
+    assert parse_reset_duration("1.5") == 1.5
+    assert parse_reset_duration("soon") is None
+    assert retry_after_seconds({"retry-after-ms": "250", "retry-after": "9"}) == 0.25
+    assert retry_after_seconds({"retry-after": "2s"}) == 2
+
+
+def test_a_request_waiting_for_tokens_does_not_hold_up_cheaper_ones():
+    limiter = RateLimiter("test", requests_per_minute=600, tokens_per_minute=600)
+
+    async def main():
+        await limiter.acquire(600)
+        costly = asyncio.create_task(limiter.acquire(600))  # Waits about a minute for the budget to refill.
+        await asyncio.sleep(0)
+        await asyncio.wait_for(limiter.acquire(0), timeout=1)
+        assert not costly.done()
+        costly.cancel()
+
+    asyncio.run(main())
+
+
+def test_a_streamed_completion_settles_its_estimate_when_the_usage_arrives():
+    limiter = RateLimiter("test", requests_per_minute=60, tokens_per_minute=10000)
+    chunks = [SimpleNamespace(usage=None), SimpleNamespace(usage=None), SimpleNamespace(usage=SimpleNamespace(total_tokens=1000))]
+
+    async def stream():
+        for chunk in chunks:
+            yield chunk
+
+    async def create(**kwargs):
+        return SimpleNamespace(headers={}, parse=stream)
+
+    async def main():
+        streamed = await limiter.call(create, tokens=4000, stream=True)
+        assert limiter.tokens.level == pytest.approx(6000, abs=10)
+        assert [chunk async for chunk in streamed] == chunks
+
+    asyncio.run(main())
+    assert limiter.tokens.level == pytest.approx(9000, abs=10)
@@ -0,0 +1,27 @@
+# tests/test_swapi_client.py
+import asyncio
+
+import httpx
+
+from app import swapi_client
+
+GROGU = {
+    "name": "Grogu", "height": "34", "homeworld": "https://swapi.dev/api/planets/1/",
+    "films": ["https://swapi.dev/api/films/1/"], "url": "https://swapi.dev/api/people/999/",
+}
+
+
+def test_remote_results_are_shaped_like_local_ones(workdir, monkeypatch):
+    def answer(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(200, json={"results": [GROGU]})
+    client = httpx.AsyncClient(transport=httpx.MockTransport(answer))
+    monkeypatch.setattr(swapi_client, "get_http_client", lambda: client)
+    monkeypatch.setattr(swapi_client, "_remote_cache", type(swapi_client._remote_cache)())
+
+    async def main():
+        return await swapi_client.fetch_many("people", ["Grogu", "Luke Skywalker"])
+    found = asyncio.run(main())
+
+    assert found["Grogu"] == {"name": "Grogu", "height": "34", "homeworld": "Tatooine", "films": ["A New Hope"],
+                              "url": "https://swapi.dev/api/people/999/"}
+    assert found["Luke Skywalker"]["homeworld"] == "Tatooine"
@@ -0,0 +1,44 @@
+# tests/test_swapi_search.py
+import os
+
+import pytest
+
+from app.book_writer import LOCAL_CAST_SIZES
+from app.swapi_search import SwapiSearchIndex
+from app.swapi_store import load_store
+
+SWAPI_DATA = os.path.join(os.path.dirname(__file__), "..", "swapi_data")
+
+
+@pytest.fixture(scope="module")
+def index() -> SwapiSearchIndex:
+    return SwapiSearchIndex(load_store(SWAPI_DATA))
+
+
+def cast_names(index: SwapiSearchIndex, prompt: str) -> dict[str, list[str]] | None:
+    cast = index.named_cast(prompt, index.mentions(prompt), LOCAL_CAST_SIZES)
+    return cast and {category: [e.name for e in entities] for category, entities in cast.items()}
+
+
+def test_a_prompt_naming_its_cast_gets_exactly_that_cast(index):
+    assert cast_names(index, "Luke Skywalker and Han Solo escape Hoth in the Millennium Falcon") == {
+        "people": ["Luke Skywalker", "Han Solo"], "planets": ["Hoth"], "starships": ["Millennium Falcon"]}
+
+
+def test_unnamed_planets_and_starships_come_from_the_people_named(index):
+    cast = cast_names(index, "Boba Fett hunts a smuggler across the galaxy")
+    assert cast["people"] == ["Boba Fett"]
+    assert cast["planets"] == ["Kamino"] and cast["starships"] == ["Slave 1"]
+
+
+def test_casts_respect_the_sizes(index):
+    prompt = "Luke, Leia, Han, Chewbacca, Lando, Yoda, Obi-Wan and R2-D2 visit Hoth, Endor and Bespin"
+    cast = index.named_cast(prompt, index.mentions(prompt), {"people": 3, "planets": 2, "starships": 1})
+    assert [len(cast[category]) for category in ("people", "planets", "starships")] == [3, 2, 1]
+
+
+def test_no_cast_when_no_one_is_named(index):
+    assert cast_names(index, "An ice planet rebel base comes under Imperial attack") is None
+    # Names that are everyday words only count when capitalized.
+    assert cast_names(index, "a jar of spice and a sly smuggler on a desert world") is None
+    assert cast_names(index, "Jar Jar Binks gets lost")["people"] == ["Jar Jar Binks"]